@@ -0,0 +1,67 @@
+# Tempo di avvio: dal lancio di pokermachine.py alla prima richiesta di puntata
+# Ogni prova avvia un interprete nuovo in una cartella temporanea (con o senza un
+# salvataggio esistente) e misura quando il prompt "Mani: ... F: n> " compare
+# sull'output. Con --importazioni mostra anche i moduli piu' lenti da -X importtime.
+# Uso: python benchmarks/bench_avvio.py [prove] [--importazioni]
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from esegui import riassumi
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAMMA = os.path.join(RADICE, 'pokermachine.py')
+
+def primo_prompt(cartella, opzioni=()):
+	# Secondi fino al primo prompt di puntata, ed eventuale stderr (per -X importtime)
+	inizio = time.perf_counter()
+	processo = subprocess.Popen([sys.executable, '-u', *opzioni, PROGRAMMA], cwd=cartella,
+		stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	letto = b''
+	while not (b'Mani: #' in letto and letto.endswith(b'> ')):
+		blocco = os.read(processo.stdout.fileno(), 65536)
+		if not blocco:
+			raise RuntimeError("pokermachine.py terminato prima del prompt:\n" + letto.decode('utf-8', 'replace'))
+		letto += blocco
+	durata = time.perf_counter() - inizio
+	_, errori = processo.communicate(b'\n') # INVIO: uscita dal gioco
+	return durata, errori.decode('utf-8', 'replace')
+
+def importazioni_lente(cartella, quante=12):
+	_, errori = primo_prompt(cartella, ('-X', 'importtime'))
+	righe = []
+	for riga in errori.splitlines():
+		parti = riga[len('import time:'):].split('|')
+		if riga.startswith('import time:') and parti[0].strip().isdigit():
+			righe.append((int(parti[1]), int(parti[0]), parti[2].rstrip()))
+	return sorted(righe, reverse=True)[:quante]
+
+def main():
+	argomenti = [a for a in sys.argv[1:] if not a.startswith('--')]
+	prove = int(argomenti[0]) if argomenti else 20
+	cartella = tempfile.mkdtemp(prefix='avvio_pm_')
+	try:
+		primo_prompt(cartella) # crea il salvataggio: le prove successive lo caricano
+		nudo = []
+		for _ in range(prove):
+			inizio = time.perf_counter()
+			subprocess.run([sys.executable, '-c', 'pass'])
+			nudo.append((time.perf_counter() - inizio) * 1e6)
+		tempi = [primo_prompt(cartella)[0] * 1e6 for _ in range(prove)]
+		avvio = riassumi(tempi)
+		interprete = riassumi(nudo)
+		print(f"Interprete vuoto:         p50 {interprete['p50'] / 1000:.1f}ms")
+		print(f"Primo prompt di puntata:  p50 {avvio['p50'] / 1000:.1f}ms | p90 {avvio['p90'] / 1000:.1f}ms | min {avvio['min'] / 1000:.1f}ms ({prove} prove)")
+		if '--importazioni' in sys.argv:
+			print("\nImportazioni piu' lente (cumulativo | proprio, us):")
+			for cumulativo, proprio, nome in importazioni_lente(cartella):
+				print(f"{cumulativo:>9} | {proprio:>9} | {nome}")
+	finally:
+		shutil.rmtree(cartella, ignore_errors=True)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,53 @@
+# Verifica che la cache delle tenute dia la stessa risposta del risolutore
+# senza cache, e misura il tempo di una ricerca in cache rispetto a un calcolo.
+# Uso: python benchmarks/bench_cache_strategia.py [num_mani]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache_strategia import CacheStrategia
+from risolutore import valuta_tenute
+from valutatore import NUM_CODICI, NUM_SEMI
+
+def permuta_semi(codici, permutazione):
+	return [c - c % NUM_SEMI + permutazione[c % NUM_SEMI] for c in codici]
+
+def verifica(num_mani, rng):
+	cache = CacheStrategia(dimensione_massima=num_mani)
+	for _ in range(num_mani):
+		codici = [rng.randrange(NUM_CODICI) for _ in range(5)]
+		valori = valuta_tenute(codici)
+		maschera, valore = cache.tenuta_ottimale(codici)
+		assert abs(valore - max(valori)) < 1e-12 and abs(valori[maschera] - valore) < 1e-12, codici
+		# Stessa classe: semi permutati e carte rimescolate devono colpire la cache
+		permutazione = list(range(NUM_SEMI))
+		rng.shuffle(permutazione)
+		variante = permuta_semi(codici, permutazione)
+		rng.shuffle(variante)
+		maschera_v, valore_v = cache.tenuta_ottimale(variante)
+		assert abs(valore_v - valore) < 1e-12 and abs(valuta_tenute(variante)[maschera_v] - valore) < 1e-12, variante
+	return cache
+
+def main():
+	num_mani = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+	rng = random.Random(2024)
+	inizio = time.perf_counter()
+	cache = verifica(num_mani, rng)
+	print(f"Equivalenza cache/risolutore verificata su {num_mani} mani e varianti ({time.perf_counter() - inizio:.1f}s).")
+	print(f"Statistiche cache: {cache.statistiche()}")
+	mani = [[rng.randrange(NUM_CODICI) for _ in range(5)] for _ in range(20)]
+	inizio = time.perf_counter()
+	for codici in mani:
+		cache.tenuta_ottimale(codici)
+	calcolo = (time.perf_counter() - inizio) / len(mani)
+	inizio = time.perf_counter()
+	for _ in range(1000):
+		for codici in mani:
+			cache.tenuta_ottimale(codici)
+	ricerca = (time.perf_counter() - inizio) / (1000 * len(mani))
+	print(f"Calcolo (mancato): {calcolo * 1000:.2f} ms | ricerca in cache: {ricerca * 1e6:.2f} us ({calcolo / ricerca:,.0f}x)")
+
+if __name__ == "__main__":
+	main()
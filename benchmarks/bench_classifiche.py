@@ -0,0 +1,150 @@
+# Classifiche sui file dei giocatori: correttezza e tempi di una scansione
+# Crea --giocatori file di stato (finestra mobile piena, valori a caso), qualche
+# vecchio .pkl non migrato e un file danneggiato con il suo .prec, poi confronta:
+# - la lettura di ogni stato completo con leggi_stato, in un solo thread, tenendo
+#   in memoria tutti i dati (come una scansione fatta con gli strumenti del gioco)
+# - classifiche.aggrega senza indice, con l'indice e nessun cambiamento, dopo aver
+#   risalvato l'1% dei giocatori e dopo averne cancellati alcuni
+# Classifiche, totali e conteggi per categoria devono coincidere con il calcolo
+# diretto; il picco di memoria e' misurato con tracemalloc in un passaggio a parte.
+# Esce con 1 se un risultato non coincide.
+# Uso: python benchmarks/bench_classifiche.py [--giocatori 20000] [--thread 8]
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import classifiche
+from esegui import SEED, dati_di_prova
+from pokermachine import migra_dati
+from stato import SUFFISSO_PRECEDENTE, codifica_stato, leggi_stato, scrivi_stato
+from valutatore import CATEGORIE
+
+PICKLE = 20
+
+def giocatore(base, rng):
+	dati = dict(base, punteggi={nome: dict(info, conteggio=rng.randrange(100000)) for nome, info in base['punteggi'].items()})
+	for campo in ('launches', 'mani_giocate', 'mani_pagate', 'fiches_attuali', 'fiches_guadagnate', 'fiches_perdute',
+			'fallimenti', 'vincita_massima', 'perdita_massima', 'record_mani_senza_fallimenti'):
+		dati[campo] = rng.randrange(10 ** rng.randrange(2, 7))
+	return dati
+
+def prepara(cartella, num_giocatori, rng):
+	base = dati_di_prova()
+	for n in range(num_giocatori):
+		scrivi_stato(os.path.join(cartella, f"g{n:06d}.stato"), codifica_stato(giocatore(base, rng)), sincronizza=False)
+	for n in range(PICKLE):
+		with open(os.path.join(cartella, f"vecchio{n:03d}.pkl"), 'wb') as f:
+			pickle.dump(giocatore(base, rng), f)
+	# Principale danneggiato: vale il precedente, come per leggi_stato
+	percorso = os.path.join(cartella, "g000000.stato")
+	scrivi_stato(percorso, codifica_stato(giocatore(base, rng)), sincronizza=False)
+	with open(percorso, 'r+b') as f:
+		f.seek(100)
+		byte = f.read(1)
+		f.seek(100)
+		f.write(bytes([byte[0] ^ 0x40]))
+	return base
+
+def diretto(cartella):
+	# Riferimento: ogni stato letto per intero e tenuto in memoria
+	tutti = {}
+	with contextlib.redirect_stdout(io.StringIO()):
+		for nome in sorted(os.listdir(cartella)):
+			radice, estensione = os.path.splitext(nome)
+			if estensione == '.stato':
+				tutti[radice] = leggi_stato(os.path.join(cartella, nome))
+			elif estensione == '.pkl' and not os.path.exists(os.path.join(cartella, radice + '.stato')):
+				with open(os.path.join(cartella, nome), 'rb') as f:
+					dati = pickle.load(f)
+				migra_dati(dati)
+				tutti[radice] = dati
+	return tutti
+
+def attesi(tutti, primi):
+	riepiloghi = {nome: classifiche.riepilogo(dati) for nome, dati in tutti.items()}
+	risultato = {'giocatori': len(riepiloghi)}
+	risultato['classifiche'] = {chiave: sorted(sorted(((valore(r), nome) for nome, r in riepiloghi.items()), reverse=True)[:primi],
+		key=lambda v: (-v[0], v[1])) for chiave, _, valore in classifiche.CLASSIFICHE}
+	risultato['totali'] = {campo: sum(dati[campo] for dati in tutti.values()) for campo in classifiche.TOTALI}
+	risultato['punteggi'] = {nome: sum(dati['punteggi'][nome]['conteggio'] for dati in tutti.values()) for nome in CATEGORIE}
+	return risultato
+
+def confronta(nome, ottenuto, atteso):
+	differenze = [chiave for chiave in atteso if ottenuto[chiave] != atteso[chiave]]
+	if differenze:
+		print(f"ERRORE {nome}: differenze in {', '.join(differenze)}")
+	return not differenze
+
+def cronometra(funzione, *args, **kwargs):
+	inizio = time.perf_counter()
+	risultato = funzione(*args, **kwargs)
+	return risultato, time.perf_counter() - inizio
+
+def picco(funzione, *args, **kwargs):
+	tracemalloc.start()
+	try:
+		funzione(*args, **kwargs)
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+def main():
+	parser = argparse.ArgumentParser(description="Correttezza e tempi delle classifiche sui file dei giocatori")
+	parser.add_argument('--giocatori', type=int, default=20000)
+	parser.add_argument('--thread', type=int, default=classifiche.THREAD)
+	parser.add_argument('--primi', type=int, default=classifiche.PRIMI)
+	args = parser.parse_args()
+	rng = random.Random(SEED)
+	cartella = tempfile.mkdtemp(prefix='bench_classifiche_')
+	indice = os.path.join(cartella, classifiche.FILE_INDICE)
+	corretti = True
+	try:
+		inizio = time.perf_counter()
+		base = prepara(cartella, args.giocatori, rng)
+		print(f"{args.giocatori} stati e {PICKLE} pickle creati in {time.perf_counter() - inizio:.1f}s "
+			f"({os.path.getsize(os.path.join(cartella, 'g000001.stato'))} byte per file)")
+		tutti, secondi = cronometra(diretto, cartella)
+		print(f"Stati completi in un thread (leggi_stato):  {secondi:6.2f}s")
+		atteso = attesi(tutti, args.primi)
+		del tutti
+		cambiati = rng.sample(range(1, args.giocatori), max(args.giocatori // 100, 1))
+		def risalva():
+			for n in cambiati:
+				scrivi_stato(os.path.join(cartella, f"g{n:06d}.stato"), codifica_stato(giocatore(base, rng)), sincronizza=False)
+		def cancella():
+			for n in cambiati[:10]:
+				for suffisso in ('', SUFFISSO_PRECEDENTE):
+					os.remove(os.path.join(cartella, f"g{n:06d}.stato{suffisso}"))
+		prove = [("senza indice", lambda: None), ("indice, nessun cambiamento", lambda: None),
+			("indice, 1% risalvati", risalva), ("indice, 10 cancellati", cancella)]
+		for numero, (nome, modifica) in enumerate(prove):
+			modifica()
+			if numero >= 2:
+				tutti = diretto(cartella)
+				atteso = attesi(tutti, args.primi)
+				del tutti
+			risultato, secondi = cronometra(classifiche.aggrega, cartella, indice, args.primi, args.thread, completa=numero == 0)
+			corretti &= confronta(nome, risultato, atteso)
+			print(f"aggrega, {nome + ':':<28}{secondi:6.2f}s ({risultato['letti']} letti, "
+				f"{risultato['dall_indice']} dall'indice, {risultato['rimossi']} rimossi, {len(risultato['avvisi'])} avvisi)")
+		memoria_diretto = picco(diretto, cartella)
+		memoria_completa = picco(classifiche.aggrega, cartella, os.path.join(cartella, 'picco.json'), args.primi, args.thread, completa=True)
+		print(f"Picco di memoria: stati completi {memoria_diretto / 2 ** 20:.1f} MiB, aggrega {memoria_completa / 2 ** 20:.1f} MiB "
+			f"(di cui l'indice, {len(CATEGORIE) + len(classifiche.CAMPI) + 3} interi per giocatore)")
+	finally:
+		shutil.rmtree(cartella, ignore_errors=True)
+	print(f"{'ok    ' if corretti else 'ERRORE'} classifiche, totali e categorie coincidono con il calcolo diretto")
+	sys.exit(0 if corretti else 1)
+
+if __name__ == "__main__":
+	main()
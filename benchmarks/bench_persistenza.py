@@ -0,0 +1,59 @@
+# Confronto del costo di persistenza per mano: pickle completo ad ogni mano
+# (comportamento precedente) contro diario append-only con fsync per mano,
+# group commit e solo flush.
+# Uso: python benchmarks/bench_persistenza.py [num_mani]
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diario import Diario, nuovo_record
+from regole import EsitoMano
+from valutatore import CATEGORIE
+
+def dati_di_prova():
+	return {
+		'launches': 100, 'mani_giocate': 50000, 'data_ultimo_fallimento': "2025-09-28 21:36:36",
+		'record_mani_senza_fallimenti': 399, 'mani_dall_ultimo_fallimento': 81,
+		'fiches_guadagnate': 602006, 'fiches_perdute': 573798, 'fiches_attuali': 814,
+		'fallimenti': 14, 'killer_hand_count': 3,
+		'punteggi': {nome: {'conteggio': 1000, 'ultima_realizzazione': "2025-09-28 21:36:36"} for nome in CATEGORIE},
+		'vincita_massima': 195000, 'data_vincita_massima': "2025-04-07 10:00:00",
+		'perdita_massima': 223958, 'data_perdita_massima': "2025-04-07 10:00:00",
+		'data_ultima_giocata': "2025-09-28 21:36:36", 'seq_diario': 0
+	}
+
+def pickle_completo(cartella, num_mani, dati):
+	percorso = os.path.join(cartella, 'dati.pkl')
+	inizio = time.perf_counter()
+	for _ in range(num_mani):
+		dati['mani_giocate'] += 1
+		with open(percorso, 'wb') as f:
+			pickle.dump(dati, f)
+	return time.perf_counter() - inizio
+
+def diario(cartella, num_mani, dati, modalita):
+	d = Diario(os.path.join(cartella, f'diario_{modalita}.jsonl'), modalita=modalita, intervallo_snapshot=num_mani + 1)
+	esito = EsitoMano(814, 20, 10, 0, 0, 0)
+	inizio = time.perf_counter()
+	for n in range(1, num_mani + 1):
+		d.registra(nuovo_record(n, "2025-09-28 21:36:36", 10, [1, 2, 3, 4, 5], "Doppia coppia", esito, 3, False, False))
+	d.chiudi()
+	return time.perf_counter() - inizio
+
+def main():
+	num_mani = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	with tempfile.TemporaryDirectory() as cartella:
+		misure = [
+			("pickle completo ad ogni mano (precedente)", pickle_completo(cartella, num_mani, dati_di_prova())),
+			("diario, fsync ad ogni mano", diario(cartella, num_mani, dati_di_prova(), 'mano')),
+			("diario, group commit", diario(cartella, num_mani, dati_di_prova(), 'gruppo')),
+			("diario, solo flush", diario(cartella, num_mani, dati_di_prova(), 'nessuno')),
+		]
+	for nome, secondi in misure:
+		print(f"{nome}: {secondi / num_mani * 1e6:.1f} us/mano")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,157 @@
+# Riproduzione delle sessioni registrate: fedelta' e velocita'
+# - Fedelta': gioca alcune sessioni attraverso poker_machine() (input simulato,
+#   puntate e tenute varie, fino a qualche game over) e confronta la riproduzione
+#   del registro sessioni con lo storico mani scritto dal gioco: mano iniziale,
+#   maschera, mano finale e risultato netto di ogni mano devono coincidere.
+# - Velocita': un registro sintetico di --mani mani (sessioni fino a --per-sessione,
+#   seed e tenute a caso) riletto e rigiocato con le regole attuali, poi
+#   rivalutato con una tabella vincite alternativa nello stesso passaggio.
+#   Le sessioni seguono le regole (puntata del 3%, fine al fallimento), come un registro vero.
+# Esce con 1 se una mano non coincide.
+# Uso: python benchmarks/bench_riproduzione.py [--mani 1000000] [--per-sessione 5000]
+import argparse
+import builtins
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pokermachine
+from regole import (
+	CONFIGURAZIONE_PREDEFINITA, FICHES_INIZIALI, NUM_MAZZI, SOGLIA_RIMESCOLAMENTO_TOTALE, TABELLA_VINCITE,
+	is_killer_hand, penalita_killer_hand, regola_mano
+)
+from registro_sessioni import (
+	FILE_SESSIONI, VERSIONE_REGISTRO, InizioSessione, SessioneRegistrata, codifica_inizio, codifica_mano,
+	esiti, leggi_sessioni, mani_finali, riproduci
+)
+from storico import FILE_STORICO, LettoreStorico
+from valutatore import valuta_codici, valuta_indice
+
+SEED = 20251018
+PUNTATE = ('m', 'm', 'm', '-', '5', ',', '.', '+')
+TENUTE = ('', '1', '12', '123', '12345', '45', '2', '135')
+
+def gioca(num_mani, rng):
+	# Sessioni di poker_machine() nella cartella corrente, fino a num_mani mani
+	stato = {'mani': 0}
+	def input_simulato(prompt=''):
+		if prompt.startswith('\nMani:'):
+			if stato['mani'] >= num_mani or rng.random() < 0.01:
+				return '' # Uscita: la prossima sessione ha un nuovo seed
+			stato['mani'] += 1
+			return rng.choice(PUNTATE)
+		return rng.choice(TENUTE)
+	input_originale = builtins.input
+	builtins.input = input_simulato
+	try:
+		with contextlib.redirect_stdout(io.StringIO()) as uscita:
+			while stato['mani'] < num_mani:
+				pokermachine.poker_machine()
+				uscita.seek(0)
+				uscita.truncate()
+	finally:
+		builtins.input = input_originale
+
+def fedelta(num_mani, rng):
+	# (mani confrontate, di cui Killer Hand, sessioni, differenze)
+	cartella = tempfile.mkdtemp(prefix='bench_riproduzione_')
+	vecchia = os.getcwd()
+	os.chdir(cartella)
+	try:
+		gioca(num_mani, rng)
+		sessioni = leggi_sessioni(FILE_SESSIONI)
+		lettore = LettoreStorico(FILE_STORICO)
+		try:
+			attesi = [lettore[i] for i in range(len(lettore))]
+		finally:
+			lettore.chiudi()
+	finally:
+		os.chdir(vecchia)
+		shutil.rmtree(cartella, ignore_errors=True)
+	differenze = []
+	indice = killer = 0
+	for numero, sessione in enumerate(sessioni, 1):
+		mani = list(mani_finali(sessione))
+		categorie = [valuta_indice(finale) for _, finale in mani]
+		fiches = sessione.inizio.fiches
+		for (iniziale, finale), maschera, (_, is_mano_speciale, esito) in zip(mani, sessione.maschere, esiti(sessione, categorie)):
+			atteso = attesi[indice] if indice < len(attesi) else None
+			ottenuto = {'iniziale': iniziale, 'finale': finale, 'maschera': maschera,
+				'killer': is_mano_speciale, 'netto': esito.fiches - fiches}
+			if atteso is None or any(atteso[k] != v for k, v in ottenuto.items()):
+				differenze.append(f"sessione {numero}, mano {indice + 1}: storico {atteso}, riproduzione {ottenuto}")
+			fiches = esito.fiches
+			killer += is_mano_speciale
+			indice += 1
+	if indice != len(attesi):
+		differenze.append(f"{len(attesi)} mani nello storico, {indice} rigiocate")
+	return indice, killer, len(sessioni), differenze
+
+def registro_sintetico(percorso, num_mani, per_sessione, rng):
+	# Sessioni da 200 fiches a inizio vita, tenute a caso e puntata del 3% delle fiches:
+	# le carte non dipendono dalle puntate, quindi si rigiocano prima e le puntate si
+	# scelgono seguendo il saldo; una sessione finisce al fallimento o a per_sessione mani
+	scritte = 0
+	with open(percorso, 'wb') as f:
+		while scritte < num_mani:
+			seed = rng.getrandbits(64)
+			maschere = bytearray(rng.choice((0, 1, 3, 7, 31, 24, 16)) for _ in range(min(per_sessione, num_mani - scritte)))
+			sessione = SessioneRegistrata(InizioSessione(VERSIONE_REGISTRO, NUM_MAZZI, SOGLIA_RIMESCOLAMENTO_TOTALE,
+				seed, 0, FICHES_INIZIALI, 0, 0), maschere, [])
+			record = [codifica_inizio(seed, FICHES_INIZIALI, 0, 0)]
+			fiches, killer_hand_count = FICHES_INIZIALI, 0
+			for mano_vita, ((_, finale), maschera) in enumerate(zip(mani_finali(sessione), maschere), 1):
+				puntata = max(fiches * 3 // 100, 1)
+				is_mano_speciale = is_killer_hand(mano_vita)
+				if is_mano_speciale:
+					killer_hand_count += 1
+				fiches = regola_mano(valuta_codici(finale), puntata, fiches - puntata, is_mano_speciale,
+					penalita_killer_hand(killer_hand_count) if is_mano_speciale else 0).fiches
+				record.append(codifica_mano(maschera, puntata))
+				scritte += 1
+				if fiches <= 0:
+					break
+			f.write(b''.join(record))
+
+def main():
+	parser = argparse.ArgumentParser(description="Fedelta' e velocita' della riproduzione delle sessioni")
+	parser.add_argument('--mani', type=int, default=1_000_000)
+	parser.add_argument('--per-sessione', type=int, default=5000)
+	parser.add_argument('--mani-gioco', type=int, default=3000, help="Mani giocate con poker_machine() per la fedelta'")
+	args = parser.parse_args()
+	rng = random.Random(SEED)
+	inizio = time.perf_counter()
+	confrontate, killer, sessioni, differenze = fedelta(args.mani_gioco, rng)
+	for riga in differenze[:10]:
+		print(f"ERRORE {riga}")
+	print(f"{'ok    ' if not differenze else 'ERRORE'} fedelta': {confrontate} mani ({killer} Killer Hand) in {sessioni} sessioni di poker_machine() "
+		f"rigiocate come nello storico mani ({time.perf_counter() - inizio:.1f}s)")
+	with tempfile.TemporaryDirectory() as cartella:
+		percorso = os.path.join(cartella, 'sessioni.bin')
+		registro_sintetico(percorso, args.mani, args.per_sessione, rng)
+		dimensione = os.path.getsize(percorso)
+		inizio = time.perf_counter()
+		sessioni = leggi_sessioni(percorso)
+		lettura = time.perf_counter() - inizio
+		inizio = time.perf_counter()
+		attuale = riproduci(sessioni)[0]
+		rigioco = time.perf_counter() - inizio
+		alternativa = CONFIGURAZIONE_PREDEFINITA._replace(tabella_vincite=dict(TABELLA_VINCITE, **{"Scala a colore": 60}))
+		inizio = time.perf_counter()
+		doppio = riproduci(sessioni, [("attuale", valuta_indice, CONFIGURAZIONE_PREDEFINITA), ("Scala a colore=60", valuta_indice, alternativa)])
+		confronto = time.perf_counter() - inizio
+	assert doppio[0] == attuale
+	mani = attuale['mani_registrate']
+	print(f"Registro: {mani} mani in {len(sessioni)} sessioni, {dimensione} byte ({dimensione / mani:.2f} byte/mano)")
+	print(f"Lettura {lettura:.2f}s | riproduzione {rigioco:.2f}s ({mani / rigioco:,.0f} mani/s) | "
+		f"con una tabella alternativa {confronto:.2f}s")
+	sys.exit(1 if differenze else 0)
+
+if __name__ == "__main__":
+	main()
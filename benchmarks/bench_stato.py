@@ -0,0 +1,98 @@
+# Salvataggio e caricamento dello stato: formato di stato.py contro pickle
+# Confronta, sullo stesso stato realistico (finestra mobile piena):
+# - pickle schema 2 (il file dati precedente, finestra di dizionari)
+# - pickle schema 3 (stessi dati del nuovo formato, per isolare il codec)
+# - stato.py, codifica/decodifica in memoria e su file (con e senza fsync)
+# I campioni dei formati si alternano, cosi' le variazioni della CPU (frequenza,
+# altri processi) pesano allo stesso modo su tutti.
+# Uso: python benchmarks/bench_stato.py [--rapido]
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from collections import deque
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esegui import dati_di_prova, riassumi
+from stato import codifica_stato, decodifica_stato, leggi_stato, scrivi_stato
+from statistiche import DIMENSIONE_FINESTRA
+from valutatore import CATEGORIE
+
+def schema_2(dati):
+	# Lo stesso stato com'era prima: finestra di dizionari con il nome del punteggio
+	vecchi = dict(dati, versione_schema=2)
+	vecchi['ultime_mani'] = deque(({'r': CATEGORIE[c], 'p': p, 'v': v, 'l': l} for c, p, v, l in dati['ultime_mani']),
+		maxlen=DIMENSIONE_FINESTRA)
+	return vecchi
+
+def misura_alternata(funzioni, campioni, ripetizioni):
+	# funzioni: nome -> (funzione, ripetizioni relative). Ritorna nome -> riassunto in us
+	tempi = {nome: [] for nome in funzioni}
+	orologio = time.perf_counter
+	for _ in range(campioni):
+		for nome, (funzione, fattore) in funzioni.items():
+			volte = max(1, int(ripetizioni * fattore))
+			inizio = orologio()
+			for _ in range(volte):
+				funzione()
+			tempi[nome].append((orologio() - inizio) / volte * 1e6)
+	return {nome: riassumi(valori) for nome, valori in tempi.items()}
+
+def scrivi_pickle(percorso, dati):
+	with open(percorso, 'wb') as f:
+		pickle.dump(dati, f)
+
+def leggi_pickle(percorso):
+	with open(percorso, 'rb') as f:
+		return pickle.load(f)
+
+def main():
+	parser = argparse.ArgumentParser(description="Latenza di salvataggio e caricamento dello stato")
+	parser.add_argument('--rapido', action='store_true')
+	args = parser.parse_args()
+	campioni, ripetizioni = (10, 200) if args.rapido else (30, 500)
+	dati = dati_di_prova()
+	vecchi = schema_2(dati)
+	contenuto = codifica_stato(dati)
+	assert decodifica_stato(contenuto) == dati
+	formati = {'pickle schema 2': pickle.dumps(vecchi), 'pickle schema 3': pickle.dumps(dati), 'stato.py': contenuto}
+	salva = misura_alternata({
+		'pickle schema 2': (partial(pickle.dumps, vecchi), 1),
+		'pickle schema 3': (partial(pickle.dumps, dati), 1),
+		'stato.py': (partial(codifica_stato, dati), 1),
+	}, campioni, ripetizioni)
+	carica = misura_alternata({
+		'pickle schema 2': (partial(pickle.loads, formati['pickle schema 2']), 1),
+		'pickle schema 3': (partial(pickle.loads, formati['pickle schema 3']), 1),
+		'stato.py': (partial(decodifica_stato, contenuto), 1),
+	}, campioni, ripetizioni)
+	print(f"{'in memoria':<20}{'byte':>7}{'salva p50 us':>14}{'carica p50 us':>15}")
+	for nome, byte in formati.items():
+		print(f"{nome:<20}{len(byte):>7}{salva[nome]['p50']:>14.1f}{carica[nome]['p50']:>15.1f}")
+	with tempfile.TemporaryDirectory() as cartella:
+		vecchio = os.path.join(cartella, 'dati.pkl')
+		nuovo = os.path.join(cartella, 'stato.bin')
+		salva_file = misura_alternata({
+			'pickle schema 2': (partial(scrivi_pickle, vecchio, vecchi), 1),
+			'stato.py, fsync': (lambda: scrivi_stato(nuovo, codifica_stato(dati)), 0.2),
+			'stato.py, senza fsync': (lambda: scrivi_stato(nuovo, codifica_stato(dati), sincronizza=False), 1),
+		}, campioni, ripetizioni // 10)
+		carica_file = misura_alternata({
+			'pickle schema 2': (partial(leggi_pickle, vecchio), 1),
+			'stato.py': (partial(leggi_stato, nuovo), 1),
+		}, campioni, ripetizioni)
+	print(f"\n{'su file':<22}{'salva p50 us':>14}")
+	for nome, riassunto in salva_file.items():
+		print(f"{nome:<22}{riassunto['p50']:>14.1f}")
+	print(f"{'su file':<22}{'carica p50 us':>14}")
+	for nome, riassunto in carica_file.items():
+		print(f"{nome:<22}{riassunto['p50']:>14.1f}")
+	rapporto = carica['stato.py']['p50'] / min(carica['pickle schema 2']['p50'], carica['pickle schema 3']['p50'])
+	print(f"\nCaricamento stato.py / miglior pickle: {rapporto:.2f}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,69 @@
+# Costo della strumentazione: la latenza di una mano intera in poker_machine()
+# con la strumentazione spenta e accesa, e una stima del costo da spenta.
+# La differenza tra due giri interi e' sotto il rumore, quindi il costo da spento
+# si ricava dai punti di misura attraversati in una mano (contati da un giro con
+# la strumentazione accesa) per il costo di ciascuno a vuoto (microbenchmark di
+# un test su variabile locale e di una chiamata @strumentato), diviso per il p50
+# della mano. Esce con 1 se supera la soglia.
+# Uso: python benchmarks/bench_strumentazione.py [--rapido] [--soglia 0.01]
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esegui import bench_mano_completa
+from misure import VARIABILE, strumentato
+from strumentazione import STRUMENTI
+
+SOGLIA_PREDEFINITA = 0.01 # 1% della latenza di una mano
+
+def costo_a_vuoto(ripetizioni=2_000_000):
+	# Nanosecondi di un test `if misura:` falso e di una chiamata @strumentato da spento,
+	# al netto del ciclo e della chiamata diretta (con strumentazione importata: il caso peggiore)
+	base = min(timeit.repeat('pass', setup='misura = False', number=ripetizioni, repeat=5))
+	test = min(timeit.repeat('if misura: pass', setup='misura = False', number=ripetizioni, repeat=5))
+	def vuota():
+		return None
+	avvolta = strumentato('vuota')(vuota)
+	diretta = min(timeit.repeat(vuota, number=ripetizioni, repeat=5))
+	decorata = min(timeit.repeat(avvolta, number=ripetizioni, repeat=5))
+	return (max(test - base, 0.0) / ripetizioni * 1e9,
+		max(decorata - diretta, 0.0) / ripetizioni * 1e9)
+
+def mano(accesa, rapido):
+	# Accesa: poker_machine() prende STRUMENTI come con la variabile d'ambiente
+	STRUMENTI.azzera()
+	STRUMENTI.contatori = STRUMENTI.attiva = accesa
+	os.environ[VARIABILE] = '1' if accesa else '0'
+	try:
+		return bench_mano_completa(rapido)['poker_machine/mano']
+	finally:
+		STRUMENTI.contatori = STRUMENTI.attiva = False
+		os.environ.pop(VARIABILE, None)
+
+def main():
+	parser = argparse.ArgumentParser(description="Costo della strumentazione sulla latenza di una mano")
+	parser.add_argument('--rapido', action='store_true')
+	parser.add_argument('--soglia', type=float, default=SOGLIA_PREDEFINITA)
+	args = parser.parse_args()
+	spenta = mano(False, args.rapido)
+	accesa = mano(True, args.rapido)
+	mani = STRUMENTI.mani or 1
+	segni = sum(v[0] for (tipo, _), v in STRUMENTI.voci.items() if tipo == 'fase') / mani
+	chiamate = sum(v[0] for (tipo, _), v in STRUMENTI.voci.items() if tipo == 'funzione') / mani
+	ns_test, ns_decoratore = costo_a_vuoto()
+	# Per mano: la lettura di STRUMENTI.attiva (contata come un test) e un test per segno
+	stima_us = ((segni + 1) * ns_test + chiamate * ns_decoratore) / 1e3
+	quota = stima_us / spenta['p50']
+	print(f"Mano p50: spenta {spenta['p50']:.1f} us | accesa {accesa['p50']:.1f} us "
+		f"({(accesa['p50'] / spenta['p50'] - 1) * 100:+.1f}%)")
+	print(f"Per mano: {segni:.1f} punti di misura a {ns_test:.1f} ns, "
+		f"{chiamate:.3f} chiamate @strumentato a {ns_decoratore:.1f} ns")
+	print(f"Costo da spenta: {stima_us * 1e3:.0f} ns per mano, {quota * 100:.3f}% "
+		f"(soglia {args.soglia * 100:.2f}%) [{'ok' if quota < args.soglia else 'SUPERATA'}]")
+	sys.exit(0 if quota < args.soglia else 1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,117 @@
+# Verifica di equivalenza e microbenchmark del valutatore a tabelle
+# Uso: python benchmarks/bench_valutatore.py [--rapido]
+import os
+import random
+import sys
+import time
+from collections import Counter, namedtuple
+from itertools import combinations_with_replacement
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from valutatore import NUM_CODICI, NUM_SEMI, valuta_codici
+
+CARTE_PER_MANO = 5
+VALORE_JACK = 11
+VALORE_REGINA = 12
+VALORE_RE = 13
+VALORE_ASSO = 14
+SEMI = ("Cuori", "Quadri", "Fiori", "Picche")
+# Carta minima con gli attributi letti dalla vecchia valuta_mano
+CartaProva = namedtuple("CartaProva", "valore seme_id seme_nome")
+
+def carta_da_codice(codice):
+	seme = codice % NUM_SEMI
+	return CartaProva(codice // NUM_SEMI + 1, seme, SEMI[seme])
+
+def valuta_mano_classica(mano: list):
+	# Implementazione originale (Counter/sort/set), tenuta come riferimento
+	if not mano or len(mano) != CARTE_PER_MANO:
+		return "Mano non valida"
+	valori_numerici = sorted([c.valore if c.valore != 1 else VALORE_ASSO for c in mano], reverse=True)
+	valori_numerici_per_scala = sorted(list(set(
+		[c.valore for c in mano if c.valore != 1] + \
+		([1] if any(c.valore == 1 for c in mano) else []) + \
+		([VALORE_ASSO] if any(c.valore == 1 for c in mano) else [])
+	)))
+	semi = [c.seme_nome for c in mano]
+	conta_valori = Counter(valori_numerici)
+	conta_semi = Counter(semi)
+	conteggi = sorted(conta_valori.values(), reverse=True)
+	is_scala = False
+	if len(valori_numerici_per_scala) >= 5:
+		for i in range(len(valori_numerici_per_scala) - 4):
+			if all(valori_numerici_per_scala[i+j] == valori_numerici_per_scala[i] + j for j in range(5)):
+				is_scala = True
+				if set(valori_numerici_per_scala[i:i+5]) == {10, VALORE_JACK, VALORE_REGINA, VALORE_RE, VALORE_ASSO}:
+					is_scala_reale_potenziale = True
+				else:
+					is_scala_reale_potenziale = False
+				break
+	is_colore = len(conta_semi) == 1
+	if is_scala and is_colore:
+		if is_scala_reale_potenziale:
+			return "Scala Reale"
+		else:
+			return "Scala a colore"
+	if conteggi[0] >= 5:
+		return "Super Poker"
+	if conteggi[0] == 4:
+		return "Poker"
+	if conteggi == [3, 2]:
+		return "Full"
+	if is_colore:
+		return "Colore"
+	if is_scala:
+		return "Scala"
+	if conteggi[0] == 3:
+		return "Tris"
+	if conteggi == [2, 2, 1]:
+		return "Doppia coppia"
+	if conteggi[0] == 2:
+		valore_coppia = [v for v, count in conta_valori.items() if count == 2][0]
+		if valore_coppia >= VALORE_JACK:
+			return "Coppia pagata"
+		else:
+			return "Coppia non pagata"
+	return "Carta alta"
+
+def verifica_equivalenza(rapido=False):
+	# Esaustiva: ogni multiinsieme di 5 codici (ripetizioni ammesse con NUM_MAZZI > 1).
+	# In modalita' rapida: ogni multiinsieme di valori, con e senza colore.
+	if rapido:
+		mani = []
+		for valori in combinations_with_replacement(range(NUM_CODICI // NUM_SEMI), 5):
+			mani.append([v * NUM_SEMI for v in valori])
+			mani.append([v * NUM_SEMI + (i % 2) for i, v in enumerate(valori)])
+	else:
+		mani = combinations_with_replacement(range(NUM_CODICI), 5)
+	verificate = 0
+	for codici in mani:
+		attesa = valuta_mano_classica([carta_da_codice(c) for c in codici])
+		ottenuta = valuta_codici(codici)
+		if attesa != ottenuta:
+			raise AssertionError(f"Mano {codici}: attesa {attesa}, ottenuta {ottenuta}")
+		verificate += 1
+	return verificate
+
+def mani_per_secondo(funzione, mani):
+	inizio = time.perf_counter()
+	for mano in mani:
+		funzione(mano)
+	return len(mani) / (time.perf_counter() - inizio)
+
+def main():
+	rapido = "--rapido" in sys.argv
+	inizio = time.perf_counter()
+	verificate = verifica_equivalenza(rapido)
+	print(f"Equivalenza verificata su {verificate} mani in {time.perf_counter() - inizio:.1f}s.")
+	rng = random.Random(12345)
+	codici = [tuple(rng.randrange(NUM_CODICI) for _ in range(5)) for _ in range(200000)]
+	carte = [[carta_da_codice(c) for c in mano] for mano in codici]
+	prima = mani_per_secondo(valuta_mano_classica, carte)
+	dopo = mani_per_secondo(valuta_codici, codici)
+	print(f"valuta_mano classica: {prima:,.0f} mani/s")
+	print(f"valuta_codici (tabelle): {dopo:,.0f} mani/s ({dopo / prima:.1f}x)")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,51 @@
+# Verifica incrociata e benchmark del valutatore vettoriale NumPy
+# Uso: python benchmarks/bench_valutatore_vettoriale.py [num_mani]
+import os
+import sys
+import time
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from valutatore import CATEGORIE, NUM_CODICI, codifica, valuta_indice
+from valutatore_vettoriale import valuta_batch
+
+DIMENSIONE_RISCALDAMENTO = 100_000
+# Casi limite: A-2-3-4-5, 10-J-Q-K-A (anche a colore), cinque uguali, J+ contro coppie basse
+CASI_LIMITE = {
+	"Scala": [codifica(1, 0), codifica(2, 1), codifica(3, 0), codifica(4, 2), codifica(5, 3)],
+	"Scala a colore": [codifica(1, 2), codifica(2, 2), codifica(3, 2), codifica(4, 2), codifica(5, 2)],
+	"Scala Reale": [codifica(10, 1), codifica(11, 1), codifica(12, 1), codifica(13, 1), codifica(1, 1)],
+	"Super Poker": [codifica(7, 0), codifica(7, 0), codifica(7, 1), codifica(7, 2), codifica(7, 3)],
+	"Coppia pagata": [codifica(11, 0), codifica(11, 1), codifica(2, 0), codifica(5, 1), codifica(9, 2)],
+	"Coppia non pagata": [codifica(10, 0), codifica(10, 1), codifica(2, 0), codifica(5, 1), codifica(9, 2)],
+}
+
+def verifica(codici):
+	attese = np.array([valuta_indice(mano) for mano in codici.tolist()], dtype=np.uint8)
+	ottenute = valuta_batch(codici)
+	diverse = np.nonzero(attese != ottenute)[0]
+	if len(diverse):
+		i = diverse[0]
+		raise AssertionError(f"Mano {codici[i].tolist()}: attesa {CATEGORIE[attese[i]]}, ottenuta {CATEGORIE[ottenute[i]]}")
+
+def main():
+	num_mani = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000_000
+	for nome, mano in CASI_LIMITE.items():
+		ottenuta = CATEGORIE[valuta_batch([mano])[0]]
+		assert ottenuta == nome, (mano, nome, ottenuta)
+	rng = np.random.default_rng(7)
+	verifica(rng.integers(0, NUM_CODICI, size=(200_000, 5), dtype=np.uint8))
+	tutte = np.array(list(combinations_with_replacement(range(NUM_CODICI), 5)), dtype=np.uint8)
+	verifica(tutte)
+	print(f"Verifica incrociata con valuta_indice: casi limite, 200000 mani casuali e {len(tutte)} multiinsiemi: OK")
+	codici = rng.integers(0, NUM_CODICI, size=(num_mani, 5), dtype=np.uint8)
+	valuta_batch(codici[:DIMENSIONE_RISCALDAMENTO])
+	inizio = time.perf_counter()
+	valuta_batch(codici)
+	secondi = time.perf_counter() - inizio
+	print(f"valuta_batch: {num_mani / secondi:,.0f} mani/s ({num_mani} mani in {secondi:.3f}s)")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,132 @@
+# Test di carico del server: N sessioni simulate concorrenti giocano M mani
+# ciascuna e si misura la latenza di una mano (dalla puntata al RISULTATO).
+# Senza --porta avvia server.py in un sottoprocesso con una cartella temporanea.
+# Uso: python benchmarks/carico_server.py [--sessioni 1000] [--mani 20] [--porta 8765] [--uscita carico.json]
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+from esegui import riassumi
+
+TENUTE = ('', '1', '12', '123', '1234', '12345', '45', '?') # '?' chiede anche il consiglio
+
+async def giocatore(host, porta, nome, num_mani, rng, latenze, contatori):
+	giocate = 0
+	while giocate < num_mani:
+		reader, writer = await asyncio.open_connection(host, porta)
+		inizio_mano = None
+		try:
+			while True:
+				riga = await reader.readline()
+				if not riga:
+					contatori['disconnessioni'] += 1
+					return
+				riga = riga.decode('utf-8').rstrip('\n')
+				etichetta = riga.split(' ', 1)[0]
+				if etichetta == 'NOME':
+					risposta = nome
+				elif etichetta == 'PUNTATA':
+					if giocate >= num_mani:
+						risposta = ''
+					else:
+						inizio_mano = time.perf_counter()
+						risposta = 'm'
+				elif etichetta == 'TIENI':
+					risposta = rng.choice(TENUTE)
+					if risposta == '?':
+						if rng.random() < 0.9: # raramente: il consiglio costa decine di ms
+							risposta = '12'
+						else:
+							contatori['consigli'] += 1
+				elif etichetta == 'RISULTATO':
+					latenze.append((time.perf_counter() - inizio_mano) * 1e6)
+					giocate += 1
+					continue
+				elif etichetta == 'GAMEOVER':
+					contatori['game_over'] += 1
+					break # si riconnette: carica_dati ricarica le fiches
+				elif etichetta in ('CIAO', 'ERRORE'):
+					if etichetta == 'ERRORE':
+						contatori['errori'] += 1
+					if giocate >= num_mani:
+						return
+					continue
+				else:
+					continue
+				writer.write((risposta + '\n').encode('utf-8'))
+				await writer.drain()
+		finally:
+			writer.close()
+
+def porta_libera():
+	with socket.socket() as s:
+		s.bind(('127.0.0.1', 0))
+		return s.getsockname()[1]
+
+async def attendi_server(host, porta, scadenza=10.0):
+	fine = time.monotonic() + scadenza
+	while True:
+		try:
+			reader, writer = await asyncio.open_connection(host, porta)
+			writer.close()
+			return
+		except OSError:
+			if time.monotonic() > fine:
+				raise
+			await asyncio.sleep(0.05)
+
+async def carico(host, porta, num_sessioni, num_mani, seed):
+	latenze = []
+	contatori = {'game_over': 0, 'errori': 0, 'disconnessioni': 0, 'consigli': 0}
+	rng = random.Random(seed)
+	inizio = time.perf_counter()
+	await asyncio.gather(*(
+		giocatore(host, porta, f"bot{i}", num_mani, random.Random(rng.random()), latenze, contatori)
+		for i in range(num_sessioni)
+	))
+	return latenze, contatori, time.perf_counter() - inizio
+
+def main():
+	parser = argparse.ArgumentParser(description="Test di carico del server della Poker Machine")
+	parser.add_argument('--sessioni', type=int, default=1000)
+	parser.add_argument('--mani', type=int, default=20, help="Mani per sessione")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--porta', type=int, help="Server gia' avviato; altrimenti ne avvia uno temporaneo")
+	parser.add_argument('--seed', type=int, default=42)
+	parser.add_argument('--uscita', help="File JSON dove salvare i risultati")
+	args = parser.parse_args()
+	processo = cartella = None
+	porta = args.porta
+	if porta is None:
+		porta = porta_libera()
+		cartella = tempfile.mkdtemp(prefix='carico_pm_')
+		processo = subprocess.Popen([sys.executable, os.path.join(RADICE, 'server.py'), '--host', args.host,
+			'--porta', str(porta), '--cartella', cartella], stdout=subprocess.DEVNULL)
+	try:
+		asyncio.run(attendi_server(args.host, porta))
+		latenze, contatori, durata = asyncio.run(carico(args.host, porta, args.sessioni, args.mani, args.seed))
+	finally:
+		if processo is not None:
+			processo.terminate()
+			processo.wait()
+			shutil.rmtree(cartella, ignore_errors=True)
+	misura = riassumi(latenze, 1, sessioni=args.sessioni, durata_s=durata, **contatori)
+	print(f"Sessioni concorrenti: {args.sessioni} | mani: {len(latenze)} in {durata:.1f}s ({len(latenze) / durata:,.0f} mani/s)")
+	print(f"Latenza mano: p50 {misura['p50'] / 1000:.2f}ms | p90 {misura['p90'] / 1000:.2f}ms | p99 {misura['p99'] / 1000:.2f}ms | max {misura['max'] / 1000:.2f}ms")
+	print(f"Game over: {contatori['game_over']} | consigli: {contatori['consigli']} | errori: {contatori['errori']} | disconnessioni: {contatori['disconnessioni']}")
+	if args.uscita:
+		with open(args.uscita, 'w', encoding='utf-8') as f:
+			json.dump({'risultati': {'server/mano': misura}}, f, indent=1)
+
+if __name__ == "__main__":
+	main()
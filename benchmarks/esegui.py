@@ -0,0 +1,316 @@
+# Suite di benchmark: un unico punto di ingresso per accorgersi delle regressioni
+# Misura separatamente valutazione delle mani, calcolo vincite, scarpa,
+# salvataggio/caricamento, formattazione delle date e latenza di una mano intera
+# in poker_machine() con input() simulato. Ogni benchmark raccoglie piu' campioni
+# (ciascuno la media di un blocco di chiamate) e ne riporta i percentili in JSON.
+# Uso: python benchmarks/esegui.py [--uscita risultati.json] [--rapido] [--solo nome ...]
+#      python benchmarks/esegui.py --confronta base.json            (esegue e confronta)
+#      python benchmarks/esegui.py --confronta base.json nuovo.json (confronta due file)
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pokermachine
+from diario import FILE_DIARIO, nuovo_record
+from regole import NUM_MAZZI, TABELLA_VINCITE, EsitoMano, calcola_vincita
+from scarpa import Scarpa
+from statistiche import DIMENSIONE_FINESTRA, registra_mano
+from valutatore import CATEGORIE, codifica
+
+SEED = 20251018
+SOGLIA_PREDEFINITA = 0.10 # Regressione se il p50 peggiora di oltre il 10%
+
+# --- Misura ---
+def percentile(ordinati, p):
+	# Interpolazione lineare tra i due campioni vicini
+	if not ordinati:
+		return 0.0
+	posizione = (len(ordinati) - 1) * p / 100
+	basso = int(posizione)
+	alto = min(basso + 1, len(ordinati) - 1)
+	return ordinati[basso] + (ordinati[alto] - ordinati[basso]) * (posizione - basso)
+
+def riassumi(campioni_us, operazioni_per_campione=1, **extra):
+	ordinati = sorted(campioni_us)
+	media = sum(ordinati) / len(ordinati)
+	risultato = {
+		'unita': 'us',
+		'campioni': len(ordinati),
+		'operazioni_per_campione': operazioni_per_campione,
+		'min': ordinati[0],
+		'p50': percentile(ordinati, 50),
+		'p90': percentile(ordinati, 90),
+		'p99': percentile(ordinati, 99),
+		'max': ordinati[-1],
+		'media': media,
+		'operazioni_al_secondo': 1e6 / media if media else 0.0
+	}
+	risultato.update(extra)
+	return risultato
+
+def misura(funzione, campioni, ripetizioni):
+	# Ogni campione: tempo medio per chiamata su `ripetizioni` chiamate, in microsecondi
+	tempi = []
+	orologio = time.perf_counter
+	for _ in range(campioni):
+		inizio = orologio()
+		for _ in range(ripetizioni):
+			funzione()
+		tempi.append((orologio() - inizio) / ripetizioni * 1e6)
+	return riassumi(tempi, ripetizioni)
+
+def misura_su_lista(funzione, argomenti, campioni):
+	# Come misura, ma ogni campione scorre tutta la lista di argomenti
+	tempi = []
+	orologio = time.perf_counter
+	for _ in range(campioni):
+		inizio = orologio()
+		for a in argomenti:
+			funzione(a)
+		tempi.append((orologio() - inizio) / len(argomenti) * 1e6)
+	return riassumi(tempi, len(argomenti))
+
+# --- Benchmark ---
+# Una mano di esempio per categoria (valore 1..13, seme 0..3)
+MANI_ESEMPIO = {
+	"Carta alta": [(2, 0), (5, 1), (9, 2), (11, 3), (13, 0)],
+	"Coppia non pagata": [(4, 0), (4, 1), (9, 2), (11, 3), (13, 0)],
+	"Coppia pagata": [(12, 0), (12, 1), (3, 2), (7, 3), (9, 0)],
+	"Doppia coppia": [(6, 0), (6, 1), (9, 2), (9, 3), (13, 0)],
+	"Tris": [(8, 0), (8, 1), (8, 2), (2, 3), (13, 0)],
+	"Scala": [(5, 0), (6, 1), (7, 2), (8, 3), (9, 0)],
+	"Colore": [(2, 2), (6, 2), (9, 2), (11, 2), (13, 2)],
+	"Full": [(10, 0), (10, 1), (10, 2), (3, 3), (3, 0)],
+	"Poker": [(7, 0), (7, 1), (7, 2), (7, 3), (1, 0)],
+	"Super Poker": [(7, 0), (7, 1), (7, 2), (7, 3), (7, 0)],
+	"Scala a colore": [(5, 3), (6, 3), (7, 3), (8, 3), (9, 3)],
+	"Scala Reale": [(1, 1), (10, 1), (11, 1), (12, 1), (13, 1)]
+}
+
+def bench_valuta_mano(rapido):
+	risultati = {}
+	campioni = 20 if rapido else 50
+	for nome, carte in MANI_ESEMPIO.items():
+		mano = [codifica(v, s) for v, s in carte]
+		assert pokermachine.valuta_mano(mano) == nome, nome
+		risultati[f'valuta_mano/{nome}'] = misura_su_lista(pokermachine.valuta_mano, [mano] * 2000, campioni)
+	# Mix reale: mani servite da una scarpa con la frequenza naturale delle categorie
+	scarpa = Scarpa(NUM_MAZZI, seed=SEED)
+	mani = []
+	for _ in range(20000):
+		scarpa.rimescola_se_necessario()
+		mani.append(scarpa.pesca(5))
+	risultati['valuta_mano/mix'] = misura_su_lista(pokermachine.valuta_mano, mani, campioni)
+	return risultati
+
+def bench_calcola_vincita(rapido):
+	argomenti = [(nome, puntata) for nome in CATEGORIE for puntata in (1, 6, 37, 250, 10000)] * 40
+	funzione = lambda a: calcola_vincita(a[0], a[1])
+	return {'calcola_vincita': misura_su_lista(funzione, argomenti, 20 if rapido else 50)}
+
+def bench_scarpa(rapido):
+	campioni = 20 if rapido else 50
+	ripetizioni = 2000
+	scarpa = Scarpa(NUM_MAZZI, seed=SEED)
+	def mano_completa():
+		# Una mano come nel gioco: controllo soglia, 5 carte, scarto e pesca di 3
+		scarpa.rimescola_se_necessario()
+		mano = scarpa.pesca(5)
+		scarpa.scarta(mano[2:])
+		scarpa.pesca(3)
+	pesca_5 = lambda: (scarpa.rimescola_se_necessario(), scarpa.pesca(5))
+	return {
+		'scarpa/pesca_5': misura(pesca_5, campioni, ripetizioni),
+		'scarpa/mano_con_scarto_3': misura(mano_completa, campioni, ripetizioni),
+		'scarpa/ricostruisci': misura(scarpa.ricostruisci, campioni, ripetizioni),
+		'scarpa/nuova': misura(partial(Scarpa, NUM_MAZZI, seed=SEED), campioni, 200)
+	}
+
+def dati_di_prova():
+	# Stato allo schema corrente, con la finestra mobile delle ultime mani piena
+	adesso = int(time.time())
+	dati = pokermachine.migra_dati({
+		'launches': 100, 'mani_giocate': 50000, 'data_ultimo_fallimento': adesso,
+		'record_mani_senza_fallimenti': 399, 'mani_dall_ultimo_fallimento': 81,
+		'fiches_guadagnate': 602006, 'fiches_perdute': 573798, 'fiches_attuali': 814,
+		'fallimenti': 14, 'killer_hand_count': 3,
+		'punteggi': {nome: {'conteggio': 1000, 'ultima_realizzazione': adesso} for nome in CATEGORIE},
+		'vincita_massima': 195000, 'data_vincita_massima': adesso,
+		'perdita_massima': 223958, 'data_perdita_massima': adesso,
+		'data_ultima_giocata': adesso, 'seq_diario': 0
+	})
+	rng = random.Random(SEED)
+	for _ in range(DIMENSIONE_FINESTRA):
+		registra_mano(dati, {'r': rng.choice(CATEGORIE), 'p': 10, 'v': rng.randrange(100), 'l': rng.randrange(2) * 10, 's': False})
+	return dati
+
+def scrivi_diario(percorso, num_righe):
+	# Righe di diario realistiche: lo stato da caricare cresce con le mani da riapplicare
+	rng = random.Random(SEED)
+	adesso = int(time.time())
+	with open(percorso, 'w', encoding='utf-8') as f:
+		for n in range(1, num_righe + 1):
+			punteggio = rng.choice(CATEGORIE)
+			restituito = 10 * TABELLA_VINCITE[punteggio]
+			esito = EsitoMano(800, restituito, max(restituito - 10, 0), 0 if restituito >= 10 else 10, 0, 0)
+			record = nuovo_record(n, adesso, 10, [rng.randrange(52) for _ in range(5)], punteggio, esito, 3, False, False)
+			f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+def bench_persistenza(rapido):
+	risultati = {}
+	campioni = 10 if rapido else 30
+	cartella = tempfile.mkdtemp(prefix='bench_pm_')
+	vecchia = os.getcwd()
+	os.chdir(cartella) # FILE_DATI e FILE_DIARIO sono relativi alla cartella corrente
+	try:
+		dati = dati_di_prova()
+		with contextlib.redirect_stdout(io.StringIO()):
+			risultati['salva_dati'] = misura(partial(pokermachine.salva_dati, dati), campioni, 50)
+			for righe in (0, 100, 1000) if rapido else (0, 100, 1000, 10000):
+				pokermachine.salva_dati(dati_di_prova())
+				scrivi_diario(FILE_DIARIO, righe)
+				ripetizioni = max(1, 2000 // (righe + 1))
+				risultati[f'carica_dati/diario_{righe}'] = misura(pokermachine.carica_dati, campioni, ripetizioni)
+				risultati[f'carica_dati/diario_{righe}']['byte_stato'] = os.path.getsize(pokermachine.FILE_DATI) + os.path.getsize(FILE_DIARIO)
+	finally:
+		os.chdir(vecchia)
+		shutil.rmtree(cartella, ignore_errors=True)
+	return risultati
+
+def bench_formatta_tempo(rapido):
+	adesso = datetime.now()
+	date = [None] + [int((adesso - delta).timestamp()) for delta in (
+		timedelta(seconds=5), timedelta(minutes=7), timedelta(hours=3), timedelta(days=1),
+		timedelta(days=12), timedelta(days=95), timedelta(days=800)
+	)]
+	return {'formatta_tempo_trascorso': misura_su_lista(pokermachine.formatta_tempo_trascorso, date * 100, 10 if rapido else 30)}
+
+def bench_mano_completa(rapido):
+	# Latenza di una mano intera attraverso poker_machine(): dalla richiesta di
+	# puntata alla successiva, con output soppresso e scarpa a seme fisso.
+	num_mani = 300 if rapido else 1500
+	tenute = ('', '1', '12', '123', '12345', '45')
+	latenze = []
+	stato = {'mani': 0, 'ultimo': None}
+	def input_simulato(prompt=''):
+		adesso = time.perf_counter()
+		if prompt.startswith('\nMani:'):
+			if stato['ultimo'] is not None:
+				latenze.append((adesso - stato['ultimo']) * 1e6)
+			stato['ultimo'] = adesso
+			if stato['mani'] >= num_mani:
+				return '' # Uscita dal gioco
+			stato['mani'] += 1
+			return 'm'
+		return tenute[stato['mani'] % len(tenute)]
+	cartella = tempfile.mkdtemp(prefix='bench_pm_')
+	vecchia = os.getcwd()
+	input_originale = builtins.input
+	seed_originale = pokermachine.nuovo_seed
+	os.chdir(cartella)
+	builtins.input = input_simulato
+	pokermachine.nuovo_seed = lambda: SEED
+	try:
+		with contextlib.redirect_stdout(io.StringIO()) as uscita:
+			while stato['mani'] < num_mani:
+				stato['ultimo'] = None # Dopo un game over si riparte: il riavvio non e' una mano
+				pokermachine.poker_machine()
+				uscita.seek(0)
+				uscita.truncate()
+	finally:
+		builtins.input = input_originale
+		pokermachine.nuovo_seed = seed_originale
+		os.chdir(vecchia)
+		shutil.rmtree(cartella, ignore_errors=True)
+	return {'poker_machine/mano': riassumi(latenze)}
+
+BENCHMARK = {
+	'valuta_mano': bench_valuta_mano,
+	'calcola_vincita': bench_calcola_vincita,
+	'scarpa': bench_scarpa,
+	'persistenza': bench_persistenza,
+	'formatta_tempo': bench_formatta_tempo,
+	'mano_completa': bench_mano_completa
+}
+
+def esegui(nomi, rapido=False):
+	risultati = {}
+	for nome in nomi:
+		inizio = time.perf_counter()
+		risultati.update(BENCHMARK[nome](rapido))
+		print(f"{nome}: {time.perf_counter() - inizio:.1f}s", file=sys.stderr)
+	return {
+		'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+		'versione': pokermachine.VERSIONE,
+		'python': platform.python_version(),
+		'piattaforma': platform.platform(),
+		'rapido': rapido,
+		'risultati': risultati
+	}
+
+# --- Confronto ---
+def confronta(base, nuovo, soglia=SOGLIA_PREDEFINITA):
+	# Ritorna una lista di (nome, p50 base, p50 nuovo, variazione, regressione)
+	righe = []
+	for nome, misura_nuova in sorted(nuovo['risultati'].items()):
+		misura_base = base['risultati'].get(nome)
+		if misura_base is None or not misura_base['p50']:
+			continue
+		variazione = misura_nuova['p50'] / misura_base['p50'] - 1
+		righe.append((nome, misura_base['p50'], misura_nuova['p50'], variazione, variazione > soglia))
+	return righe
+
+def stampa_confronto(righe, soglia):
+	print(f"{'benchmark':<38} {'p50 base':>12} {'p50 nuovo':>12} {'var.':>8}")
+	for nome, p50_base, p50_nuovo, variazione, regressione in righe:
+		segno = '  REGRESSIONE' if regressione else ''
+		print(f"{nome:<38} {p50_base:>10.3f}us {p50_nuovo:>10.3f}us {variazione:>+8.1%}{segno}")
+	regressioni = sum(r[4] for r in righe)
+	print(f"\n{regressioni} regressioni oltre il {soglia:.0%} su {len(righe)} benchmark confrontati.")
+	return regressioni
+
+def stampa_risultati(esito):
+	print(f"{'benchmark':<38} {'p50':>10} {'p90':>10} {'p99':>10} {'op/s':>14}")
+	for nome, m in esito['risultati'].items():
+		print(f"{nome:<38} {m['p50']:>8.3f}us {m['p90']:>8.3f}us {m['p99']:>8.3f}us {m['operazioni_al_secondo']:>14,.0f}")
+
+def main():
+	parser = argparse.ArgumentParser(description="Suite di benchmark della Poker Machine")
+	parser.add_argument('--uscita', help="File JSON dove salvare i risultati")
+	parser.add_argument('--rapido', action='store_true', help="Meno campioni e mani, per un controllo veloce")
+	parser.add_argument('--solo', nargs='+', choices=sorted(BENCHMARK), help="Esegue solo questi benchmark")
+	parser.add_argument('--confronta', nargs='+', metavar='JSON', help="BASE [NUOVO]: confronta con una base (senza NUOVO esegue la suite)")
+	parser.add_argument('--soglia', type=float, default=SOGLIA_PREDEFINITA, help="Peggioramento relativo del p50 considerato regressione")
+	args = parser.parse_args()
+	if args.confronta and len(args.confronta) > 2:
+		parser.error("--confronta accetta al massimo due file")
+	if args.confronta and len(args.confronta) == 2:
+		with open(args.confronta[1], encoding='utf-8') as f:
+			esito = json.load(f)
+	else:
+		esito = esegui(args.solo or list(BENCHMARK), args.rapido)
+		stampa_risultati(esito)
+		if args.uscita:
+			with open(args.uscita, 'w', encoding='utf-8') as f:
+				json.dump(esito, f, indent=1)
+	if args.confronta:
+		with open(args.confronta[0], encoding='utf-8') as f:
+			base = json.load(f)
+		print()
+		if stampa_confronto(confronta(base, esito, args.soglia), args.soglia):
+			sys.exit(1)
+
+if __name__ == "__main__":
+	main()
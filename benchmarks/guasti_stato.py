@@ -0,0 +1,142 @@
+# Prova di guasti sul file di stato
+# - Processo ucciso (SIGKILL) in un momento a caso mentre salva in continuazione:
+#   il file principale deve esserci, valido e non piu' vecchio dell'ultimo
+#   salvataggio confermato dal figlio (quello in corso puo' esserci o no).
+# - File danneggiati a mano: troncato, un byte alterato, principale cancellato,
+#   principale e precedente entrambi illeggibili.
+# Esce con 1 se un esito e' sbagliato.
+# Uso: python benchmarks/guasti_stato.py [--prove 100] [--seed 20251018]
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+import pokermachine
+from esegui import dati_di_prova
+from stato import SUFFISSO_PRECEDENTE, codifica_stato, leggi_stato, scrivi_stato
+
+def figlio(percorso):
+	# Salva senza sosta; dopo ogni salvataggio concluso scrive il contatore su stdout
+	dati = dati_di_prova()
+	dati['launches'] = 0
+	while True:
+		dati['launches'] += 1
+		pokermachine.salva_dati(dati, percorso)
+		sys.stdout.write(f"{dati['launches']}\n")
+		sys.stdout.flush()
+
+def uccisione(cartella, rng):
+	# Una prova: (esito, messaggio, interrotto a meta' scrittura)
+	percorso = os.path.join(cartella, 'stato.bin')
+	processo = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--figlio', percorso],
+		stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+	processo.stdout.readline() # Primo salvataggio concluso: il figlio e' avviato
+	time.sleep(rng.uniform(0, 0.05))
+	processo.send_signal(signal.SIGKILL if hasattr(signal, 'SIGKILL') else signal.SIGTERM)
+	processo.wait()
+	confermati = [int(riga) for riga in processo.stdout.read().split()] or [1]
+	processo.stdout.close()
+	ultimo = max(confermati)
+	a_meta = os.path.exists(percorso + '.tmp')
+	if not os.path.exists(percorso):
+		return False, "file principale mancante dopo il crash", a_meta
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			dati = leggi_stato(percorso)
+	except ValueError as e:
+		return False, f"stato illeggibile: {e}", a_meta
+	if dati is None:
+		return False, "nessuno stato dopo il crash", a_meta
+	if not ultimo <= dati['launches'] <= ultimo + 1:
+		return False, f"letto il salvataggio {dati['launches']}, confermato {ultimo}", a_meta
+	# Il gioco riparte dallo stato lasciato dal crash e lo salva di nuovo
+	if not pokermachine.salva_dati(dati, percorso) or leggi_stato(percorso) != dati:
+		return False, "salvataggio dopo il ripristino non riuscito", a_meta
+	return True, f"salvataggio {dati['launches']} (confermato {ultimo})", a_meta
+
+def danneggiamenti(cartella):
+	# (nome, esito, dettaglio) per ogni file rovinato a mano
+	percorso = os.path.join(cartella, 'danni.bin')
+	precedente = dati_di_prova()
+	attuale = dict(precedente, launches=precedente['launches'] + 1)
+	def prepara():
+		for nome in (percorso, percorso + SUFFISSO_PRECEDENTE, percorso + '.danneggiato'):
+			if os.path.exists(nome):
+				os.remove(nome)
+		scrivi_stato(percorso, codifica_stato(precedente))
+		scrivi_stato(percorso, codifica_stato(attuale))
+	def troncato():
+		with open(percorso, 'r+b') as f:
+			f.truncate(os.path.getsize(percorso) // 2)
+	def alterato():
+		with open(percorso, 'r+b') as f:
+			f.seek(100)
+			byte = f.read(1)
+			f.seek(100)
+			f.write(bytes([byte[0] ^ 0x40]))
+	def mancante():
+		os.remove(percorso)
+	def entrambi():
+		for nome in (percorso, percorso + SUFFISSO_PRECEDENTE):
+			with open(nome, 'wb') as f:
+				f.write(b'PKMS rovinato')
+	esiti = []
+	for nome, guasto, atteso in (
+			("principale intatto", lambda: None, attuale),
+			("principale troncato", troncato, precedente),
+			("un byte alterato", alterato, precedente),
+			("principale cancellato", mancante, precedente)):
+		prepara()
+		guasto()
+		with contextlib.redirect_stdout(io.StringIO()) as uscita:
+			letto = leggi_stato(percorso)
+		esiti.append((nome, letto == atteso, uscita.getvalue().strip() or "letto senza avvisi"))
+	prepara()
+	entrambi()
+	with contextlib.redirect_stdout(io.StringIO()) as uscita:
+		dati = pokermachine.carica_dati(percorso, None, None)
+	ok = dati['launches'] == 1 and os.path.exists(percorso + '.danneggiato')
+	esiti.append(("principale e precedente rovinati", ok, uscita.getvalue().strip().splitlines()[0]))
+	return esiti
+
+def main():
+	parser = argparse.ArgumentParser(description="Prova di guasti sul file di stato")
+	parser.add_argument('--prove', type=int, default=100, help="Processi uccisi durante il salvataggio")
+	parser.add_argument('--seed', type=int, default=20251018)
+	parser.add_argument('--figlio', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.figlio:
+		figlio(args.figlio)
+		return
+	rng = random.Random(args.seed)
+	cartella = tempfile.mkdtemp(prefix='guasti_stato_')
+	falliti = 0
+	try:
+		for nome, ok, dettaglio in danneggiamenti(cartella):
+			falliti += not ok
+			print(f"{'ok    ' if ok else 'ERRORE'} {nome}: {dettaglio}")
+		a_meta = 0
+		for prova in range(args.prove):
+			ok, dettaglio, interrotto = uccisione(cartella, rng)
+			a_meta += interrotto
+			if not ok:
+				falliti += 1
+				print(f"ERRORE uccisione {prova + 1}: {dettaglio}")
+		print(f"{'ok    ' if not falliti else 'ERRORE'} {args.prove} processi uccisi durante il salvataggio, "
+			f"{a_meta} con un file temporaneo a meta'" + (": stato sempre valido e aggiornato" if not falliti else ""))
+	finally:
+		shutil.rmtree(cartella, ignore_errors=True)
+	sys.exit(1 if falliti else 0)
+
+if __name__ == "__main__":
+	main()
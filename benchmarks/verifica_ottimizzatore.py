@@ -0,0 +1,101 @@
+# Verifica di ottimizzatore_puntate contro un Monte Carlo con le regole intere
+# Gioca vite di --mani mani con la politica esportata (PoliticaTabella, come in
+# simulazione.py --politica-file) e regole.regola_mano, estraendo la categoria di
+# ogni mano dalle stesse distribuzioni del modello (tenuta ottimale, nella KH
+# quella per la frazione scelta). Confronta P(fallimento) e E[log(1+fiches)] con
+# la programmazione dinamica: la differenza misura l'errore della griglia.
+# Esce con 1 se uno scarto supera 4 errori standard piu' la tolleranza.
+# Uso: python benchmarks/verifica_ottimizzatore.py [--mani 300] [--vite 5000] [--seed 20251018]
+import argparse
+import bisect
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ottimizzatore_puntate as op
+from regole import FICHES_INIZIALI, is_killer_hand, penalita_killer_hand, regola_mano
+from valutatore import CATEGORIE
+
+TOLLERANZA_FALLIMENTO = 0.01
+TOLLERANZA_CRESCITA = 0.05
+
+def cumulate(modello):
+	# (penalita', frazione) -> probabilita' cumulate delle categorie per l'estrazione con bisect
+	tabelle = {}
+	for penalita in modello['penalita']:
+		for frazione in modello['frazioni']:
+			in_puntate = penalita / 100 * (1 - frazione) / frazione if penalita else 0.0
+			probabilita = op.probabilita_categorie(modello['configurazione'], in_puntate)
+			tabelle[penalita, frazione] = np.cumsum(probabilita).tolist()
+	return tabelle
+
+def monte_carlo(politica, modello, mani, vite, rng, fiches_iniziali=FICHES_INIZIALI):
+	# (fallimenti, somma e somma dei quadrati di log(1+fiches) a fine vita)
+	configurazione = modello['configurazione']
+	tabelle = cumulate(modello)
+	frequenza = configurazione.killer_hand_frequenza
+	minima = configurazione.percentuale_minima_puntata
+	fallimenti, somma, quadrati = 0, 0.0, 0.0
+	for _ in range(vite):
+		fiches, killer_hand_count = fiches_iniziali, 0
+		for mano in range(1, mani + 1):
+			puntata = max(min(politica(fiches, mano, killer_hand_count), fiches), max(int(fiches * minima), 1))
+			speciale = is_killer_hand(mano, frequenza)
+			penalita = 0
+			if speciale:
+				killer_hand_count += 1
+				penalita = penalita_killer_hand(killer_hand_count, configurazione.max_penalita_kh)
+			frazione = politica.frazione(fiches, mano)
+			cumulata = tabelle[penalita, frazione]
+			categoria = CATEGORIE[min(bisect.bisect(cumulata, rng.random() * cumulata[-1]), len(CATEGORIE) - 1)]
+			fiches = regola_mano(categoria, puntata, fiches - puntata, speciale, penalita, configurazione.tabella_vincite).fiches
+			if fiches < 1:
+				fallimenti += 1
+				break
+		valore = math.log1p(max(fiches, 0))
+		somma += valore
+		quadrati += valore * valore
+	return fallimenti, somma, quadrati
+
+def main():
+	parser = argparse.ArgumentParser(description="Programmazione dinamica contro Monte Carlo con le regole intere")
+	parser.add_argument('--mani', type=int, default=300)
+	parser.add_argument('--vite', type=int, default=5000)
+	parser.add_argument('--seed', type=int, default=20251018)
+	args = parser.parse_args()
+	inizio = time.perf_counter()
+	modello = op.costruisci_modello()
+	print(f"Modello: {len(modello['griglia'])} livelli, {time.perf_counter() - inizio:.1f}s")
+	indice = op.posizione(modello['griglia'], modello['esatti'], modello['rapporto'], np.array([float(FICHES_INIZIALI)]))[0][0]
+	candidati = [("ottimale", None), (op.nome_frazione(0.15), modello['frazioni'].index(0.15))]
+	rng = random.Random(args.seed)
+	falliti = 0
+	with tempfile.TemporaryDirectory() as cartella:
+		for nome, azione in candidati:
+			valore, politica = op.indietro(modello, args.mani, 'crescita', azione)
+			vivi = op.avanti(modello, politica)
+			percorso = os.path.join(cartella, 'politica.npz')
+			op.salva_politica(percorso, modello, politica)
+			inizio = time.perf_counter()
+			fallimenti, somma, quadrati = monte_carlo(op.PoliticaTabella(percorso), modello, args.mani, args.vite, rng)
+			tempo = time.perf_counter() - inizio
+			p = fallimenti / args.vite
+			errore_p = math.sqrt(max(p * (1 - p), 1 / args.vite) / args.vite)
+			media = somma / args.vite
+			errore_media = math.sqrt(max(quadrati / args.vite - media * media, 0) / args.vite)
+			ok_p = abs(p - (1 - vivi[-1])) <= 4 * errore_p + TOLLERANZA_FALLIMENTO
+			ok_media = abs(media - valore[indice]) <= 4 * errore_media + TOLLERANZA_CRESCITA
+			falliti += (not ok_p) + (not ok_media)
+			print(f"{nome:<10} P(fallimento a {args.mani}): PD {1 - vivi[-1]:.4f} | MC {p:.4f} +- {errore_p:.4f} [{'ok' if ok_p else 'ERRORE'}]")
+			print(f"{'':<10} E[log(1+F)]: PD {valore[indice]:.4f} | MC {media:.4f} +- {errore_media:.4f} "
+				f"[{'ok' if ok_media else 'ERRORE'}] ({args.vite} vite in {tempo:.1f}s)")
+	sys.exit(1 if falliti else 0)
+
+if __name__ == "__main__":
+	main()
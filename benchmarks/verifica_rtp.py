@@ -0,0 +1,84 @@
+# Verifica e tempi di calcolo_rtp
+# - Valori attesi delle 32 tenute per classi di mani a caso, confrontati con
+#   risolutore.valuta_tenute (calcolo indipendente, mano per mano).
+# - Frequenze delle categorie servite con un mazzo contro i conteggi noti.
+# - Somma delle probabilita' delle classi e tempo di tavole, classi e RTP completo.
+# Uso: python benchmarks/verifica_rtp.py [mazzi ...] [--mani 50]
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import calcolo_rtp
+from risolutore import composizione_scarpa, valuta_tenute
+from valutatore import CATEGORIE
+
+TOLLERANZA = 1e-12
+# Mani servite per categoria con un solo mazzo, su C(52, 5) = 2598960
+SERVITE_UN_MAZZO = {
+	"Scala Reale": 4, "Scala a colore": 36, "Poker": 624, "Full": 3744, "Colore": 5108,
+	"Scala": 10200, "Tris": 54912, "Doppia coppia": 123552
+}
+
+def mano_della_classe(righe_e, classe):
+	# Codici carta (ordinati) del rappresentante: il seme s ha i valori della sua riga e
+	return sorted(r * 4 + s for s, riga in enumerate(righe_e[classe]) for r in calcolo_rtp.ELENCO[riga])
+
+def verifica_tenute(num_mazzi, num_mani, rng):
+	righe_e = calcolo_rtp.classi_mani(num_mazzi)[1]
+	valori = calcolo_rtp.valori_tenute(calcolo_rtp.PAGAMENTI, num_mazzi)
+	errore = 0.0
+	for _ in range(num_mani):
+		classe = rng.randrange(len(righe_e))
+		codici = mano_della_classe(righe_e, classe)
+		attesi = valuta_tenute(codici, composizione_scarpa(num_mazzi, codici))
+		errore = max(errore, max(abs(a - b) for a, b in zip(attesi, valori[classe])))
+	return errore
+
+def verifica_servite_un_mazzo():
+	peso = calcolo_rtp.classi_mani(1)[3]
+	errori = []
+	for nome, attese in SERVITE_UN_MAZZO.items():
+		indicatore = np.zeros(len(CATEGORIE))
+		indicatore[CATEGORIE.index(nome)] = 1
+		servite = peso @ calcolo_rtp.valori_tenute(indicatore, 1)[:, calcolo_rtp.NUM_TENUTE - 1] * 2598960
+		if abs(servite - attese) > 1e-6:
+			errori.append(f"{nome}: {servite:.6f} invece di {attese}")
+	return errori
+
+def main():
+	parser = argparse.ArgumentParser(description="Verifica e tempi del calcolo esatto dell'RTP")
+	parser.add_argument('mazzi', type=int, nargs='*', default=[1, 2, 10])
+	parser.add_argument('--mani', type=int, default=50, help="Classi a caso confrontate col risolutore")
+	args = parser.parse_args()
+	rng = random.Random(20251018)
+	falliti = verifica_servite_un_mazzo()
+	for errore in falliti:
+		print(f"ERRORE servite con un mazzo: {errore}")
+	for num_mazzi in args.mazzi:
+		inizio = time.perf_counter()
+		calcolo_rtp.tavole(num_mazzi)
+		tempo_tavole = time.perf_counter() - inizio
+		inizio = time.perf_counter()
+		classi = calcolo_rtp.classi_mani(num_mazzi)
+		tempo_classi = time.perf_counter() - inizio
+		inizio = time.perf_counter()
+		risultato = calcolo_rtp.calcola_rtp(num_mazzi)
+		tempo_rtp = time.perf_counter() - inizio
+		errore = verifica_tenute(num_mazzi, args.mani, rng)
+		somma = float(classi[3].sum())
+		esito = "ok" if errore < TOLLERANZA and abs(somma - 1) < TOLLERANZA else "ERRORE"
+		if esito != "ok":
+			falliti.append(num_mazzi)
+		print(f"{num_mazzi:>3} mazzi: {len(classi[3]):,} classi, somma probabilita' {somma:.15f}, "
+			f"scarto max col risolutore {errore:.2e} [{esito}]")
+		print(f"          tavole {tempo_tavole:.2f}s | classi {tempo_classi:.2f}s | RTP + {len(risultato['killer_hand'])} KH {tempo_rtp:.2f}s"
+			f" | RTP {risultato['rtp'] * 100:.4f}%")
+	sys.exit(1 if falliti else 0)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,142 @@
+# CACHE_STRATEGIA - Tenute ottimali memorizzate per forma canonica della mano
+# Due mani che differiscono solo per permutazione dei semi o per ordine delle
+# carte hanno la stessa tenuta ottimale (con la scarpa piena meno la mano, che e'
+# simmetrica nei semi). La forma canonica rinomina i semi in ordine di
+# (numero di carte, valori) e ordina i codici: il risultato vale per tutta la classe.
+# Uso: python cache_strategia.py --precalcola tabella_strategia.pkl --processi 8
+
+import argparse
+import os
+import pickle
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations_with_replacement
+
+from regole import CARTE_PER_MANO, NUM_MAZZI
+from risolutore import PAGAMENTI, composizione_scarpa, tenuta_ottimale
+from valutatore import NUM_CODICI, NUM_SEMI
+
+DIMENSIONE_PREDEFINITA = 200000 # Voci massime nella parte LRU
+
+def forma_canonica(codici):
+	# Ritorna (chiave canonica, posizioni): posizioni[j] e' l'indice in codici
+	# della carta che occupa la posizione j nella chiave.
+	per_seme = [[] for _ in range(NUM_SEMI)]
+	for c in codici:
+		per_seme[c % NUM_SEMI].append(c // NUM_SEMI)
+	ordine = sorted(range(NUM_SEMI), key=lambda s: (len(per_seme[s]), sorted(per_seme[s])), reverse=True)
+	nuovo_seme = [0] * NUM_SEMI
+	for i, s in enumerate(ordine):
+		nuovo_seme[s] = i
+	coppie = sorted((c - c % NUM_SEMI + nuovo_seme[c % NUM_SEMI], i) for i, c in enumerate(codici))
+	return tuple(c for c, _ in coppie), tuple(i for _, i in coppie)
+
+def _maschera_originale(maschera_canonica, posizioni):
+	maschera = 0
+	for j, i in enumerate(posizioni):
+		if maschera_canonica >> j & 1:
+			maschera |= 1 << i
+	return maschera
+
+class CacheStrategia:
+	# Tabella precalcolata (illimitata, caricabile da disco) + LRU limitata con contatori
+	def __init__(self, dimensione_massima=DIMENSIONE_PREDEFINITA, num_mazzi=NUM_MAZZI, pagamenti=PAGAMENTI):
+		self.dimensione_massima = dimensione_massima
+		self.num_mazzi = num_mazzi
+		self.pagamenti = tuple(pagamenti)
+		self.tabella = {}
+		self._lru = OrderedDict()
+		self.successi = 0
+		self.mancati = 0
+
+	def _risolvi(self, chiave):
+		return tenuta_ottimale(chiave, composizione_scarpa(self.num_mazzi, chiave), self.pagamenti)
+
+	def tenuta_ottimale(self, codici):
+		# (maschera sulle posizioni di codici, valore atteso)
+		chiave, posizioni = forma_canonica(codici)
+		voce = self.tabella.get(chiave)
+		if voce is None:
+			voce = self._lru.get(chiave)
+			if voce is None:
+				self.mancati += 1
+				voce = self._risolvi(chiave)
+				self._lru[chiave] = voce
+				if len(self._lru) > self.dimensione_massima:
+					self._lru.popitem(last=False)
+			else:
+				self.successi += 1
+				self._lru.move_to_end(chiave)
+		else:
+			self.successi += 1
+		return _maschera_originale(voce[0], posizioni), voce[1]
+
+	def strategia(self, codici):
+		return self.tenuta_ottimale(codici)[0]
+
+	def statistiche(self):
+		richieste = self.successi + self.mancati
+		return {
+			'successi': self.successi,
+			'mancati': self.mancati,
+			'percentuale_successi': self.successi / richieste * 100 if richieste else 0.0,
+			'voci_lru': len(self._lru),
+			'voci_tabella': len(self.tabella),
+		}
+
+	def salva_tabella(self, percorso):
+		# Unisce LRU e tabella: le voci calcolate in questa sessione restano per le prossime
+		tabella = dict(self.tabella)
+		tabella.update(self._lru)
+		with open(percorso, 'wb') as f:
+			pickle.dump({'num_mazzi': self.num_mazzi, 'pagamenti': self.pagamenti, 'tabella': tabella}, f)
+
+	def carica_tabella(self, percorso):
+		with open(percorso, 'rb') as f:
+			contenuto = pickle.load(f)
+		if contenuto['num_mazzi'] != self.num_mazzi or tuple(contenuto['pagamenti']) != self.pagamenti:
+			raise ValueError(f"La tabella {percorso} e' stata calcolata con altri parametri.")
+		self.tabella.update(contenuto['tabella'])
+
+# Cache di modulo usata dalla strategia 'ottimale' della simulazione
+CACHE_PREDEFINITA = CacheStrategia()
+
+def strategia_ottimale_cache(codici):
+	return CACHE_PREDEFINITA.strategia(codici)
+
+def mani_canoniche(num_mazzi=NUM_MAZZI):
+	# Tutte le classi di mani servibili (al massimo num_mazzi copie di ogni carta)
+	chiavi = set()
+	for codici in combinations_with_replacement(range(NUM_CODICI), CARTE_PER_MANO):
+		if num_mazzi < CARTE_PER_MANO and max(codici.count(c) for c in codici) > num_mazzi:
+			continue
+		chiavi.add(forma_canonica(codici)[0])
+	return sorted(chiavi)
+
+def _risolvi_blocco(argomenti):
+	chiavi, num_mazzi, pagamenti = argomenti
+	return [(k, tenuta_ottimale(k, composizione_scarpa(num_mazzi, k), pagamenti)) for k in chiavi]
+
+def precalcola_tabella(percorso, num_processi=None, num_mazzi=NUM_MAZZI, pagamenti=PAGAMENTI, dimensione_blocco=500):
+	cache = CacheStrategia(num_mazzi=num_mazzi, pagamenti=pagamenti)
+	chiavi = mani_canoniche(num_mazzi)
+	blocchi = [(chiavi[i:i + dimensione_blocco], num_mazzi, tuple(pagamenti)) for i in range(0, len(chiavi), dimensione_blocco)]
+	with ProcessPoolExecutor(max_workers=num_processi or os.cpu_count() or 1) as executor:
+		for risultati in executor.map(_risolvi_blocco, blocchi):
+			cache.tabella.update(risultati)
+	cache.salva_tabella(percorso)
+	return cache
+
+def main():
+	parser = argparse.ArgumentParser(description="Precalcolo della tabella delle tenute ottimali")
+	parser.add_argument("--precalcola", metavar="PERCORSO", required=True, help="file di destinazione della tabella")
+	parser.add_argument("--processi", type=int, default=None)
+	args = parser.parse_args()
+	inizio = time.perf_counter()
+	cache = precalcola_tabella(args.precalcola, args.processi)
+	print(f"Tabella di {len(cache.tabella)} mani canoniche salvata in {args.precalcola} "
+		f"({time.perf_counter() - inizio:.0f}s).")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,342 @@
+# CALCOLO_RTP - RTP, varianza e probabilita' per categoria esatti con strategia ottimale
+# Niente simulazione e niente risolutore mano per mano: si contano classi.
+# - Tavola senza colore: per ogni multiinsieme d dei 5 valori serviti e ogni tenuta
+#   (maschera sulle posizioni di d ordinate) le pescate per categoria, aggregate per
+#   multiinsieme di valori pescati con peso prod C(N_r, m_r) come nel risolutore.
+# - Tavola colore: per ogni multiinsieme e dei valori serviti di un solo seme, la
+#   correzione (colore - senza colore) delle pescate tutte di quel seme.
+# - Le mani servite si raggruppano per simmetria dei semi: una mano e' il
+#   multiinsieme dei suoi quattro e, e il valore di ogni tenuta dipende solo da quelli.
+# Le tavole dipendono solo dal numero di mazzi e sono memorizzate: con un'altra
+# tabella vincite si rifa' solo la scelta della tenuta migliore, in meno di un secondo.
+# Killer Hand: ogni KILLER_HAND_FREQUENZA mani la KH #j toglie, se persa, il
+# min(10j, 90)% delle fiches residue. Con puntata = frazione f delle fiches la
+# penalita' vale p*(1-f)/f puntate: la KH ha una sua tenuta ottimale e il ciclo
+# 24 mani normali + 1 KH ha RTP e crescita logaritmica in forma chiusa per ogni j.
+# Uso: python calcolo_rtp.py [--mazzi 10 ...] [--pagamento "Scala a colore=50,55,60" ...] [--frazione 0.03]
+
+import argparse
+import time
+from functools import lru_cache
+from itertools import combinations_with_replacement, product
+from math import comb, factorial
+
+import numpy as np
+
+from regole import (
+	CARTE_PER_MANO, KILLER_HAND_FREQUENZA, MAX_PENALITA_KH, NUM_MAZZI,
+	PERCENTUALE_MINIMA_PUNTATA, TABELLA_VINCITE, penalita_killer_hand
+)
+from valutatore import CATEGORIE, NUM_SEMI, NUM_VALORI
+from valutatore_vettoriale import NUM_COMBINAZIONI, TABELLA
+
+NUM_TENUTE = 1 << CARTE_PER_MANO
+NUM_CATEGORIE = len(CATEGORIE)
+PAGAMENTI = tuple(TABELLA_VINCITE[nome] for nome in CATEGORIE)
+BASE = NUM_VALORI + 1 # Codice di un multiinsieme: sum (r + 1) * BASE^j, 0 = posizione vuota
+RIGHE_PER_BLOCCO = 512 # Righe per blocco quando si pescano 5 carte (6188 multiinsiemi)
+
+# --- Multiinsiemi di valori (0..5 carte, ordinati) ---
+def _multiinsiemi():
+	elenco = [t for k in range(CARTE_PER_MANO + 1) for t in combinations_with_replacement(range(NUM_VALORI), k)]
+	ranghi = np.full((len(elenco), CARTE_PER_MANO), -1, dtype=np.int64)
+	for i, t in enumerate(elenco):
+		ranghi[i, :len(t)] = t
+	return elenco, ranghi
+
+ELENCO, RANGHI = _multiinsiemi()
+LUNGHEZZE = (RANGHI >= 0).sum(axis=1)
+NUM_MULTIINSIEMI = len(ELENCO)
+POTENZE_BASE = BASE ** np.arange(CARTE_PER_MANO)
+INDICE_CODICE = np.full(BASE ** CARTE_PER_MANO, -1, dtype=np.int64)
+INDICE_CODICE[((RANGHI + 1) * POTENZE_BASE).sum(axis=1)] = np.arange(NUM_MULTIINSIEMI)
+CONTEGGI = np.stack([(RANGHI == r).sum(axis=1) for r in range(NUM_VALORI)], axis=1)
+PER_LUNGHEZZA = [np.flatnonzero(LUNGHEZZE == k) for k in range(CARTE_PER_MANO + 1)]
+PRIMA_MANO = PER_LUNGHEZZA[CARTE_PER_MANO][0] # Le righe di 5 valori sono contigue e in fondo
+POPCOUNT = np.array([bin(m).count('1') for m in range(NUM_TENUTE)])
+
+def _pescate(k):
+	# Per i multiinsiemi di k valori: termini (rango, molteplicita') fino a k slot e valore in base 13
+	righe = PER_LUNGHEZZA[k]
+	ranghi = np.zeros((len(righe), max(k, 1)), dtype=np.int64)
+	molteplicita = np.zeros_like(ranghi)
+	for i, t in enumerate(ELENCO[j] for j in righe):
+		for j, r in enumerate(sorted(set(t))):
+			ranghi[i, j] = r
+			molteplicita[i, j] = t.count(r)
+	base13 = np.zeros(len(righe), dtype=np.int64)
+	for j in range(k):
+		base13 = base13 * NUM_VALORI + RANGHI[righe, j]
+	return ranghi, molteplicita, base13
+
+PESCATE = [_pescate(k) for k in range(CARTE_PER_MANO + 1)]
+
+def _pesi(conteggi, k, binomiali):
+	# conteggi: (righe, 13) carte residue per rango -> (|multiinsiemi di k|, righe) modi di pescarli.
+	# Per ogni riga una tabellina C(conteggio_r, m) di 13 x 6 voci: ogni slot e' una sola lettura.
+	ranghi, molteplicita, _ = PESCATE[k]
+	per_riga = binomiali[conteggi].reshape(len(conteggi), -1).T.copy()
+	voci = ranghi * binomiali.shape[1] + molteplicita
+	pesi = per_riga[voci[:, 0]]
+	for j in range(1, k):
+		pesi *= per_riga[voci[:, j]]
+	return pesi
+
+def _tavola(righe, conteggi, binomiali, colore):
+	# (righe, 32, categorie): pescate per categoria per ogni riga e maschera sulle sue posizioni.
+	# colore=False: categoria senza colore; colore=True: differenza colore - senza colore.
+	# Le coppie (riga, maschera) con la stessa tenuta condividono la riga dei pesi.
+	identita = np.eye(NUM_CATEGORIE)
+	tavola = np.zeros((len(righe), NUM_TENUTE, NUM_CATEGORIE))
+	lunghezze = LUNGHEZZE[righe]
+	for k in range(CARTE_PER_MANO + 1):
+		tenute = CARTE_PER_MANO - k
+		indici_riga, maschere, valori_tenuti = [], [], []
+		for maschera in np.flatnonzero(POPCOUNT == tenute):
+			posizioni = [p for p in range(CARTE_PER_MANO) if maschera >> p & 1]
+			valide = np.flatnonzero(lunghezze > (posizioni[-1] if posizioni else -1))
+			base13 = np.zeros(len(valide), dtype=np.int64)
+			for p in posizioni:
+				base13 = base13 * NUM_VALORI + RANGHI[righe[valide], p]
+			indici_riga.append(valide)
+			maschere.append(np.full(len(valide), maschera))
+			valori_tenuti.append(base13)
+		indici_riga = np.concatenate(indici_riga)
+		maschere = np.concatenate(maschere)
+		valori_tenuti = np.concatenate(valori_tenuti)
+		if k == 0:
+			senza = TABELLA[valori_tenuti]
+			if colore:
+				np.add.at(tavola, (indici_riga, maschere, TABELLA[valori_tenuti + NUM_COMBINAZIONI]), 1.0)
+				np.add.at(tavola, (indici_riga, maschere, senza), -1.0)
+			else:
+				np.add.at(tavola, (indici_riga, maschere, senza), 1.0)
+			continue
+		pesi = None if k == CARTE_PER_MANO else _pesi(conteggi, k, binomiali)
+		tenute_uniche, gruppo = np.unique(valori_tenuti, return_inverse=True)
+		ordine = np.argsort(gruppo, kind='stable')
+		confini = np.searchsorted(gruppo[ordine], np.arange(len(tenute_uniche) + 1))
+		for g, valore in enumerate(tenute_uniche.tolist()):
+			coppie = ordine[confini[g]:confini[g + 1]]
+			indici = valore * NUM_VALORI ** k + PESCATE[k][2]
+			categorie = identita[TABELLA[indici]]
+			if colore:
+				categorie = identita[TABELLA[indici + NUM_COMBINAZIONI]] - categorie
+			righe_coppie = indici_riga[coppie]
+			if pesi is not None:
+				tavola[righe_coppie, maschere[coppie]] = (categorie.T @ pesi[:, righe_coppie]).T
+				continue
+			for inizio in range(0, len(coppie), RIGHE_PER_BLOCCO):
+				blocco = righe_coppie[inizio:inizio + RIGHE_PER_BLOCCO]
+				tavola[blocco, maschere[coppie[inizio:inizio + RIGHE_PER_BLOCCO]]] = (categorie.T @ _pesi(conteggi[blocco], k, binomiali)).T
+	return tavola
+
+@lru_cache(maxsize=4)
+def tavole(num_mazzi=NUM_MAZZI):
+	# (senza_colore, colore): probabilita' per categoria, gia' divise per C(N - 5, k).
+	# senza_colore: (6188 multiinsiemi serviti, 32, categorie); colore: (8568 + 1 riga nulla, 32, categorie)
+	binomiali = np.array([[comb(n, m) for m in range(CARTE_PER_MANO + 1)]
+		for n in range(NUM_SEMI * num_mazzi + 1)], dtype=np.float64)
+	mani = PER_LUNGHEZZA[CARTE_PER_MANO]
+	senza_colore = _tavola(mani, np.maximum(NUM_SEMI * num_mazzi - CONTEGGI[mani], 0), binomiali, False)
+	colore = _tavola(np.arange(NUM_MULTIINSIEMI), np.maximum(num_mazzi - CONTEGGI, 0), binomiali, True)
+	colore = np.concatenate([colore, np.zeros((1, NUM_TENUTE, NUM_CATEGORIE))])
+	residue = NUM_VALORI * NUM_SEMI * num_mazzi - CARTE_PER_MANO
+	denominatori = np.array([comb(residue, CARTE_PER_MANO - n) for n in POPCOUNT], dtype=np.float64)
+	senza_colore /= denominatori[:, None]
+	colore /= denominatori[:, None]
+	return senza_colore, colore
+
+def _stringhe_semi():
+	# Sequenze di semi in forma canonica (ogni seme nuovo e' il piu' basso non ancora usato):
+	# assegnate a valori ordinati coprono tutte le mani a meno di permutare i semi
+	stringhe = [()]
+	for _ in range(CARTE_PER_MANO):
+		stringhe = [t + (s,) for t in stringhe for s in range(min(max(t, default=-1) + 2, NUM_SEMI))]
+	return np.array(stringhe, dtype=np.int8)
+
+@lru_cache(maxsize=4)
+def classi_mani(num_mazzi=NUM_MAZZI):
+	# Mani servite a meno di permutare i semi. Per ogni classe: riga d della tavola senza
+	# colore, righe e dei quattro semi, voce (riga e * 32 + maschera nella riga e) della
+	# correzione colore di ogni maschera, probabilita' della classe.
+	# Posizioni di una mano = codici carta in ordine crescente (valore, poi seme).
+	mani5 = RANGHI[PER_LUNGHEZZA[CARTE_PER_MANO]].astype(np.int8)
+	stringhe = _stringhe_semi()
+	codici = np.repeat(mani5, len(stringhe), axis=0) * NUM_SEMI + np.tile(stringhe, (len(mani5), 1))
+	codici.sort(axis=1)
+	# Probabilita' di un multiinsieme di codici {c: m_c}: prod C(num_mazzi, m_c) su C(N, 5)
+	ripetizioni = np.zeros(codici.shape, dtype=np.int8)
+	for i in range(1, CARTE_PER_MANO):
+		ripetizioni[:, i] = np.where(codici[:, i] == codici[:, i - 1], ripetizioni[:, i - 1] + 1, 0)
+	probabilita = np.prod((num_mazzi - ripetizioni) / (ripetizioni + 1.0), axis=1)
+	probabilita /= comb(NUM_VALORI * NUM_SEMI * num_mazzi, CARTE_PER_MANO)
+	possibili = probabilita > 0
+	codici, probabilita = codici[possibili].astype(np.int32), probabilita[possibili]
+	ranghi, semi = codici // NUM_SEMI, codici % NUM_SEMI
+	righe_d = INDICE_CODICE[((ranghi + 1) * POTENZE_BASE).sum(axis=1)] - PRIMA_MANO
+	righe_e = np.empty((len(ranghi), NUM_SEMI), dtype=np.int64)
+	posizione_nel_seme = np.zeros(ranghi.shape, dtype=np.int32)
+	for s in range(NUM_SEMI):
+		del_seme = semi == s
+		posizioni = np.cumsum(del_seme, axis=1, dtype=np.int32) - 1
+		codice = np.where(del_seme, (ranghi + 1) * BASE ** np.maximum(posizioni, 0), 0).sum(axis=1)
+		righe_e[:, s] = INDICE_CODICE[codice]
+		posizione_nel_seme = np.where(del_seme, posizioni, posizione_nel_seme)
+	ordinate = np.sort(righe_e, axis=1)
+	chiave = np.zeros(len(ranghi), dtype=np.int64)
+	for colonna in ordinate.T:
+		chiave = chiave * NUM_MULTIINSIEMI + colonna
+	_, primo = np.unique(chiave, return_index=True)
+	# Mani distinte nella classe: 4! permutazioni dei semi diviso quelle che scambiano semi uguali
+	ordinate = ordinate[primo]
+	orbita = np.full(len(primo), float(factorial(NUM_SEMI)))
+	serie = np.ones(len(primo))
+	for i in range(1, NUM_SEMI):
+		serie = np.where(ordinate[:, i] == ordinate[:, i - 1], serie + 1, 1)
+		orbita /= serie
+	peso = probabilita[primo] * orbita
+	righe_d, righe_e, semi, posizione_nel_seme = righe_d[primo], righe_e[primo], semi[primo], posizione_nel_seme[primo]
+	riga_colore = np.full((len(primo), NUM_TENUTE), NUM_MULTIINSIEMI) # Riga nulla: semi diversi
+	sottomaschera = np.zeros((len(primo), NUM_TENUTE), dtype=np.int64)
+	tutte = np.arange(len(primo))
+	for maschera in range(1, NUM_TENUTE):
+		posizioni = [p for p in range(CARTE_PER_MANO) if maschera >> p & 1]
+		seme = semi[:, posizioni[0]]
+		stesso_seme = np.all(semi[:, posizioni] == seme[:, None], axis=1)
+		riga_colore[stesso_seme, maschera] = righe_e[tutte, seme][stesso_seme]
+		sottomaschera[:, maschera] = (1 << posizione_nel_seme[:, posizioni]).sum(axis=1)
+	return righe_d, righe_e, riga_colore * NUM_TENUTE + sottomaschera, peso
+
+# --- Strategia e distribuzione delle categorie ---
+def valori_tenute(valori_categoria, num_mazzi=NUM_MAZZI):
+	# (classi, 32): valore atteso di ogni tenuta con valori_categoria[c] per la categoria c
+	senza_colore, colore = tavole(num_mazzi)
+	righe_d, righe_e, voce_colore, _ = classi_mani(num_mazzi)
+	vettore = np.asarray(valori_categoria, dtype=np.float64)
+	per_d = senza_colore @ vettore
+	per_e = colore @ vettore
+	valori = per_d[righe_d] + per_e.ravel()[voce_colore]
+	valori[:, 0] += per_e[righe_e, 0].sum(axis=1) # Si pesca tutto: colore in uno qualsiasi dei semi
+	return valori
+
+def distribuzione(valori_categoria, num_mazzi=NUM_MAZZI):
+	# Probabilita' finali per categoria giocando in ogni classe la tenuta di valore massimo
+	# (a parita' la maschera piu' alta, come risolutore.tenuta_ottimale)
+	senza_colore, colore = tavole(num_mazzi)
+	righe_d, righe_e, voce_colore, peso = classi_mani(num_mazzi)
+	valori = valori_tenute(valori_categoria, num_mazzi)
+	migliore = NUM_TENUTE - 1 - np.argmax(valori[:, ::-1], axis=1)
+	tutte = np.arange(len(migliore))
+	categorie = senza_colore[righe_d, migliore] + colore.reshape(-1, NUM_CATEGORIE)[voce_colore[tutte, migliore]]
+	pesca_tutto = migliore == 0
+	categorie[pesca_tutto] += colore[righe_e[pesca_tutto], 0].sum(axis=1)
+	return peso @ categorie
+
+def _crescita(probabilita, pagamenti, frazione, penalita=0.0):
+	# E[log(fiches dopo / fiches prima)] puntando la frazione f delle fiches
+	esiti = np.where(pagamenti >= 1, 1 - frazione + frazione * pagamenti,
+		(1 - frazione) * (1 - penalita / 100))
+	with np.errstate(divide='ignore'):
+		return float(probabilita @ np.log(esiti))
+
+def calcola_rtp(num_mazzi=NUM_MAZZI, pagamenti=PAGAMENTI, frazione=PERCENTUALE_MINIMA_PUNTATA):
+	# RTP, varianza (per unita' puntata) e probabilita' per categoria con strategia ottimale,
+	# piu' il ciclo Killer Hand: per ogni KH #j fino alla penalita' massima la tenuta che
+	# massimizza importo restituito - P(perdita) * penalita' in puntate.
+	pagamenti = np.asarray(pagamenti, dtype=np.float64)
+	probabilita = distribuzione(pagamenti, num_mazzi)
+	rtp = float(probabilita @ pagamenti)
+	perdente = (pagamenti < 1).astype(np.float64)
+	bonus = 2 * np.maximum(pagamenti - 1, 0) # Nelle statistiche (fiches_vinte), non nel saldo
+	crescita_mano = _crescita(probabilita, pagamenti, frazione)
+	killer_hand = []
+	j = 0
+	while not killer_hand or killer_hand[-1]['penalita'] < MAX_PENALITA_KH:
+		j += 1
+		penalita = penalita_killer_hand(j)
+		in_puntate = penalita / 100 * (1 - frazione) / frazione
+		probabilita_kh = distribuzione(pagamenti - perdente * in_puntate, num_mazzi)
+		rtp_kh = float(probabilita_kh @ pagamenti) - float(probabilita_kh @ perdente) * in_puntate
+		killer_hand.append({
+			'numero': j,
+			'penalita': penalita,
+			'perdita': float(probabilita_kh @ perdente),
+			'rtp_mano': rtp_kh,
+			'rtp_stessa_tenuta': rtp - float(probabilita @ perdente) * in_puntate,
+			'rtp_statistiche': float(probabilita_kh @ (pagamenti + bonus)),
+			'rtp_ciclo': ((KILLER_HAND_FREQUENZA - 1) * rtp + rtp_kh) / KILLER_HAND_FREQUENZA,
+			'crescita_ciclo': (KILLER_HAND_FREQUENZA - 1) * crescita_mano + _crescita(probabilita_kh, pagamenti, frazione, penalita),
+		})
+	return {
+		'num_mazzi': num_mazzi,
+		'pagamenti': dict(zip(CATEGORIE, pagamenti.tolist())),
+		'frazione': frazione,
+		'rtp': rtp,
+		'varianza': float(probabilita @ pagamenti ** 2) - rtp ** 2,
+		'probabilita': dict(zip(CATEGORIE, probabilita.tolist())),
+		'crescita_mano': crescita_mano,
+		'killer_hand': killer_hand,
+	}
+
+# --- Stampa e riga di comando ---
+def stampa_rtp(risultato):
+	print(f"\n== RTP esatto: {risultato['num_mazzi']} mazzi, strategia ottimale ==")
+	print(f"RTP: {risultato['rtp'] * 100:.4f}% | varianza: {risultato['varianza']:.4f} | "
+		f"dev. standard: {risultato['varianza'] ** 0.5:.4f} (per unita' puntata)")
+	print(f"{'Categoria':<20}{'Paga':>6}{'Probabilita':>14}{'1 su':>14}{'Contributo RTP':>16}")
+	for nome in reversed(CATEGORIE):
+		p = risultato['probabilita'][nome]
+		paga = risultato['pagamenti'][nome]
+		uno_su = f"{1 / p:,.1f}" if p > 0 else "-"
+		print(f"{nome:<20}{paga:>6g}{p * 100:>13.6f}%{uno_su:>14}{p * paga * 100:>15.4f}%")
+	print(f"\n== Killer Hand ogni {KILLER_HAND_FREQUENZA} mani (puntata = {risultato['frazione'] * 100:g}% delle fiches) ==")
+	print(f"Mano normale: crescita log {risultato['crescita_mano']:+.6f}")
+	print(f"{'KH':>3}{'Penalita':>9}{'P(perdita)':>12}{'RTP KH':>10}{'stessa tenuta':>15}{'RTP statist.':>14}{'RTP ciclo':>11}{'log ciclo':>11}")
+	for kh in risultato['killer_hand']:
+		print(f"{kh['numero']:>3}{kh['penalita']:>8}%{kh['perdita'] * 100:>11.3f}%{kh['rtp_mano'] * 100:>9.2f}%"
+			f"{kh['rtp_stessa_tenuta'] * 100:>14.2f}%{kh['rtp_statistiche'] * 100:>13.2f}%{kh['rtp_ciclo'] * 100:>10.3f}%"
+			f"{kh['crescita_ciclo']:>+11.5f}")
+	print(f"Dalla KH #{risultato['killer_hand'][-1]['numero']} in poi (fino al prossimo fallimento) il ciclo resta all'ultima riga.")
+
+def _griglia_pagamenti(opzioni):
+	# ["Scala a colore=50,55", ...] -> lista di (descrizione, pagamenti)
+	assi = []
+	for opzione in opzioni or ():
+		nome, _, valori = opzione.partition('=')
+		nome = nome.strip()
+		if nome not in CATEGORIE or not valori:
+			raise SystemExit(f"Pagamento non valido: {opzione!r} (atteso 'Categoria=valore[,valore...]')")
+		assi.append([(nome, float(v)) for v in valori.split(',')])
+	griglia = []
+	for scelta in product(*assi):
+		pagamenti = dict(zip(CATEGORIE, PAGAMENTI))
+		pagamenti.update(scelta)
+		descrizione = ", ".join(f"{nome}={valore:g}" for nome, valore in scelta) or "tabella attuale"
+		griglia.append((descrizione, tuple(pagamenti[nome] for nome in CATEGORIE)))
+	return griglia
+
+def main():
+	parser = argparse.ArgumentParser(description="RTP esatto della Poker Machine con strategia ottimale")
+	parser.add_argument('--mazzi', type=int, nargs='+', default=[NUM_MAZZI])
+	parser.add_argument('--pagamento', action='append', metavar='CATEGORIA=V1[,V2...]',
+		help="Sostituisce un moltiplicatore; con piu' valori (o piu' opzioni) calcola la griglia")
+	parser.add_argument('--frazione', type=float, default=PERCENTUALE_MINIMA_PUNTATA,
+		help="Puntata come frazione delle fiches, per la penalita' Killer Hand")
+	args = parser.parse_args()
+	griglia = _griglia_pagamenti(args.pagamento)
+	if len(args.mazzi) * len(griglia) == 1:
+		inizio = time.perf_counter()
+		stampa_rtp(calcola_rtp(args.mazzi[0], griglia[0][1], args.frazione))
+		print(f"\nTempo: {time.perf_counter() - inizio:.2f}s")
+		return
+	print(f"{'Mazzi':>5}  {'RTP':>9}  {'Dev.std':>7}  {'RTP ciclo KH':>12}  {'log ciclo KH':>12}  Pagamenti")
+	for num_mazzi in args.mazzi:
+		for descrizione, pagamenti in griglia:
+			risultato = calcola_rtp(num_mazzi, pagamenti, args.frazione)
+			regime = risultato['killer_hand'][-1]
+			print(f"{num_mazzi:>5}  {risultato['rtp'] * 100:>8.3f}%  {risultato['varianza'] ** 0.5:>7.3f}  "
+				f"{regime['rtp_ciclo'] * 100:>11.3f}%  {regime['crescita_ciclo']:>+12.5f}  {descrizione}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,236 @@
+# CLASSIFICHE - Classifiche e totali su tutti i giocatori del server
+# Scorre la cartella dei giocatori (un file di stato per giocatore) leggendo i
+# file in un pool di thread e, di ogni file, solo scalari e punteggi
+# (stato.leggi_riepilogo: niente finestra mobile ne' aggregati). I risultati
+# arrivano uno alla volta e vanno in heap limitati ai primi N per classifica e
+# nei totali per categoria: in memoria non c'e' mai lo stato completo dei giocatori.
+# Un indice (mtime, dimensione e inode di ogni file, piu' il suo riepilogo)
+# fa si' che alla volta successiva si rileggano solo i file cambiati; i giocatori
+# spariti escono dall'indice. Il vecchio <nome>.pkl non ancora migrato si legge
+# per intero, come farebbe il server al primo caricamento.
+# Uso: python classifiche.py [--cartella giocatori] [--primi 10] [--thread 8] [--completa] [--json file]
+
+import heapq
+import json
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pokermachine import migra_dati
+from stato import CARTELLA_GIOCATORI, SUFFISSO_PRECEDENTE, leggi_riepilogo
+from valutatore import CATEGORIE
+
+FILE_INDICE = 'indice_classifiche.json'
+VERSIONE_INDICE = 1
+THREAD = 8
+LOTTO = 64 # File per lettura nel pool: ammortizza submit e attesa dei risultati
+PRIMI = 10
+CAMPI = (
+	'launches', 'mani_giocate', 'mani_pagate', 'fiches_attuali', 'fiches_guadagnate', 'fiches_perdute',
+	'fallimenti', 'vincita_massima', 'perdita_massima', 'record_mani_senza_fallimenti'
+)
+TOTALI = ('launches', 'mani_giocate', 'mani_pagate', 'fiches_attuali', 'fiches_guadagnate', 'fiches_perdute', 'fallimenti')
+_POSIZIONE = {campo: i for i, campo in enumerate(CAMPI)}
+CLASSIFICHE = (
+	# chiave, titolo, valore dal riepilogo (CAMPI seguiti dai conteggi delle CATEGORIE)
+	('fiches_attuali', "Fiches attuali", lambda r: r[_POSIZIONE['fiches_attuali']]),
+	('bilancio', "Bilancio (guadagnate - perdute)", lambda r: r[_POSIZIONE['fiches_guadagnate']] - r[_POSIZIONE['fiches_perdute']]),
+	('vincita_massima', "Vincita massima", lambda r: r[_POSIZIONE['vincita_massima']]),
+	('record_mani_senza_fallimenti', "Record di mani senza fallimenti", lambda r: r[_POSIZIONE['record_mani_senza_fallimenti']]),
+	('mani_giocate', "Mani giocate", lambda r: r[_POSIZIONE['mani_giocate']]),
+)
+
+# --- Lettura ---
+
+def riepilogo(dati):
+	# Lista piatta: i CAMPI, poi il conteggio di ogni categoria in ordine di CATEGORIE
+	punteggi = dati.get('punteggi', {})
+	return [dati.get(campo) or 0 for campo in CAMPI] + [punteggi.get(nome, {}).get('conteggio', 0) for nome in CATEGORIE]
+
+def file_giocatori(cartella):
+	# (nome, percorso, firma) di ogni giocatore; <nome>.pkl solo se non c'e' gia' <nome>.stato
+	nomi = set()
+	vecchi = []
+	with os.scandir(cartella) as voci:
+		for voce in voci:
+			nome, estensione = os.path.splitext(voce.name)
+			if estensione == '.stato':
+				nomi.add(nome)
+				yield nome, voce.path, firma(voce)
+			elif estensione == '.pkl':
+				vecchi.append(voce)
+	for voce in vecchi:
+		nome = os.path.splitext(voce.name)[0]
+		if nome not in nomi:
+			yield nome, voce.path, firma(voce)
+
+def firma(voce):
+	# Cambia a ogni salvataggio: scrivi_stato rinomina un file nuovo al posto del vecchio
+	informazioni = voce.stat()
+	return [informazioni.st_mtime_ns, informazioni.st_size, informazioni.st_ino]
+
+def leggi_giocatore(nome, percorso, firma):
+	# (nome, firma, riepilogo o None, avviso o None); gira nei thread del pool
+	try:
+		if percorso.endswith('.pkl'):
+			with open(percorso, 'rb') as f:
+				dati = pickle.load(f)
+			migra_dati(dati)
+			return nome, firma, riepilogo(dati), None
+		try:
+			return nome, firma, riepilogo(leggi_riepilogo(percorso)), None
+		except ValueError as e:
+			# Come leggi_stato: un principale danneggiato lascia il posto al precedente
+			try:
+				dati = leggi_riepilogo(percorso + SUFFISSO_PRECEDENTE)
+			except (OSError, ValueError):
+				raise e from None
+			return nome, firma, riepilogo(dati), f"{percorso}: {e}, uso {SUFFISSO_PRECEDENTE}"
+	except (OSError, ValueError, EOFError, pickle.UnpicklingError) as e:
+		return nome, firma, None, f"{percorso}: {e}"
+
+def leggi_lotto(lotto):
+	return [leggi_giocatore(*voce) for voce in lotto]
+
+def giocatori(cartella, indice=None, thread=THREAD, lotto=LOTTO):
+	# (nome, firma, riepilogo o None, avviso o None, letto) di ogni giocatore, nell'ordine
+	# in cui sono pronti: dall'indice se il file non e' cambiato, altrimenti letto nel pool
+	# a lotti di `lotto` file, con al massimo 4 lotti per thread in attesa
+	indice = indice or {}
+	with ThreadPoolExecutor(max_workers=thread) as pool:
+		pendenti = set()
+		da_leggere = []
+		for nome, percorso, attuale in file_giocatori(cartella):
+			voce = indice.get(nome)
+			if voce is not None and voce[:3] == attuale:
+				yield nome, attuale, voce[3:], None, False
+				continue
+			da_leggere.append((nome, percorso, attuale))
+			if len(da_leggere) < lotto:
+				continue
+			pendenti.add(pool.submit(leggi_lotto, da_leggere))
+			da_leggere = []
+			if len(pendenti) >= 4 * thread:
+				pronti, pendenti = wait(pendenti, return_when=FIRST_COMPLETED)
+				for futuro in pronti:
+					for risultato in futuro.result():
+						yield risultato + (True,)
+		if da_leggere:
+			pendenti.add(pool.submit(leggi_lotto, da_leggere))
+		while pendenti:
+			pronti, pendenti = wait(pendenti, return_when=FIRST_COMPLETED)
+			for futuro in pronti:
+				for risultato in futuro.result():
+					yield risultato + (True,)
+
+# --- Indice ---
+
+def carica_indice(percorso):
+	# nome -> [mtime_ns, dimensione, inode, *riepilogo]; vuoto se manca o e' di un'altra versione
+	try:
+		with open(percorso, encoding='utf-8') as f:
+			contenuto = json.load(f)
+	except (OSError, ValueError):
+		return {}
+	if (contenuto.get('versione') != VERSIONE_INDICE or contenuto.get('campi') != list(CAMPI)
+			or contenuto.get('categorie') != list(CATEGORIE)):
+		return {} # Riepiloghi con un'altra forma: si rilegge tutto
+	return contenuto.get('giocatori', {})
+
+def salva_indice(percorso, voci):
+	# E' solo una cache: temporaneo e rinomina senza fsync, al peggio si rilegge tutto
+	temporaneo = percorso + '.tmp'
+	with open(temporaneo, 'w', encoding='utf-8') as f:
+		json.dump({'versione': VERSIONE_INDICE, 'campi': list(CAMPI), 'categorie': list(CATEGORIE),
+			'giocatori': voci}, f, separators=(',', ':'))
+	os.replace(temporaneo, percorso)
+
+# --- Aggregazione ---
+
+def inserisci(heap, primi, voce):
+	# Heap minimo dei primi `primi` (valore, nome): a parita' di valore decide il nome
+	if len(heap) < primi:
+		heapq.heappush(heap, voce)
+	elif voce > heap[0]:
+		heapq.heapreplace(heap, voce)
+
+def aggrega(cartella=CARTELLA_GIOCATORI, percorso_indice=None, primi=PRIMI, thread=THREAD, completa=False):
+	# Classifiche (primi N per CLASSIFICHE), totali e conteggi per categoria di tutti
+	# i giocatori della cartella; aggiorna l'indice (completa=True: lo ignora e rilegge tutto)
+	if percorso_indice is None:
+		percorso_indice = os.path.join(cartella, FILE_INDICE)
+	vecchio = {} if completa else carica_indice(percorso_indice)
+	indice = {}
+	classifiche = {chiave: [] for chiave, _, _ in CLASSIFICHE}
+	totali = dict.fromkeys(TOTALI, 0)
+	punteggi = [0] * len(CATEGORIE)
+	risultato = {'giocatori': 0, 'letti': 0, 'dall_indice': 0, 'avvisi': []}
+	for nome, attuale, valori, avviso, letto in giocatori(cartella, vecchio, thread):
+		if avviso:
+			risultato['avvisi'].append(avviso)
+		if valori is None:
+			continue
+		if avviso is None: # Illeggibile o letto dal precedente: si riprova (e si avvisa) la prossima volta
+			indice[nome] = attuale + valori
+		risultato['letti' if letto else 'dall_indice'] += 1
+		risultato['giocatori'] += 1
+		for chiave, _, valore in CLASSIFICHE:
+			inserisci(classifiche[chiave], primi, (valore(valori), nome))
+		for campo in TOTALI:
+			totali[campo] += valori[_POSIZIONE[campo]]
+		for i, conteggio in enumerate(valori[len(CAMPI):]):
+			punteggi[i] += conteggio
+	risultato['rimossi'] = len(vecchio.keys() - indice.keys())
+	if indice != vecchio:
+		salva_indice(percorso_indice, indice)
+	risultato['classifiche'] = {chiave: sorted(heap, key=lambda v: (-v[0], v[1])) for chiave, heap in classifiche.items()}
+	risultato['totali'] = totali
+	risultato['punteggi'] = dict(zip(CATEGORIE, punteggi))
+	return risultato
+
+# --- Report ---
+
+def stampa(risultato):
+	for chiave, titolo, _ in CLASSIFICHE:
+		print(f"\n== {titolo} ==")
+		for posizione, (valore, nome) in enumerate(risultato['classifiche'][chiave], 1):
+			print(f"{posizione:>3}. {nome:<32}{valore:>14}")
+	totali = risultato['totali']
+	print(f"\n== Totali: {risultato['giocatori']} giocatori ==")
+	for campo in TOTALI:
+		print(f"{campo.replace('_', ' ').capitalize():<24}{totali[campo]:>16}")
+	mani = totali['mani_giocate']
+	print("\n== Mani per categoria ==")
+	for nome, conteggio in risultato['punteggi'].items():
+		print(f"{nome:<24}{conteggio:>16}{conteggio / mani * 100 if mani else 0:>9.3f}%")
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Classifiche e totali dei giocatori del server")
+	parser.add_argument('--cartella', default=CARTELLA_GIOCATORI, help="Cartella dei file dei giocatori")
+	parser.add_argument('--primi', type=int, default=PRIMI, help="Giocatori per classifica")
+	parser.add_argument('--thread', type=int, default=THREAD, help="Thread di lettura dei file")
+	parser.add_argument('--indice', help=f"File indice (predefinito: {FILE_INDICE} nella cartella)")
+	parser.add_argument('--completa', action='store_true', help="Ignora l'indice e rilegge tutti i file")
+	parser.add_argument('--json', metavar='FILE', help="Scrive anche il risultato in JSON")
+	args = parser.parse_args()
+	if args.primi < 1 or args.thread < 1:
+		raise SystemExit("--primi e --thread devono essere almeno 1.")
+	inizio = time.perf_counter()
+	try:
+		risultato = aggrega(args.cartella, args.indice, args.primi, args.thread, args.completa)
+	except OSError as e:
+		raise SystemExit(str(e))
+	secondi = time.perf_counter() - inizio
+	for avviso in risultato['avvisi']:
+		print(f"Attenzione, {avviso}")
+	stampa(risultato)
+	print(f"\n{risultato['giocatori']} giocatori in {secondi:.2f}s: {risultato['letti']} file letti, "
+		f"{risultato['dall_indice']} dall'indice, {risultato['rimossi']} rimossi")
+	if args.json:
+		with open(args.json, 'w', encoding='utf-8') as f:
+			json.dump(risultato, f, indent=1, ensure_ascii=False)
+
+if __name__ == "__main__":
+	main()
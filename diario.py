@@ -0,0 +1,143 @@
+# DIARIO - Giornale append-only delle mani giocate
+# Ogni mano completata aggiunge una riga JSON compatta al diario invece di
+# riscrivere tutto il file dati. Periodicamente lo stato viene compattato in uno
+# snapshot (il file dati) e il diario viene svuotato; all'avvio le righe con
+# numero di sequenza successivo allo snapshot vengono riapplicate.
+
+import os
+
+from misure import strumentato
+from statistiche import a_epoca, registra_mano
+
+FILE_DIARIO = 'pokermachine_diario.jsonl'
+# Modalita' di scrittura: 'mano' = fsync ad ogni mano, 'gruppo' = fsync ogni
+# `intervallo_gruppo` mani (group commit), 'nessuno' = solo flush al sistema operativo
+MODALITA = ('mano', 'gruppo', 'nessuno')
+
+def nuovo_record(seq, data, puntata, codici, punteggio, esito, killer_hand_count, is_mano_speciale, game_over):
+	return {
+		'n': seq, # numero di sequenza
+		't': data, # secondi epoch
+		'p': puntata,
+		'c': codici, # mano finale codificata
+		'r': punteggio,
+		'f': esito.fiches, # saldo dopo la mano
+		'v': esito.fiches_vinte,
+		'l': esito.perdita_totale,
+		'k': killer_hand_count,
+		's': is_mano_speciale,
+		'g': game_over
+	}
+
+def applica_mano(dati, record):
+	# Aggiorna le statistiche di dati con una mano; usata sia dal gioco sia dal
+	# ripristino, cosi' le due strade non possono divergere.
+	# Ritorna (nuovo record vincita, nuovo record perdita).
+	data = a_epoca(record['t']) # i diari precedenti avevano date testuali
+	nuova_vincita_massima = nuova_perdita_massima = False
+	if record['l']:
+		dati['fiches_perdute'] += record['l']
+		if record['l'] > dati['perdita_massima']:
+			dati['perdita_massima'] = record['l']
+			dati['data_perdita_massima'] = data
+			nuova_perdita_massima = True
+	else:
+		dati['fiches_guadagnate'] += record['v']
+		if record['v'] > dati['vincita_massima']:
+			dati['vincita_massima'] = record['v']
+			dati['data_vincita_massima'] = data
+			nuova_vincita_massima = True
+	dati['fiches_attuali'] = record['f']
+	dati['mani_giocate'] += 1
+	dati['mani_dall_ultimo_fallimento'] += 1
+	dati['killer_hand_count'] = record['k']
+	if record['f'] > 0 and dati['mani_dall_ultimo_fallimento'] > dati['record_mani_senza_fallimenti']:
+		dati['record_mani_senza_fallimenti'] = dati['mani_dall_ultimo_fallimento']
+	if record['r'] in dati['punteggi']:
+		dati['punteggi'][record['r']]['conteggio'] += 1
+		dati['punteggi'][record['r']]['ultima_realizzazione'] = data
+	if record['g']:
+		dati['fallimenti'] += 1
+		dati['data_ultimo_fallimento'] = data
+		dati['mani_dall_ultimo_fallimento'] = 0
+		dati['killer_hand_count'] = 0
+		dati['data_ultima_giocata'] = data
+	registra_mano(dati, record) # Aggregati del report, senza ricalcoli
+	dati['seq_diario'] = record['n']
+	return nuova_vincita_massima, nuova_perdita_massima
+
+def leggi_diario(percorso=FILE_DIARIO):
+	# Generatore dei record validi; una riga finale troncata da un crash viene ignorata
+	try:
+		with open(percorso, 'r', encoding='utf-8') as f:
+			import json # Solo se c'e' un diario: all'avvio di solito non serve
+			for riga in f:
+				try:
+					yield json.loads(riga)
+				except ValueError:
+					return
+	except FileNotFoundError:
+		return
+
+def ripristina_da_diario(dati, percorso=FILE_DIARIO):
+	# Riapplica le mani successive allo snapshot; ritorna quante ne ha applicate
+	ultima = dati.get('seq_diario', 0)
+	applicate = 0
+	for record in leggi_diario(percorso):
+		if record['n'] > ultima:
+			applica_mano(dati, record)
+			ultima = record['n']
+			applicate += 1
+	return applicate
+
+class Diario:
+	def __init__(self, percorso=FILE_DIARIO, modalita='gruppo', intervallo_gruppo=32, intervallo_snapshot=200):
+		if modalita not in MODALITA:
+			raise ValueError(f"Modalita' diario non valida: {modalita}")
+		self.percorso = percorso
+		self.modalita = modalita
+		self.intervallo_gruppo = intervallo_gruppo
+		self.intervallo_snapshot = intervallo_snapshot
+		self._file = None
+		self._non_sincronizzati = 0
+		self._dall_ultimo_snapshot = 0
+
+	def registra(self, record):
+		# Aggiunge il record; ritorna True quando e' ora di compattare in uno snapshot
+		import json # Importato alla prima mano, non prima del primo prompt
+		if self._file is None:
+			self._file = open(self.percorso, 'a', encoding='utf-8')
+		self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+		self._file.flush()
+		self._non_sincronizzati += 1
+		if self.modalita == 'mano' or (self.modalita == 'gruppo' and self._non_sincronizzati >= self.intervallo_gruppo):
+			self.sincronizza()
+		self._dall_ultimo_snapshot += 1
+		return self._dall_ultimo_snapshot >= self.intervallo_snapshot
+
+	def sincronizza(self):
+		if self._file is not None and self._non_sincronizzati:
+			os.fsync(self._file.fileno())
+			self._non_sincronizzati = 0
+
+	@strumentato('compatta_diario')
+	def compatta(self, dati, salva):
+		# Snapshot completo tramite `salva(dati)` e poi svuotamento del diario. Se il
+		# processo muore in mezzo, al riavvio il diario viene riapplicato solo oltre
+		# dati['seq_diario'], quindi nessuna mano viene contata due volte.
+		self.sincronizza()
+		if not salva(dati):
+			return False
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+		with open(self.percorso, 'w', encoding='utf-8'):
+			pass
+		self._dall_ultimo_snapshot = 0
+		return True
+
+	def chiudi(self):
+		if self._file is not None:
+			self.sincronizza()
+			self._file.close()
+			self._file = None
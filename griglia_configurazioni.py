@@ -0,0 +1,252 @@
+# GRIGLIA_CONFIGURAZIONI - Simulazione di una griglia di configurazioni in parallelo
+# Ogni configurazione (regole.Configurazione: tabella vincite, mazzi, Killer Hand,
+# puntata minima, soglia di rimescolamento) viene simulata a lotti di mani su un
+# pool di processi. Dopo ogni lotto si calcola l'intervallo di confidenza dell'RTP
+# (stimatore a rapporto sui lotti): quando esclude l'RTP obiettivo la configurazione
+# si ferma, altrimenti continua fino a --max-lotti. I lotti hanno seed derivati da
+# (seed, configurazione, indice) e si contano solo in ordine di indice, quindi il
+# risultato non dipende da quale processo finisce prima. Ogni lotto concluso viene
+# scritto nel file di checkpoint: rilanciando lo stesso comando si riprende da li'.
+# Uso: python griglia_configurazioni.py --valore "Scala a colore=50,55,60" --valore num_mazzi=2,10 \
+#          --obiettivo 1.5 --mani-lotto 100000 --checkpoint griglia.json [--processi 8]
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import product
+from statistics import NormalDist
+
+from regole import CONFIGURAZIONE_PREDEFINITA, TABELLA_VINCITE, verifica_configurazione
+from simulazione import POLITICHE, STRATEGIE, probabilita_rovina, seed_worker, simula, unisci_risultati
+
+MIN_LOTTI = 5 # Lotti prima di poter fermare una configurazione (medie per lotti: con meno la stima dell'errore e' fragile)
+CAMPI = tuple(campo for campo in CONFIGURAZIONE_PREDEFINITA._fields if campo != 'tabella_vincite')
+
+# --- Griglia ---
+def _numero(testo):
+	valore = float(testo)
+	return int(valore) if valore.is_integer() else valore
+
+def assi_griglia(opzioni):
+	# ["Scala a colore=50,55", "num_mazzi=2,10"] -> [[(nome, valore), ...], ...]
+	assi = []
+	for opzione in opzioni:
+		nome, _, valori = opzione.partition('=')
+		nome = nome.strip()
+		if (nome not in CAMPI and nome not in TABELLA_VINCITE) or not valori:
+			raise ValueError(f"Valore non valido: {opzione!r}. Atteso 'nome=v1[,v2...]' con nome tra "
+				f"{', '.join(CAMPI)} o una categoria della tabella vincite.")
+		assi.append([(nome, _numero(v)) for v in valori.split(',')])
+	return assi
+
+def configurazioni(assi):
+	# Ritorna [(chiave, parametri, Configurazione)] per ogni combinazione della griglia;
+	# ValueError alla prima combinazione non giocabile, prima di avviare i processi
+	risultato = []
+	for scelta in product(*assi):
+		parametri = dict(scelta)
+		tabella = dict(TABELLA_VINCITE)
+		campi = {}
+		for nome, valore in parametri.items():
+			if nome in TABELLA_VINCITE:
+				tabella[nome] = valore
+			else:
+				campi[nome] = valore
+		configurazione = CONFIGURAZIONE_PREDEFINITA._replace(tabella_vincite=tabella, **campi)
+		chiave = ", ".join(f"{nome}={valore}" for nome, valore in scelta) or "predefinita"
+		try:
+			verifica_configurazione(configurazione)
+		except ValueError as errore:
+			if len(scelta) < 2:
+				raise
+			raise ValueError(f"Configurazione non valida ({chiave}): {errore}") from None
+		risultato.append((chiave, parametri, configurazione))
+	return risultato
+
+# --- Statistica ---
+def intervallo_rtp(lotti, z):
+	# lotti: [(fiches_puntate, fiches_restituite)]. Stimatore a rapporto sum(R) / sum(P) con
+	# errore standard linearizzato sui lotti. Ritorna (rtp, semiampiezza) o (rtp, None).
+	puntate = sum(p for p, _ in lotti)
+	restituite = sum(r for _, r in lotti)
+	if not puntate:
+		return 0.0, None
+	rtp = restituite / puntate
+	n = len(lotti)
+	if n < 2:
+		return rtp, None
+	media_puntate = puntate / n
+	scarti = sum((r - rtp * p) ** 2 for p, r in lotti) / (n - 1)
+	return rtp, z * (scarti / n) ** 0.5 / media_puntate
+
+def esito_configurazione(lotti, obiettivo, z):
+	# 'sopra' / 'sotto' se l'intervallo esclude l'obiettivo, altrimenti None
+	rtp, semiampiezza = intervallo_rtp(lotti, z)
+	if semiampiezza is None or len(lotti) < MIN_LOTTI:
+		return None
+	if rtp - semiampiezza > obiettivo:
+		return 'sopra'
+	if rtp + semiampiezza < obiettivo:
+		return 'sotto'
+	return None
+
+# --- Checkpoint ---
+def carica_checkpoint(percorso, impostazioni):
+	if not percorso or not os.path.exists(percorso):
+		return {}
+	with open(percorso, encoding='utf-8') as f:
+		salvato = json.load(f)
+	if salvato['impostazioni'] != impostazioni:
+		raise ValueError(f"{percorso} e' di una griglia con impostazioni diverse: "
+			"usa un altro --checkpoint o le stesse opzioni")
+	return salvato['configurazioni']
+
+def salva_checkpoint(percorso, impostazioni, stati):
+	# Come salva_dati: file temporaneo e os.replace, mai un checkpoint a meta'
+	if not percorso:
+		return
+	temporaneo = percorso + '.tmp'
+	with open(temporaneo, 'w', encoding='utf-8') as f:
+		json.dump({'impostazioni': impostazioni, 'configurazioni': stati}, f)
+	os.replace(temporaneo, percorso)
+
+# --- Esecuzione ---
+def _lotto(argomenti):
+	chiave, indice, configurazione, impostazioni = argomenti
+	risultato = simula(impostazioni['mani_lotto'], STRATEGIE[impostazioni['strategia']],
+		POLITICHE[impostazioni['puntata']], seed_worker(impostazioni['seed'], f"{chiave}:{indice}"),
+		orizzonte=impostazioni['orizzonte'], configurazione=configurazione)
+	return chiave, indice, risultato
+
+def nuovo_stato(parametri):
+	return {'parametri': parametri, 'lotti': [], 'totale': None, 'esito': None}
+
+def assorbi(stato, in_attesa, impostazioni, z):
+	# Conta i lotti arrivati in ordine di indice finche' la configurazione non si ferma
+	while stato['esito'] is None and len(stato['lotti']) in in_attesa:
+		risultato = in_attesa.pop(len(stato['lotti']))
+		stato['lotti'].append((risultato['fiches_puntate'], risultato['fiches_restituite']))
+		stato['totale'] = unisci_risultati([stato['totale'], risultato] if stato['totale'] else [risultato])
+		stato['esito'] = esito_configurazione(stato['lotti'], impostazioni['obiettivo'], z)
+		if stato['esito'] is None and len(stato['lotti']) >= impostazioni['max_lotti']:
+			stato['esito'] = 'compatibile'
+
+def esegui_griglia(griglia, impostazioni, num_processi=1, percorso_checkpoint=None, avanzamento=None):
+	# griglia: [(chiave, parametri, Configurazione)]. Ritorna {chiave: stato}.
+	z = NormalDist().inv_cdf(0.5 + impostazioni['confidenza'] / 2)
+	salvati = carica_checkpoint(percorso_checkpoint, impostazioni)
+	stati = {chiave: salvati.get(chiave) or nuovo_stato(parametri) for chiave, parametri, _ in griglia}
+	per_chiave = {chiave: configurazione for chiave, _, configurazione in griglia}
+	in_attesa = {chiave: {} for chiave in stati}
+	inviati = {chiave: len(stato['lotti']) for chiave, stato in stati.items()}
+
+	def prossimi(quanti):
+		# Lotti da inviare, a turno tra le configurazioni ancora aperte
+		lavori = []
+		while len(lavori) < quanti:
+			aperte = [c for c, s in stati.items() if s['esito'] is None and inviati[c] < impostazioni['max_lotti']]
+			if not aperte:
+				break
+			chiave = min(aperte, key=lambda c: inviati[c])
+			lavori.append((chiave, inviati[chiave], per_chiave[chiave], impostazioni))
+			inviati[chiave] += 1
+		return lavori
+
+	def concluso(chiave, indice, risultato):
+		if stati[chiave]['esito'] is not None:
+			return # Lotto inviato prima che la configurazione si fermasse
+		in_attesa[chiave][indice] = risultato
+		assorbi(stati[chiave], in_attesa[chiave], impostazioni, z)
+		salva_checkpoint(percorso_checkpoint, impostazioni, stati)
+		if avanzamento and stati[chiave]['esito'] is not None:
+			avanzamento(chiave, stati[chiave])
+
+	if num_processi <= 1:
+		while True:
+			lavori = prossimi(1)
+			if not lavori:
+				break
+			concluso(*_lotto(lavori[0]))
+		return stati
+	with ProcessPoolExecutor(max_workers=num_processi) as executor:
+		in_corso = {executor.submit(_lotto, lavoro) for lavoro in prossimi(2 * num_processi)}
+		while in_corso:
+			finiti, in_corso = wait(in_corso, return_when=FIRST_COMPLETED)
+			for futuro in finiti:
+				concluso(*futuro.result())
+			in_corso |= {executor.submit(_lotto, lavoro) for lavoro in prossimi(2 * num_processi - len(in_corso))}
+	return stati
+
+# --- Report ---
+def classifica(stati, obiettivo, z):
+	# Righe ordinate per distanza dell'RTP dall'obiettivo
+	righe = []
+	for chiave, stato in stati.items():
+		if not stato['lotti']:
+			continue
+		rtp, semiampiezza = intervallo_rtp(stato['lotti'], z)
+		righe.append({
+			'chiave': chiave,
+			'rtp': rtp,
+			'semiampiezza': semiampiezza,
+			'mani': stato['totale']['mani_giocate'],
+			'rovina': probabilita_rovina(stato['totale']),
+			'esito': stato['esito'] or 'in corso',
+		})
+	return sorted(righe, key=lambda riga: abs(riga['rtp'] - obiettivo))
+
+def stampa_classifica(righe, obiettivo):
+	print(f"\n== Classifica (RTP obiettivo {obiettivo * 100:.2f}%) ==")
+	print(f"{'#':>3}  {'RTP':>9}  {'+/-':>7}  {'Mani':>11}  {'Rovina':>7}  {'Esito':<11}  Configurazione")
+	for posizione, riga in enumerate(righe, 1):
+		semiampiezza = f"{riga['semiampiezza'] * 100:.3f}" if riga['semiampiezza'] is not None else "-"
+		print(f"{posizione:>3}  {riga['rtp'] * 100:>8.3f}%  {semiampiezza:>7}  {riga['mani']:>11,}  "
+			f"{riga['rovina'] * 100:>6.2f}%  {riga['esito']:<11}  {riga['chiave']}")
+
+def main():
+	parser = argparse.ArgumentParser(description="Simulazione di una griglia di configurazioni della Poker Machine")
+	parser.add_argument('--valore', action='append', default=[], metavar='NOME=V1[,V2...]',
+		help=f"Asse della griglia: {', '.join(CAMPI)} o una categoria della tabella vincite")
+	parser.add_argument('--obiettivo', type=float, required=True, help="RTP obiettivo (es. 0.98)")
+	parser.add_argument('--confidenza', type=float, default=0.95)
+	parser.add_argument('--mani-lotto', type=int, default=100000)
+	parser.add_argument('--max-lotti', type=int, default=50, help="Lotti massimi per configurazione")
+	parser.add_argument('--strategia', choices=sorted(STRATEGIE), default='semplice')
+	parser.add_argument('--puntata', choices=sorted(POLITICHE), default='m')
+	parser.add_argument('--orizzonte', type=int, default=1000, help="Mani massime per vita")
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--processi', type=int, default=os.cpu_count() or 1)
+	parser.add_argument('--checkpoint', metavar='PERCORSO', help="File JSON dei lotti conclusi, per riprendere")
+	args = parser.parse_args()
+	try:
+		griglia = configurazioni(assi_griglia(args.valore))
+	except ValueError as errore:
+		parser.error(str(errore))
+	impostazioni = {
+		'obiettivo': args.obiettivo, 'confidenza': args.confidenza, 'mani_lotto': args.mani_lotto,
+		'max_lotti': args.max_lotti, 'strategia': args.strategia, 'puntata': args.puntata,
+		'orizzonte': args.orizzonte, 'seed': args.seed,
+	}
+	z = NormalDist().inv_cdf(0.5 + args.confidenza / 2)
+
+	def avanzamento(chiave, stato):
+		rtp, _ = intervallo_rtp(stato['lotti'], z)
+		print(f"{chiave}: {stato['esito']} dopo {len(stato['lotti'])} lotti (RTP {rtp * 100:.3f}%)")
+
+	print(f"{len(griglia)} configurazioni, {args.processi} processi, lotti da {args.mani_lotto:,} mani")
+	inizio = time.perf_counter()
+	try:
+		stati = esegui_griglia(griglia, impostazioni, args.processi, args.checkpoint, avanzamento)
+	except ValueError as errore:
+		parser.error(str(errore))
+	except KeyboardInterrupt:
+		if args.checkpoint:
+			print(f"\nInterrotto: i lotti conclusi sono in {args.checkpoint}, rilancia lo stesso comando per riprendere.")
+		raise SystemExit(1)
+	stampa_classifica(classifica(stati, args.obiettivo, z), args.obiettivo)
+	print(f"\nTempo: {time.perf_counter() - inizio:.1f}s")
+
+if __name__ == "__main__":
+	main()
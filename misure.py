@@ -0,0 +1,31 @@
+# MISURE - Punti di misura che non caricano la strumentazione finche' non serve
+# I moduli letti all'avvio (gioco, diario, statistiche) prendono @strumentato da
+# qui: finche' strumentazione.py non e' importato (POKERMACHINE_STRUMENTAZIONE=1
+# o un comando ! del gioco) la funzione avvolta chiama direttamente l'originale,
+# dopo passa per strumentazione.strumentato. Cosi' il primo prompt non paga
+# l'importazione della strumentazione.
+
+import os
+import sys
+from functools import wraps
+
+VARIABILE = 'POKERMACHINE_STRUMENTAZIONE'
+AIUTO_BREVE = "  ! : Comandi di strumentazione e profilo (!? per l'elenco)"
+
+def attiva_da_ambiente():
+	return os.environ.get(VARIABILE, '') not in ('', '0')
+
+def strumentato(nome):
+	def decora(funzione):
+		misurata = None
+		@wraps(funzione)
+		def avvolta(*args, **kwargs):
+			nonlocal misurata
+			if misurata is None:
+				strumentazione = sys.modules.get('strumentazione')
+				if strumentazione is None:
+					return funzione(*args, **kwargs)
+				misurata = strumentazione.strumentato(nome)(funzione)
+			return misurata(*args, **kwargs)
+		return avvolta
+	return decora
@@ -0,0 +1,321 @@
+# OTTIMIZZATORE_PUNTATE - Politica di puntata ottimale con la Killer Hand
+# Programmazione dinamica all'indietro, mano per mano, su una griglia di fiches:
+# interi esatti fino a --esatti (0 = fallimento, assorbente), poi livelli
+# geometrici (+1%) fino a --massimo, con interpolazione in log tra due livelli.
+# La mano n della vita (come mani_dall_ultimo_fallimento + 1) e' una KH se n e'
+# multiplo di KILLER_HAND_FREQUENZA e la sua penalita' dipende da n // frequenza:
+# lo stato e' (fiches, n), e la politica da' la frazione delle fiches per fascia
+# di fiches, posizione nel ciclo di 25 mani e numero di KH.
+# Transizioni in cache: per ogni frazione e tipo di mano (normale o KH #j fino
+# alla penalita' massima) gli indici di arrivo e i pesi di ogni esito, con le
+# probabilita' di calcolo_rtp (tenuta ottimale; nella KH quella che tiene conto
+# della penalita' in puntate alla frazione nominale).
+# Obiettivi:
+# - crescita: massima E[log(1 + fiches)] dopo --mani mani (il fallimento vale 0)
+# - sopravvivenza: massima mediana delle mani fino al fallimento (come
+#   record_mani_senza_fallimenti): la piu' lunga durata H con P(vivo dopo H) >= 1/2,
+#   cercata per bisezione su H fino a --mani
+# Uso: python ottimizzatore_puntate.py [--obiettivo crescita|sopravvivenza] [--mani 500] [--mazzi 10]
+#      python ottimizzatore_puntate.py --obiettivo sopravvivenza --mani 2000 --salva politica.npz
+#      python simulazione.py 1000000 --strategia ottimale --politica-file politica.npz
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from regole import CONFIGURAZIONE_PREDEFINITA, FICHES_INIZIALI, SHORTCUT_PUNTATA, penalita_killer_hand
+from valutatore import CATEGORIE
+
+FRAZIONI = (CONFIGURAZIONE_PREDEFINITA.percentuale_minima_puntata, 0.05, 0.10, 0.15, 0.20, 0.25, 0.35, 0.50, 0.75, 1.0)
+ESATTI = 1000 # Fiches rappresentate una per una
+RAPPORTO = 1.01 # Passo della griglia geometrica sopra ESATTI
+MASSIMO = 1e9 # Oltre: crescita estrapolata in log, sopravvivenza come al massimo
+FASCE = (1, 10, 30, 100, 300, 1000, 10000, 10 ** 6) # Limiti inferiori delle fasce di fiches nella stampa
+OBIETTIVI = ('crescita', 'sopravvivenza')
+_DISTRIBUZIONI = {} # (mazzi, pagamenti, penalita' in puntate) -> probabilita' per categoria
+
+# --- Modello ---
+def griglia_fiches(esatti=ESATTI, rapporto=RAPPORTO, massimo=MASSIMO):
+	passi = max(0, math.ceil(math.log(massimo / esatti) / math.log(rapporto)))
+	return np.concatenate([np.arange(esatti + 1, dtype=np.float64), esatti * rapporto ** np.arange(1, passi + 1)])
+
+def posizione(griglia, esatti, rapporto, valori):
+	# Indice del livello sotto `valori`, peso del livello sopra e, oltre l'ultimo
+	# livello, l'eccesso log1p(valore) - log1p(ultimo livello)
+	valori = np.maximum(valori, 0.0)
+	sopra = valori > esatti
+	continuo = np.where(sopra, esatti + np.log(np.where(sopra, valori, esatti) / esatti) / math.log(rapporto), valori)
+	basso = np.floor(continuo)
+	peso = continuo - basso
+	ultimo = len(griglia) - 1
+	fuori = basso >= ultimo
+	eccesso = np.where(fuori, np.log1p(valori) - math.log1p(griglia[-1]), 0.0)
+	return np.where(fuori, ultimo, basso).astype(np.int32), np.where(fuori, 0.0, peso), eccesso
+
+def probabilita_categorie(configurazione, penalita_in_puntate=0.0):
+	# Tenuta ottimale per importo restituito - P(perdita) * penalita' (in puntate)
+	from calcolo_rtp import distribuzione
+	pagamenti = tuple(float(configurazione.tabella_vincite.get(nome, 0)) for nome in CATEGORIE)
+	chiave = (configurazione.num_mazzi, pagamenti, round(penalita_in_puntate, 9))
+	if chiave not in _DISTRIBUZIONI:
+		valori = np.array(pagamenti)
+		valori[valori < 1] -= penalita_in_puntate
+		_DISTRIBUZIONI[chiave] = distribuzione(valori, configurazione.num_mazzi)
+	return _DISTRIBUZIONI[chiave]
+
+def puntate(fiches, frazione, percentuale_minima):
+	# Come interpreta_puntata + valida_puntata (e simula): frazione delle fiches, minimo, al massimo tutto
+	intere = np.floor(fiches)
+	minima = np.maximum(np.floor(intere * percentuale_minima), 1)
+	return np.minimum(np.maximum(np.floor(intere * frazione), minima), intere)
+
+def _insieme(griglia, esatti, rapporto, configurazione, frazioni, penalita):
+	# Transizioni di un tipo di mano (penalita = 0: normale) per tutte le frazioni:
+	# indici (A, N, esiti), pesi del livello basso e alto gia' moltiplicati per la
+	# probabilita' dell'esito, eccesso atteso oltre la griglia (A, N)
+	pagamenti = np.array([configurazione.tabella_vincite.get(nome, 0) for nome in CATEGORIE], dtype=np.float64)
+	esiti = np.unique(pagamenti)
+	indici, bassi, alti, eccessi = [], [], [], []
+	for frazione in frazioni:
+		in_puntate = penalita / 100 * (1 - frazione) / frazione if penalita else 0.0
+		per_categoria = probabilita_categorie(configurazione, in_puntate)
+		probabilita = np.array([per_categoria[pagamenti == m].sum() for m in esiti])
+		puntata = puntate(griglia, frazione, configurazione.percentuale_minima_puntata)
+		resto = griglia - puntata
+		arrivo = np.empty((len(griglia), len(esiti)))
+		for k, m in enumerate(esiti):
+			if m >= 1:
+				arrivo[:, k] = resto + puntata * m
+			else: # Perdita: nella KH anche la penalita' sulle fiches rimaste
+				arrivo[:, k] = resto - np.minimum(np.floor(np.floor(resto) * penalita / 100), np.floor(resto))
+		arrivo[0] = 0 # Fallimento: assorbente
+		indice, peso, eccesso = posizione(griglia, esatti, rapporto, arrivo)
+		indici.append(indice)
+		bassi.append((1 - peso) * probabilita)
+		alti.append(peso * probabilita)
+		eccessi.append(eccesso @ probabilita)
+	return np.array(indici), np.array(bassi), np.array(alti), np.array(eccessi)
+
+def costruisci_modello(configurazione=CONFIGURAZIONE_PREDEFINITA, frazioni=FRAZIONI, esatti=ESATTI,
+		rapporto=RAPPORTO, massimo=MASSIMO):
+	griglia = griglia_fiches(esatti, rapporto, massimo)
+	# Tipo 0: mano normale; tipo j: KH #j, fino alla prima con la penalita' massima
+	penalita = [0]
+	while penalita[-1] < configurazione.max_penalita_kh:
+		penalita.append(penalita_killer_hand(len(penalita), configurazione.max_penalita_kh))
+	return {
+		'configurazione': configurazione,
+		'griglia': griglia,
+		'esatti': esatti,
+		'rapporto': rapporto,
+		'frazioni': tuple(frazioni),
+		'penalita': penalita,
+		'insiemi': [_insieme(griglia, esatti, rapporto, configurazione, frazioni, p) for p in penalita],
+	}
+
+def tipo_mano(modello, t):
+	# t: mani gia' giocate nella vita (la mano in corso e' la t + 1)
+	frequenza = modello['configurazione'].killer_hand_frequenza
+	if (t + 1) % frequenza:
+		return 0
+	return min((t + 1) // frequenza, len(modello['penalita']) - 1)
+
+# --- Programmazione dinamica ---
+def indietro(modello, mani, obiettivo, azione=None):
+	# Valore all'inizio della vita per ogni livello di fiches e politica (mani, N)
+	# (indice della frazione). azione: frazione fissa (indice) invece del massimo.
+	griglia = modello['griglia']
+	valore = np.log1p(griglia) if obiettivo == 'crescita' else (griglia >= 1).astype(np.float64)
+	politica = np.zeros((mani, len(griglia)), dtype=np.int8)
+	for t in range(mani - 1, -1, -1):
+		indici, bassi, alti, eccessi = modello['insiemi'][tipo_mano(modello, t)]
+		if azione is not None:
+			indici, bassi, alti, eccessi = indici[azione:azione + 1], bassi[azione:azione + 1], alti[azione:azione + 1], eccessi[azione:azione + 1]
+		esteso = np.append(valore, valore[-1])
+		q = (esteso[indici] * bassi + esteso[indici + 1] * alti).sum(axis=2)
+		if obiettivo == 'crescita':
+			q += eccessi
+		migliore = np.argmax(q, axis=0)
+		valore = q[migliore, np.arange(len(griglia))]
+		politica[t] = migliore if azione is None else azione
+	return valore, politica
+
+def avanti(modello, politica, fiches=FICHES_INIZIALI):
+	# P(ancora in vita) dopo ogni mano seguendo la politica, partendo da `fiches`
+	griglia = modello['griglia']
+	numero = len(griglia)
+	massa = np.zeros(numero)
+	massa[posizione(griglia, modello['esatti'], modello['rapporto'], np.array([float(fiches)]))[0][0]] = 1.0
+	tutti = np.arange(numero)
+	vivi = np.empty(len(politica))
+	for t, azioni in enumerate(politica):
+		indici, bassi, alti, _ = modello['insiemi'][tipo_mano(modello, t)]
+		scelti = (azioni, tutti)
+		massa = (np.bincount(indici[scelti].ravel(), (massa[:, None] * bassi[scelti]).ravel(), numero + 1) +
+			np.bincount((indici[scelti] + 1).ravel(), (massa[:, None] * alti[scelti]).ravel(), numero + 1))[:numero]
+		vivi[t] = 1.0 - massa[0]
+	return vivi
+
+def mediana(vivi):
+	# Mani fino al fallimento: prima mano dopo la quale P(vivo) < 1/2 (None se oltre)
+	sotto = np.flatnonzero(vivi < 0.5)
+	return int(sotto[0]) + 1 if len(sotto) else None
+
+def massima_mediana(modello, mani, fiches=FICHES_INIZIALI):
+	# Bisezione sulla durata H: P*(vivo dopo H) non cresce con H, la mediana
+	# ottimale e' la H piu' lunga con P* >= 1/2. Ritorna (H, politica per H, P*)
+	indice = posizione(modello['griglia'], modello['esatti'], modello['rapporto'], np.array([float(fiches)]))[0][0]
+	valore, politica = indietro(modello, mani, 'sopravvivenza')
+	if valore[indice] >= 0.5:
+		return mani, politica, float(valore[indice])
+	basso, alto, trovata = 0, mani, (None, 0.0)
+	while alto - basso > 1:
+		meta = (basso + alto) // 2
+		valore, politica = indietro(modello, meta, 'sopravvivenza')
+		if valore[indice] >= 0.5:
+			basso, trovata = meta, (politica, float(valore[indice]))
+		else:
+			alto = meta
+	return basso, trovata[0], trovata[1]
+
+# --- Stampa ---
+def nome_frazione(frazione):
+	simboli = {v: k for k, v in SHORTCUT_PUNTATA.items()}
+	if frazione == CONFIGURAZIONE_PREDEFINITA.percentuale_minima_puntata:
+		return f"m {frazione * 100:g}%"
+	return f"{simboli[frazione]} {frazione * 100:g}%" if frazione in simboli else f"{frazione * 100:g}%"
+
+def righe_politica(modello, politica):
+	# Per ciclo di KH: gruppi di mani consecutive con la stessa frazione (la piu'
+	# frequente sulla griglia) in ogni fascia di fiches
+	griglia = modello['griglia']
+	frequenza = modello['configurazione'].killer_hand_frequenza
+	limiti = [f for f in FASCE if f <= griglia[-1]] + [griglia[-1] + 1]
+	fasce = [np.flatnonzero((griglia >= a) & (griglia < b)) for a, b in zip(limiti, limiti[1:])]
+	intestazioni = [f"{a:g}+" if b > griglia[-1] else f"{a:g}-{b - 1:g}" for a, b in zip(limiti, limiti[1:])]
+	righe = [f"{'ciclo':<6}{'mani':<10}" + "".join(f"{testo:>14}" for testo in intestazioni)]
+	cicli = min(len(modello['penalita']), math.ceil(len(politica) / frequenza))
+	for ciclo in range(cicli):
+		gruppi = []
+		for t in range(ciclo * frequenza, min((ciclo + 1) * frequenza, len(politica))):
+			voce = tuple(int(np.bincount(politica[t, fascia], minlength=len(modello['frazioni'])).argmax()) for fascia in fasce)
+			if gruppi and gruppi[-1][2] == voce:
+				gruppi[-1][1] = t
+			else:
+				gruppi.append([t, t, voce])
+		for primo, ultimo, voce in gruppi:
+			if tipo_mano(modello, primo):
+				testo = f"KH #{tipo_mano(modello, primo)}"
+			else:
+				testo = f"{primo % frequenza + 1}-{ultimo % frequenza + 1}" if ultimo > primo else f"{primo % frequenza + 1}"
+			etichetta = f"{ciclo}+" if ciclo == len(modello['penalita']) - 1 else str(ciclo)
+			righe.append(f"{etichetta:<6}{testo:<10}" + "".join(f"{nome_frazione(modello['frazioni'][a]):>14}" for a in voce))
+	return righe
+
+def confronto(modello, mani, obiettivo, politica_ottimale, fiches=FICHES_INIZIALI):
+	# Righe (nome, valore dell'obiettivo, P(fallimento entro mani), mediana) per la
+	# politica ottimale e per ogni frazione fissa
+	indice = posizione(modello['griglia'], modello['esatti'], modello['rapporto'], np.array([float(fiches)]))[0][0]
+	risultati = []
+	candidati = [("ottimale", None)] + [(nome_frazione(f), a) for a, f in enumerate(modello['frazioni'])]
+	for nome, azione in candidati:
+		if azione is None:
+			politica = politica_ottimale
+			valore = indietro(modello, mani, obiettivo)[0][indice] if obiettivo == 'crescita' else None
+		else:
+			valore, politica = indietro(modello, mani, obiettivo, azione)
+			valore = valore[indice]
+		vivi = avanti(modello, politica, fiches)
+		risultati.append((nome, valore, 1 - vivi[-1], mediana(vivi)))
+	return risultati
+
+def main():
+	parser = argparse.ArgumentParser(description="Politica di puntata ottimale con la Killer Hand (programmazione dinamica)")
+	parser.add_argument('--obiettivo', choices=OBIETTIVI, default='crescita')
+	parser.add_argument('--mani', type=int, default=500,
+		help="crescita: mani della vita; sopravvivenza: mediana massima cercata")
+	parser.add_argument('--mazzi', type=int, default=CONFIGURAZIONE_PREDEFINITA.num_mazzi)
+	parser.add_argument('--fiches', type=int, default=FICHES_INIZIALI, help="Fiches a inizio vita")
+	parser.add_argument('--frazioni', default=",".join(f"{f:g}" for f in FRAZIONI), help="Frazioni delle fiches da provare")
+	parser.add_argument('--esatti', type=int, default=ESATTI)
+	parser.add_argument('--rapporto', type=float, default=RAPPORTO)
+	parser.add_argument('--massimo', type=float, default=MASSIMO)
+	parser.add_argument('--salva', metavar="PERCORSO", help="Salva la politica (.npz) per simulazione.py --politica-file")
+	args = parser.parse_args()
+	configurazione = CONFIGURAZIONE_PREDEFINITA._replace(num_mazzi=args.mazzi)
+	frazioni = sorted({float(f) for f in args.frazioni.split(",")})
+	if not args.fiches <= args.esatti or not all(0 < f <= 1 for f in frazioni):
+		raise SystemExit("Servono --fiches <= --esatti e frazioni in (0, 1].")
+	inizio = time.perf_counter()
+	modello = costruisci_modello(configurazione, frazioni, args.esatti, args.rapporto, args.massimo)
+	tempo_modello = time.perf_counter() - inizio
+	inizio = time.perf_counter()
+	if args.obiettivo == 'crescita':
+		durata = args.mani
+		politica = indietro(modello, durata, 'crescita')[1]
+	else:
+		durata, politica, probabilita = massima_mediana(modello, args.mani, args.fiches)
+		if politica is None:
+			raise SystemExit(f"Con {args.fiches} fiches nessuna politica arriva viva alla prima mano con probabilita' >= 1/2.")
+	tempo_ottimo = time.perf_counter() - inizio
+	inizio = time.perf_counter()
+	righe = confronto(modello, durata, args.obiettivo, politica, args.fiches)
+	tempo_confronto = time.perf_counter() - inizio
+	print(f"\n== Politica di puntata: obiettivo {args.obiettivo}, {args.mazzi} mazzi, {args.fiches} fiches iniziali ==")
+	print(f"Griglia: {len(modello['griglia'])} livelli (interi fino a {args.esatti}, poi x{args.rapporto:g} fino a {args.massimo:g}), "
+		f"{len(frazioni)} frazioni, {len(modello['insiemi'])} tipi di mano (normale e KH #1-#{len(modello['penalita']) - 1})")
+	if args.obiettivo == 'sopravvivenza':
+		oltre = " (limite della ricerca: prova un --mani piu' alto)" if durata == args.mani else ""
+		print(f"Mediana massima delle mani senza fallimenti: {durata}{oltre}, P(vivo dopo {durata}) = {probabilita:.4f}")
+	print("\nFrazione delle fiches per fascia (ciclo = KH gia' giocate):")
+	for riga in righe_politica(modello, politica):
+		print(riga)
+	crescita = args.obiettivo == 'crescita'
+	colonne = f"{f'E[log(1+F)] a {durata}':>20}{'log/mano':>10}" if crescita else ""
+	print(f"\n{'politica':<12}{colonne}{f'P(fall.) a {durata}':>18}{'mediana':>10}")
+	for nome, valore, fallimento, mani_mediana in righe:
+		testo = f"{valore:>20.4f}{(valore - math.log1p(args.fiches)) / durata:>+10.5f}" if crescita else ""
+		print(f"{nome:<12}{testo}{fallimento:>18.4f}{mani_mediana if mani_mediana else f'>{durata}':>10}")
+	print(f"\nTempo: transizioni {tempo_modello:.1f}s | ottimizzazione {tempo_ottimo:.1f}s | confronto {tempo_confronto:.1f}s")
+	if args.salva:
+		salva_politica(args.salva, modello, politica)
+		print(f"Politica salvata in {args.salva}")
+
+# --- Politica per la simulazione ---
+def salva_politica(percorso, modello, politica):
+	np.savez_compressed(percorso, politica=politica, frazioni=np.array(modello['frazioni']),
+		esatti=modello['esatti'], rapporto=modello['rapporto'], livelli=len(modello['griglia']),
+		frequenza=modello['configurazione'].killer_hand_frequenza)
+
+class PoliticaTabella:
+	# Politica di simulazione.simula da un file di salva_politica: (fiches, mano della
+	# vita, numero di KH) -> puntata. Oltre le mani della tabella ripete l'ultimo ciclo.
+	def __init__(self, percorso):
+		self.percorso = percorso
+		with np.load(percorso) as contenuto:
+			self.politica = contenuto['politica']
+			self.frazioni = contenuto['frazioni'].tolist()
+			self.esatti = int(contenuto['esatti'])
+			self.passo = math.log(float(contenuto['rapporto']))
+			self.ultimo = int(contenuto['livelli']) - 1
+			self.frequenza = int(contenuto['frequenza'])
+
+	def frazione(self, fiches, numero_mano_vita):
+		t = numero_mano_vita - 1
+		mani = len(self.politica)
+		if t >= mani:
+			ciclo = min(self.frequenza, mani)
+			t = mani - ciclo + (t - mani) % ciclo
+		if fiches <= self.esatti:
+			livello = max(fiches, 0)
+		else:
+			livello = min(self.esatti + round(math.log(fiches / self.esatti) / self.passo), self.ultimo)
+		return self.frazioni[self.politica[t, livello]]
+
+	def __call__(self, fiches, numero_mano_vita, killer_hand_count):
+		return int(fiches * self.frazione(fiches, numero_mano_vita))
+
+if __name__ == "__main__":
+	main()
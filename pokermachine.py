@@ -1,117 +1,109 @@
 # POKERMACHINE - Data di concepimento 2 ottobre 2024
 
-import pickle
+import os
+import struct
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from collections import Counter
-from GBUtils	import Mazzo
+from valutatore import valuta_codici
+from scarpa import Scarpa, chiave_ordinamento, desc_breve, nome_carta, nuovo_seed
+from diario import FILE_DIARIO, Diario, applica_mano, nuovo_record, ripristina_da_diario
+from storico import FILE_STORICO, Storico, mostra_riepilogo_storico
+from statistiche import (
+	a_epoca, adesso, aggiorna_aggregati, migra_finestra, migra_statistiche, mostra_report_esteso, nuovi_aggregati
+)
+from stato import codifica_stato, leggi_stato, scrivi_stato
+from misure import AIUTO_BREVE as AIUTO_STRUMENTI, attiva_da_ambiente, strumentato
+from regole import (
+	NUM_MAZZI, CARTE_PER_MANO, FICHES_INIZIALI, TABELLA_VINCITE, is_killer_hand,
+	penalita_killer_hand, regola_mano, interpreta_puntata, valida_puntata,
+	aiuto_puntata, interpreta_tenuta, PUNTEGGI_PER_VINCITA
+)
 # --- Costanti Globali ---
-NUM_MAZZI = 10 # Numero di mazzi standard da 52 carte usati
-CARTE_PER_MANO = 5
-# Soglia sotto la quale ricostruire e rimescolare tutto (5 iniziali + 5 sostituzioni = 10)
-# Usiamo un margine di sicurezza
-SOGLIA_RIMESCOLAMENTO_TOTALE = 15
-KILLER_HAND_FREQUENZA = 25
-PERCENTUALE_MINIMA_PUNTATA = 0.03 # 3%
-MAX_PENALITA_KH = 90 # Penalità massima in % per perdita Killer Hand
 VERSIONE = "3.1.1 del 8 settembre 2025"
-FILE_DATI = 'pokermachine_data.pkl'
-# Costanti per i valori delle carte (per chiarezza in valuta_mano)
-VALORE_JACK = 11
-VALORE_REGINA = 12
-VALORE_RE = 13
-VALORE_ASSO = 14 # Usiamo 14 per confronti, 1 per sequenza A-5
+FILE_DATI = 'pokermachine_stato.bin' # Formato di stato.py
+FILE_DATI_PICKLE = 'pokermachine_data.pkl' # Formato delle versioni precedenti, migrato una volta
+VERSIONE_SCHEMA = 3 # 1: chiavi e punteggi completi, 2: date epoch e aggregati del report, 3: finestra a tuple
 
-def carica_dati():
+def dati_iniziali():
+	# Schema versione 1 con tutti i valori di partenza
+	return {
+		'launches': 0,
+		'mani_giocate': 0,
+		'data_ultimo_fallimento': None,
+		'record_mani_senza_fallimenti': 0,
+		'mani_dall_ultimo_fallimento': 0,
+		'fiches_guadagnate': 0,
+		'fiches_perdute': 0,
+		'fiches_attuali': FICHES_INIZIALI,
+		'fallimenti': 0,
+		'killer_hand_count': 0,
+		# Un contatore per punteggio, compreso Super Poker (5 carte uguali)
+		'punteggi': {nome: {'conteggio': 0, 'ultima_realizzazione': None} for nome in TABELLA_VINCITE},
+		'vincita_massima': 0,
+		'data_vincita_massima': None,
+		'perdita_massima': 0,
+		'data_perdita_massima': None,
+		'data_ultima_giocata': None,
+		'seq_diario': 0
+	}
+
+def migra_dati(dati):
+	# Unico percorso di migrazione: porta un salvataggio di qualsiasi versione
+	# (anche {} per un nuovo giocatore) allo schema corrente, un passo alla volta.
+	versione = dati.get('versione_schema', 0)
+	if versione < 1:
+		# Vecchi save senza versione: chiavi e punteggi aggiunti nel tempo (es. Super Poker)
+		for chiave, valore in dati_iniziali().items():
+			dati.setdefault(chiave, valore)
+		for nome, info in dati_iniziali()['punteggi'].items():
+			dati['punteggi'].setdefault(nome, info)
+	if versione < 2:
+		migra_statistiche(dati) # Date in secondi epoch e aggregati del report
+	if versione < 3:
+		migra_finestra(dati)
+	dati['versione_schema'] = VERSIONE_SCHEMA
+	return dati
+
+def migra_pickle(percorso_pickle, percorso):
+	# Migrazione una tantum: il vecchio pickle (scritto da questo stesso programma)
+	# viene convertito nel nuovo formato e rinominato in .migrato, cosi' non si legge piu'.
+	# Ritorna i dati, o None se il pickle non c'e'.
+	import pickle
 	try:
-		with open(FILE_DATI, 'rb') as f:
+		with open(percorso_pickle, 'rb') as f:
 			dati = pickle.load(f)
-			# Incrementa lanci all'avvio
-			dati['launches'] = dati.get('launches', 0) + 1
-			# Assicura che tutte le chiavi esistano (per compatibilità con vecchi save)
-			dati.setdefault('mani_giocate', 0)
-			dati.setdefault('data_ultimo_fallimento', None)
-			dati.setdefault('record_mani_senza_fallimenti', 0)
-			dati.setdefault('mani_dall_ultimo_fallimento', 0)
-			dati.setdefault('fiches_guadagnate', 0)
-			dati.setdefault('fiches_perdute', 0)
-			dati.setdefault('fiches_attuali', 200) # Default se non presente
-			dati.setdefault('fallimenti', 0)
-			dati.setdefault('killer_hand_count', 0)
-			dati.setdefault('punteggi', {
-				"Carta alta": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Coppia non pagata": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Coppia pagata": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Doppia coppia": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Tris": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Colore": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Full": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Poker": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Super Poker": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala a colore": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala Reale": {'conteggio': 0, 'ultima_realizzazione': None}
-			})
-			dati.setdefault('vincita_massima', 0)
-			dati.setdefault('data_vincita_massima', None)
-			dati.setdefault('perdita_massima', 0)
-			dati.setdefault('data_perdita_massima', None)
-			dati.setdefault('data_ultima_giocata', None)
-			# Aggiusta la struttura punteggi se mancano chiavi (es. Super Poker)
-			punteggi_default = {
-				"Carta alta": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Coppia non pagata": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Coppia pagata": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Doppia coppia": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Tris": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Colore": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Full": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Poker": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Super Poker": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala a colore": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala Reale": {'conteggio': 0, 'ultima_realizzazione': None}
-			}
-			for key, value in punteggi_default.items():
-				dati['punteggi'].setdefault(key, value)
-
 	except FileNotFoundError:
-		# Se il file non esiste, crea la struttura dati da zero
-		dati = {
-			'launches': 1,
-			'mani_giocate': 0,
-			'data_ultimo_fallimento': None,
-			'record_mani_senza_fallimenti': 0,
-			'mani_dall_ultimo_fallimento': 0,
-			'fiches_guadagnate': 0,
-			'fiches_perdute': 0,
-			'fiches_attuali': 200,
-			'fallimenti': 0,
-			'killer_hand_count': 0,
-			'punteggi': {
-				"Carta alta": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Coppia non pagata": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Coppia pagata": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Doppia coppia": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Tris": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Colore": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Full": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Poker": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Super Poker": {'conteggio': 0, 'ultima_realizzazione': None}, # 5 carte uguali
-				"Scala a colore": {'conteggio': 0, 'ultima_realizzazione': None},
-				"Scala Reale": {'conteggio': 0, 'ultima_realizzazione': None}
-			},
-			'vincita_massima': 0,
-			'data_vincita_massima': None,
-			'perdita_massima': 0,
-			'data_perdita_massima': None,
-			'data_ultima_giocata': None
-		}
+		return None
+	migra_dati(dati)
+	scrivi_stato(percorso, codifica_stato(dati))
+	os.replace(percorso_pickle, percorso_pickle + '.migrato')
+	print(f"Salvataggio {percorso_pickle} convertito in {percorso}.")
+	return dati
+
+@strumentato('carica_dati')
+def carica_dati(percorso=FILE_DATI, percorso_diario=FILE_DIARIO, percorso_pickle=FILE_DATI_PICKLE):
+	# percorso_diario=None: nessun diario da riapplicare (es. giocatori del server)
+	try:
+		dati = leggi_stato(percorso)
+	except ValueError as e:
+		# Principale e precedente entrambi illeggibili: si riparte, ma il file resta per un recupero manuale
+		print(f"Salvataggio non leggibile ({e}): riparto da zero.")
+		if os.path.exists(percorso):
+			os.replace(percorso, percorso + '.danneggiato')
+		dati = None
+	if dati is None and percorso_pickle:
+		dati = migra_pickle(percorso_pickle, percorso)
+	if dati is None:
+		dati = {} # Nuovo giocatore: la migrazione crea tutta la struttura
+	migra_dati(dati)
+	dati['launches'] += 1 # Incrementa lanci all'avvio
+	# Riapplica le mani registrate nel diario dopo l'ultimo snapshot (es. dopo un crash)
+	recuperate = ripristina_da_diario(dati, percorso_diario) if percorso_diario else 0
+	if recuperate:
+		print(f"Recuperate {recuperate} mani dal diario.")
 	# Logica di refill se le fiches sono esaurite al caricamento
 	if dati.get('fiches_attuali', 0) <= 0:
-		print("Le fiches erano esaurite. Ricevi 200 fiches per ricominciare.")
-		dati['fiches_attuali'] = 200
+		print(f"Le fiches erano esaurite. Ricevi {FICHES_INIZIALI} fiches per ricominciare.")
+		dati['fiches_attuali'] = FICHES_INIZIALI
 		# NON si diminuiscono le perdite totali -> rimossa dati['fiches_perdute'] -= 200
 		dati['fallimenti'] = dati.get('fallimenti', 0) + 1
 		dati['mani_dall_ultimo_fallimento'] = 0
@@ -119,33 +111,40 @@ def carica_dati():
 		dati['killer_hand_count'] = 0
 		# Aggiorna la data dell'ultimo fallimento se non è già impostata per questa sessione
 		# (potrebbe essere già fallito e aver chiuso senza salvare)
-		dati['data_ultimo_fallimento'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+		dati['data_ultimo_fallimento'] = adesso()
 	return dati
 
-def salva_dati(dati):
+@strumentato('salva_dati')
+def salva_dati(dati, percorso=FILE_DATI):
+	# Temporaneo, fsync e rinomina (stato.scrivi_stato): un crash non tronca lo snapshot
 	try:
-		with open(FILE_DATI, 'wb') as f:
-			pickle.dump(dati, f)
+		scrivi_stato(percorso, codifica_stato(dati))
+		return True
 	except IOError as e:
 		print(f"Errore durante il salvataggio dei dati: {e}")
+		return False
 
-def formatta_tempo_trascorso(data_evento_str):
-	if not data_evento_str:
+def formatta_tempo_trascorso(data_evento_epoca):
+	# Le date sono secondi epoch e diventano testo solo qui, quando vengono mostrate
+	if not data_evento_epoca:
 		return "Mai"
 	try:
 		ora = datetime.now()
-		data_evento = datetime.strptime(data_evento_str, "%Y-%m-%d %H:%M:%S")
-		diff = relativedelta(ora, data_evento)
+		data_evento = datetime.fromtimestamp(a_epoca(data_evento_epoca))
 		parts = []
-		# Aggiunge anni se presenti
-		if diff.years > 0:
-			parts.append(f"{diff.years} ann{'i' if diff.years > 1 else 'o'}")
-		# Aggiunge mesi se presenti
-		if diff.months > 0:
-			parts.append(f"{diff.months} mes{'i' if diff.months > 1 else 'e'}")
-		# Aggiunge giorni se presenti (indipendentemente da anni/mesi)
-		if diff.days > 0:
-			parts.append(f"{diff.days} giorn{'i' if diff.days > 1 else 'o'}")
+		if (ora - data_evento).days >= 1:
+			# dateutil serve solo per anni/mesi/giorni: importato alla prima data lontana
+			from dateutil.relativedelta import relativedelta
+			diff = relativedelta(ora, data_evento)
+			# Aggiunge anni se presenti
+			if diff.years > 0:
+				parts.append(f"{diff.years} ann{'i' if diff.years > 1 else 'o'}")
+			# Aggiunge mesi se presenti
+			if diff.months > 0:
+				parts.append(f"{diff.months} mes{'i' if diff.months > 1 else 'e'}")
+			# Aggiunge giorni se presenti (indipendentemente da anni/mesi)
+			if diff.days > 0:
+				parts.append(f"{diff.days} giorn{'i' if diff.days > 1 else 'o'}")
 
 		# Gestisce il caso in cui l'evento sia avvenuto oggi o ieri
 		if not parts:
@@ -167,12 +166,13 @@ def formatta_tempo_trascorso(data_evento_str):
 				return "Data non gestita"
 		# Se ci sono parti (anni/mesi/giorni), costruisce la stringa
 		return ", ".join(parts) + " fa"
-	except ValueError:
+	except (TypeError, ValueError, OverflowError, OSError):
 		return "Data non valida"
 	except Exception as e: # Cattura altri possibili errori
 		print(f"Errore in formatta_tempo_trascorso: {e}")
 		return "Errore data"
-def mostra_report(dati):
+@strumentato('mostra_report')
+def mostra_report(dati, percorso_storico=None):
 	print("\n== Report Statistiche ==")
 	print(f"Lanci dell'applicazione: {dati.get('launches', 'N/A')}")
 	print(f"Mani giocate totali: {dati['mani_giocate']}")
@@ -192,23 +192,17 @@ def mostra_report(dati):
 		print(f"Ultima giocata: {formatta_tempo_trascorso(dati['data_ultima_giocata'])}")
 	mani_totali = dati['mani_giocate']
 	if mani_totali > 0:
-		# Elenca i nomi dei punteggi considerati "vincenti" (che pagano almeno la puntata)
-		punteggi_vincenti_keys = [
-			"Coppia pagata", "Doppia coppia", "Tris", "Scala",
-			"Colore", "Full", "Poker", "Super Poker",
-			"Scala a colore", "Scala Reale"
-		]
-		# Somma i conteggi per questi punteggi
-		mani_vincenti_conteggio = sum(dati['punteggi'].get(key, {}).get('conteggio', 0) for key in punteggi_vincenti_keys)
+		# Mani che pagano almeno la puntata, contate mano per mano da applica_mano
+		mani_vincenti_conteggio = dati['mani_pagate']
 		# Calcola la percentuale
 		percentuale_vincenti = (mani_vincenti_conteggio / mani_totali) * 100
 		print(f"Percentuale mani pagate (Coppia Pagata+): {percentuale_vincenti:.2f}% ({mani_vincenti_conteggio} su {mani_totali})")
 	else:
 		print("Percentuale mani pagate (Coppia Pagata+): N/A (nessuna mano giocata)")
 	print("\n== Tabella dei Punteggi Realizzati ==")
-	# Ordina per una qualche logica, es. per vincita decrescente o per nome
-	punteggi_ordinati = sorted(dati['punteggi'].items(), key=lambda item: calcola_vincita(item[0], 1), reverse=True)
-	for punteggio, info in punteggi_ordinati:
+	# Per vincita decrescente (ordine precalcolato in regole)
+	for punteggio in PUNTEGGI_PER_VINCITA:
+		info = dati['punteggi'][punteggio]
 		conteggio = info['conteggio']
 		if conteggio > 0:
 			tempo_trascorso = formatta_tempo_trascorso(info['ultima_realizzazione'])
@@ -216,114 +210,73 @@ def mostra_report(dati):
 		else:
 			print(f"- {punteggio}: Mai realizzato")
 	print("==========================")
+	# Le stesse grandezze ricalcolate dai record dello storico mani, se presente
+	if percorso_storico and os.path.exists(percorso_storico):
+		mostra_riepilogo_storico(percorso_storico)
 
-def valuta_mano(mano: list): # Accetta list[Mazzo.Carta]
+def valuta_mano(mano: list): # Accetta list[int], codici carta della Scarpa
 	if not mano or len(mano) != CARTE_PER_MANO:
 		return "Mano non valida" # Controllo di sicurezza
-	# Estrai valori e semi usando la nuova struttura Carta
-	# Gestisce Asso come 14 per confronti e 1 per scale A-5
-	valori_numerici = sorted([c.valore if c.valore != 1 else VALORE_ASSO for c in mano], reverse=True)
-	valori_numerici_per_scala = sorted(list(set(
-		[c.valore for c in mano if c.valore != 1] + \
-		([1] if any(c.valore == 1 for c in mano) else []) + \
-		([VALORE_ASSO] if any(c.valore == 1 for c in mano) else [])
-	)))
-	semi = [c.seme_nome for c in mano]
-	# Usa Counter per efficienza e leggibilità
-	conta_valori = Counter(valori_numerici) # Conta gli Assi come 14 qui
-	conta_semi = Counter(semi)
-	conteggi = sorted(conta_valori.values(), reverse=True)
-	# Verifica Scala
-	is_scala = False
-	if len(valori_numerici_per_scala) >= 5:
-		for i in range(len(valori_numerici_per_scala) - 4):
-			# Controlla sequenza di 5 consecutivi
-			if all(valori_numerici_per_scala[i+j] == valori_numerici_per_scala[i] + j for j in range(5)):
-				is_scala = True
-				# Controlla se è Scala Reale (10, J, Q, K, A)
-				# L'asso è 14 in valori_numerici, quindi cerchiamo 10, 11, 12, 13, 14
-				if set(valori_numerici_per_scala[i:i+5]) == {10, VALORE_JACK, VALORE_REGINA, VALORE_RE, VALORE_ASSO}:
-					is_scala_reale_potenziale = True
-				else:
-					is_scala_reale_potenziale = False
-				break # Trovata la scala più alta possibile
-	# Verifica Colore
-	is_colore = len(conta_semi) == 1 # Se c'è un solo seme, è colore
+	# Lookup nelle tabelle precalcolate di valutatore
+	return valuta_codici(mano)
 
-	# Valutazione gerarchica
-	if is_scala and is_colore:
-		if is_scala_reale_potenziale:
-			return "Scala Reale"
-		else:
-			return "Scala a colore"
-	# Super Poker (5 carte uguali - possibile con 10 mazzi)
-	if conteggi[0] >= 5:
-		return "Super Poker"
-	if conteggi[0] == 4:
-		return "Poker"
-	if conteggi == [3, 2]:
-		return "Full"
-	if is_colore:
-		return "Colore"
-	if is_scala:
-		return "Scala"
-	if conteggi[0] == 3:
-		return "Tris"
-	if conteggi == [2, 2, 1]:
-		return "Doppia coppia"
-	if conteggi[0] == 2:
-		# Trova il valore della coppia
-		valore_coppia = [v for v, count in conta_valori.items() if count == 2][0]
-		# Coppia pagata se Jack (11), Regina (12), Re (13), Asso (14)
-		if valore_coppia >= VALORE_JACK:
-			return "Coppia pagata"
-		else:
-			return "Coppia non pagata"
-	return "Carta alta"
+def mostra_consiglio_tenuta(mano_ordinata, composizione):
+	# Importato solo alla prima richiesta: le sue tabelle rallenterebbero l'avvio
+	from risolutore import maschera_in_cifre, migliori_tenute
+	# Valore atteso esatto delle tenute sulla composizione residua della scarpa
+	print("\n--- Consiglio Tenuta ---")
+	for posizione, (maschera, valore) in enumerate(migliori_tenute(mano_ordinata, composizione)):
+		cifre = maschera_in_cifre(maschera) or "nessuna (cambia tutte)"
+		print(f"{posizione+1}. Tieni {cifre}: rende in media {valore:.3f} volte la puntata")
+	print("------------------------")
 
-def calcola_vincita(punteggio, puntata):
-	# Tabella vincite (multipli della puntata, 0 significa perdita della puntata)
-	# Es: Coppia pagata -> 1*puntata restituita (quindi vincita netta 0)
-	# Es: Doppia coppia -> 2*puntata restituita (quindi vincita netta = puntata)
-	tabella_vincite = {
-		"Carta alta": 0,
-		"Coppia non pagata": 0,
-		"Coppia pagata": 1, # Pareggio
-		"Doppia coppia": 2,
-		"Tris": 3,
-		"Scala": 4,
-		"Colore": 6,
-		"Full": 9,
-		"Poker": 25,
-		"Super Poker": 40, # Vincita per 5 carte uguali
-		"Scala a colore": 55, # Era 50, aumentato leggermente
-		"Scala Reale": 250
-	}
-	moltiplicatore = tabella_vincite.get(punteggio, 0)
-	return puntata * moltiplicatore # Ritorna l'importo totale restituito
+def carica_strumenti():
+	# strumentazione.STRUMENTI, importata solo quando serve (variabile d'ambiente o comando !)
+	from strumentazione import STRUMENTI
+	return STRUMENTI
+
+def apri_registro(seed, fiches, mani_vita, killer_hand_count):
+	# Seed, puntate e tenute per la riproduzione: registro_sessioni si importa alla prima mano
+	from registro_sessioni import RegistroSessioni
+	registro = RegistroSessioni()
+	try:
+		registro.inizia(seed, fiches, mani_vita, killer_hand_count)
+	except struct.error:
+		print("Attenzione: importi troppo grandi per il registro sessioni, sessione non registrata.")
+	return registro
 
 def poker_machine():
+	strumenti = carica_strumenti() if attiva_da_ambiente() else None
 	dati = carica_dati()
 	fiches = dati['fiches_attuali']
-	# Crea il mazzo multi-confezione
+	# Crea la scarpa multi-confezione (mescolata durante la pesca)
 	print(f"Creo un mazzo con {NUM_MAZZI} confezioni (totale {52*NUM_MAZZI} carte).")
-	mazzo = Mazzo(tipo_francese=True, num_mazzi=NUM_MAZZI)
-	print("Mescolo il mazzo...")
-	mazzo.mescola_mazzo()
+	seed = nuovo_seed() # Registrato con puntate e tenute: la sessione si puo' rigiocare
+	scarpa = Scarpa(NUM_MAZZI, seed=seed)
 	mostra_report(dati)
 	print("\n== Benvenuto alla Poker Machine! ==")
 	print(f"\tVersione {VERSIONE}")
 	print(f"\tLancio App #{dati['launches']}.")
 	numero_mano_sessione = 1 # Contatore mani in questa sessione
 	killer_hand_count = dati['killer_hand_count'] # Contatore KH dall'ultimo fallimento
+	diario = Diario() # Una riga per mano; lo snapshot completo solo periodicamente
+	storico = Storico() # Record da 16 byte per mano, per audit e analisi
+	registro = None # Aperto alla prima mano (apri_registro) con lo stato di inizio sessione
+	inizio_registro = (seed, fiches, dati['mani_dall_ultimo_fallimento'], killer_hand_count)
 	saldo_iniziale_sessione = fiches
+	aggregati_sessione = nuovi_aggregati() # Statistiche di questa sessione, aggiornate mano per mano
 	while fiches > 0:
+		# Strumentazione: letta una volta per mano, da spenta costa un test per fase
+		misura = strumenti is not None and strumenti.attiva
+		if misura:
+			strumenti.riparti()
 		# Determina se è una Killer Hand
 		mani_totali_senza_fallimenti = dati['mani_dall_ultimo_fallimento'] + 1
-		is_mano_speciale = (mani_totali_senza_fallimenti % KILLER_HAND_FREQUENZA == 0)
+		is_mano_speciale = is_killer_hand(mani_totali_senza_fallimenti)
+		penalita_attuale = 0
 		if is_mano_speciale:
 			killer_hand_count += 1
-			penalita_attuale = min(killer_hand_count * 10, MAX_PENALITA_KH)
+			penalita_attuale = penalita_killer_hand(killer_hand_count)
 			print(f"\n*** KILLER HAND #{killer_hand_count} (Mano {mani_totali_senza_fallimenti}) ***")
 			print(f"Se perdi questa mano, perdi un extra {penalita_attuale}% delle tue fiches!")
 			print("Se vinci con un punteggio pagato, la vincita (netta) viene TRIPLICATA!")
@@ -334,22 +287,27 @@ def poker_machine():
 		while not puntata_valida:
 			record_mani = dati['record_mani_senza_fallimenti']
 			prompt_puntata = f"\nMani: #{numero_mano_sessione}/{mani_totali_senza_fallimenti}/{record_mani} | F: {fiches}> "
+			if misura:
+				strumenti.segna('gioco')
 			raw_puntata = input(prompt_puntata)
+			if misura:
+				strumenti.segna('input')
 			# --- NUOVA GESTIONE HELP '?' ---
 			if raw_puntata == '?':
-				puntata_min_calcolata = max(int(fiches * PERCENTUALE_MINIMA_PUNTATA), 1)
 				print("\n--- Aiuto Puntate ---")
-				print("Inserisci l'importo da puntare o usa gli shortcut:")
-				print(f"  m : Puntata minima ({PERCENTUALE_MINIMA_PUNTATA*100:.0f}%, attuale: {puntata_min_calcolata})")
-				print("  - : 10% delle fiches")
-				print("  , : 25% delle fiches")
-				print("  . : 50% delle fiches")
-				print("  ; : 75% delle fiches")
-				print("  + : 100% delle fiches (All-in)")
-				print("INVIO: Esci dal gioco")
+				print("\n".join(aiuto_puntata(fiches)))
+				print(AIUTO_STRUMENTI)
 				print("--------------------")
 				continue # Richiedi nuovamente l'input
 			# --- FINE GESTIONE HELP ---
+			if raw_puntata.startswith('!'): # Comandi di strumentazione e profilo
+				if strumenti is None:
+					strumenti = carica_strumenti()
+				print("\n".join(strumenti.comando(raw_puntata[1:])))
+				misura = strumenti.attiva
+				if misura:
+					strumenti.riparti()
+				continue
 			if raw_puntata == "": # Uscita volontaria
 				print("\nUscita dal gioco.")
 				bilancio_sessione = fiches - saldo_iniziale_sessione
@@ -360,77 +318,69 @@ def poker_machine():
 				print(f"Hai iniziato la sessione con {saldo_iniziale_sessione} fiches.")
 				print(f"Concludi con {fiches} fiches (Bilancio: {bilancio_sessione:+} | Variazione: {percentuale_variazione:+.1f}%).")
 				dati['fiches_attuali'] = fiches
-				dati['data_ultima_giocata'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+				dati['data_ultima_giocata'] = adesso()
 				dati['killer_hand_count'] = killer_hand_count
-				salva_dati(dati)
-				mostra_report(dati)
+				diario.compatta(dati, salva_dati)
+				storico.chiudi()
+				if registro is not None:
+					registro.chiudi()
+				mostra_report(dati, FILE_STORICO)
+				mostra_report_esteso(dati, aggregati_sessione)
+				if strumenti is not None:
+					strumenti.chiudi()
 				return # Termina la funzione poker_machine
-			# Gestione shortcut
-			shortcut_map = {'-': 0.10, ',': 0.25, '.': 0.50, ';': 0.75, '+': 1.0}
-			# --- NUOVO SHORTCUT 'm' ---
-			if raw_puntata == 'm':
-				puntata = max(int(fiches * PERCENTUALE_MINIMA_PUNTATA), 1)
-				# Non impostare puntata_valida = True qui, lascia che la validazione sotto controlli
-			# --- FINE SHORTCUT 'm' ---
-			elif raw_puntata in shortcut_map:
-				puntata = int(fiches * shortcut_map[raw_puntata])
-			elif raw_puntata.isdigit():
-				puntata = int(raw_puntata)
-			else:
+			# Shortcut ('m' = puntata minima) o importo, poi validazione (regole condivise col server)
+			puntata_richiesta = interpreta_puntata(raw_puntata, fiches)
+			if puntata_richiesta is None:
 				print("Input non valido. Inserisci un numero, uno shortcut (m, -, ,, ., ;, +), '?' per aiuto o INVIO per uscire.")
 				continue # Richiedi input di nuovo
-			# Validazione puntata
-			puntata_minima = max(int(fiches * PERCENTUALE_MINIMA_PUNTATA), 1)
-			if puntata < 1:
-				print("La puntata deve essere almeno 1.")
-			elif puntata > fiches:
-				print("Non hai abbastanza fiches per questa puntata.")
-			elif puntata < puntata_minima and fiches > 1: # Non forzare se hai solo 1 fiche
-				print(f"La puntata minima è {puntata_minima} ({PERCENTUALE_MINIMA_PUNTATA*100:.0f}%). Correggo.")
-				puntata = puntata_minima
-				puntata_valida = True
-			else:
+			puntata_accettata, messaggio = valida_puntata(puntata_richiesta, fiches)
+			if messaggio:
+				print(messaggio)
+			if puntata_accettata is not None:
+				puntata = puntata_accettata
 				puntata_valida = True
 		print(f"Puntata: {puntata}")
+		if misura:
+			strumenti.segna('puntata')
+		fiches_prima_della_mano = fiches
 		fiches -= puntata # Sottrai subito la puntata
 		# --- Distribuzione e Cambio Carte ---
+		if scarpa.rimescola_se_necessario():
+			print("Le carte stanno finendo: ricostruisco e rimescolo il mazzo.")
 		print("Distribuisco le carte...")
-		mano = mazzo.pesca(CARTE_PER_MANO)
+		mano = scarpa.pesca(CARTE_PER_MANO)
 		if len(mano) < CARTE_PER_MANO:
 			print("ERRORE CRITICO: Non è stato possibile pescare 5 carte nonostante il controllo!")
 			dati['fiches_attuali'] = fiches + puntata # Restituisce la puntata
-			salva_dati(dati)
+			diario.compatta(dati, salva_dati)
 			return
 		# Ordina la mano per la visualizzazione e il prompt
-		mano_ordinata = sorted(mano, key=lambda c: (c.seme_id, c.valore if c.valore != 1 else VALORE_ASSO))
+		mano_ordinata = sorted(mano, key=chiave_ordinamento)
 		print("La tua mano:")
 		mano_str_display = []
 		for idx, carta in enumerate(mano_ordinata):
-			mano_str_display.append(f"{idx+1}. {carta.nome}.")
+			mano_str_display.append(f"{idx+1}. {nome_carta(carta)}.")
 		print("\n".join(mano_str_display))
-		mano_breve_prompt = " ".join([c.desc_breve for c in mano_ordinata])
+		mano_breve_prompt = " ".join([desc_breve(c) for c in mano_ordinata])
+		if misura:
+			strumenti.segna('pesca')
 		# Chiedi quali carte tenere
 		while True:
 			prompt_testo = f"{mano_breve_prompt} - Quali tieni? "
 			mantenere_input = input(prompt_testo)
-			indici_mantenere_validi = True
-			indici_mantenere = set()
-			if mantenere_input == "": # Cambia tutte
+			if misura:
+				strumenti.segna('input')
+			if mantenere_input == "?": # Consiglio dal risolutore
+				mostra_consiglio_tenuta(mano_ordinata, scarpa.composizione)
+				continue
+			indici_mantenere, messaggio = interpreta_tenuta(mantenere_input) # "" = cambia tutte
+			if messaggio:
+				print(messaggio)
+			if indici_mantenere is not None:
 				break
-			if not mantenere_input.isdigit():
-				print("Input non valido. Inserisci solo i numeri delle carte da tenere (es. 125).")
-				indici_mantenere_validi = False
-			else:
-				for char_idx in mantenere_input:
-					idx = int(char_idx)
-					if 1 <= idx <= CARTE_PER_MANO:
-						indici_mantenere.add(idx - 1)
-					else:
-						print(f"Numero carta non valido: {idx}. Inserisci numeri da 1 a {CARTE_PER_MANO}.")
-						indici_mantenere_validi = False
-						break
-				if indici_mantenere_validi:
-					break
+		if misura:
+			strumenti.segna('tenuta')
 		# Ricostruzione basata su mano_ordinata e indici selezionati
 		carte_da_mantenere = []
 		carte_da_sostituire = []
@@ -442,12 +392,12 @@ def poker_machine():
 		num_da_sostituire = len(carte_da_sostituire)
 		if num_da_sostituire > 0:
 			print(f"Scarto {num_da_sostituire} carte.")
-			mazzo.scarta_carte(carte_da_sostituire)
-			nuove_carte = mazzo.pesca(num_da_sostituire)
+			scarpa.scarta(carte_da_sostituire)
+			nuove_carte = scarpa.pesca(num_da_sostituire)
 			if len(nuove_carte) < num_da_sostituire:
 				print("ERRORE CRITICO: Non è stato possibile pescare le carte sostitutive!")
 				dati['fiches_attuali'] = fiches + puntata
-				salva_dati(dati)
+				diario.compatta(dati, salva_dati)
 				return
 			mano = carte_da_mantenere + nuove_carte
 		else:
@@ -455,64 +405,71 @@ def poker_machine():
 			mano = mano_ordinata
 		# --- Valutazione Mano Finale ---
 		print("\nMano finale:")
-		mano_finale_str = [f"--- {carta.nome}." for carta in mano]
+		mano_finale_str = [f"--- {nome_carta(carta)}." for carta in mano]
 		print("\n".join(mano_finale_str))
+		if misura:
+			strumenti.segna('cambio')
 		punteggio = valuta_mano(mano)
-		importo_restituito = calcola_vincita(punteggio, puntata)
-		vincita_netta = importo_restituito - puntata
+		esito = regola_mano(punteggio, puntata, fiches, is_mano_speciale, penalita_attuale)
+		if misura:
+			strumenti.segna('valutazione')
 		print(f"\nRisultato: {punteggio}!")
 		# Gestione Vincita/Perdita Normale e Killer Hand
-		if vincita_netta >= 0:
-			fiches_vinte = vincita_netta
-			print(f"Vinci {fiches_vinte} fiches (restituite {importo_restituito}).")
-			if is_mano_speciale and fiches_vinte > 0:
-				bonus_kh = fiches_vinte * 2
-				print(f"*** Bonus Killer Hand! Vinci {bonus_kh} fiches extra! ***")
-				fiches_vinte += bonus_kh
-			fiches += importo_restituito
-			dati['fiches_guadagnate'] += fiches_vinte
-			if fiches_vinte > dati['vincita_massima']:
-				dati['vincita_massima'] = fiches_vinte
-				dati['data_vincita_massima'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-				print("--> Nuovo Record Vincita Massima in una mano!")
+		if esito.perdita_totale == 0:
+			print(f"Vinci {esito.fiches_vinte - esito.bonus_kh} fiches (restituite {esito.importo_restituito}).")
+			if esito.bonus_kh:
+				print(f"*** Bonus Killer Hand! Vinci {esito.bonus_kh} fiches extra! ***")
 		else:
 			print(f"Perdi la puntata di {puntata} fiches.")
-			perdita_totale_mano = puntata
 			if is_mano_speciale:
-				penalita_kh_importo = int(fiches * (penalita_attuale / 100))
-				penalita_kh_importo = min(penalita_kh_importo, fiches)
-				print(f"*** Penalità Killer Hand! Perdi un extra {penalita_attuale}% ({penalita_kh_importo} fiches)! ***")
-				fiches -= penalita_kh_importo
-				perdita_totale_mano += penalita_kh_importo
-			dati['fiches_perdute'] += perdita_totale_mano
-			if perdita_totale_mano > dati['perdita_massima']:
-				dati['perdita_massima'] = perdita_totale_mano
-				dati['data_perdita_massima'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-				print("--> Nuovo Record Perdita Massima in una mano!")
-		# --- Aggiornamento Statistiche ---
-		dati['fiches_attuali'] = fiches
-		dati['mani_giocate'] += 1
-		dati['mani_dall_ultimo_fallimento'] += 1
-		if fiches > 0 and dati['mani_dall_ultimo_fallimento'] > dati['record_mani_senza_fallimenti']:
-			dati['record_mani_senza_fallimenti'] = dati['mani_dall_ultimo_fallimento']
-		if punteggio != "Mano non valida":
-			dati['punteggi'][punteggio]['conteggio'] += 1
-			dati['punteggi'][punteggio]['ultima_realizzazione'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+				print(f"*** Penalità Killer Hand! Perdi un extra {penalita_attuale}% ({esito.penalita_kh} fiches)! ***")
+		fiches = esito.fiches
+		game_over = fiches <= 0
+		mani_vita = dati['mani_dall_ultimo_fallimento'] + 1
+		# --- Aggiornamento Statistiche (stessa funzione usata nel ripristino dal diario) ---
+		record = nuovo_record(dati['seq_diario'] + 1, adesso(), puntata,
+			list(mano), punteggio, esito, killer_hand_count, is_mano_speciale, game_over)
+		nuova_vincita_massima, nuova_perdita_massima = applica_mano(dati, record)
+		aggiorna_aggregati(aggregati_sessione, record)
+		if nuova_vincita_massima:
+			print("--> Nuovo Record Vincita Massima in una mano!")
+		if nuova_perdita_massima:
+			print("--> Nuovo Record Perdita Massima in una mano!")
+		compattare = diario.registra(record)
+		maschera_tenuta = sum(1 << i for i in indici_mantenere)
+		try:
+			storico.aggiungi(mano_ordinata, maschera_tenuta, record['c'],
+				puntata, is_mano_speciale, fiches - fiches_prima_della_mano)
+		except struct.error:
+			print("Attenzione: importi troppo grandi per lo storico mani, mano non archiviata.")
+		if registro is None:
+			registro = apri_registro(*inizio_registro)
+		try:
+			registro.aggiungi(maschera_tenuta, puntata)
+		except struct.error:
+			print("Attenzione: importi troppo grandi per il registro sessioni, la registrazione si ferma qui.")
 		numero_mano_sessione += 1
+		if misura:
+			strumenti.segna('registrazione')
+			strumenti.fine_mano()
 		# --- Controllo Game Over ---
-		if fiches <= 0:
+		if game_over:
 			print("\n**************** GAME OVER ****************")
 			print("Hai esaurito le fiches!")
-			if dati['mani_dall_ultimo_fallimento'] == dati['record_mani_senza_fallimenti']:
+			if mani_vita == dati['record_mani_senza_fallimenti']:
 				print(f"Hai stabilito il tuo nuovo record di {dati['record_mani_senza_fallimenti']} mani senza fallimenti!")
-			dati['fallimenti'] += 1
-			dati['data_ultimo_fallimento'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-			dati['mani_dall_ultimo_fallimento'] = 0
-			dati['killer_hand_count'] = 0
-			dati['data_ultima_giocata'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-			salva_dati(dati)
-			mostra_report(dati)
+			diario.compatta(dati, salva_dati)
+			storico.chiudi()
+			if registro is not None:
+				registro.chiudi()
+			mostra_report(dati, FILE_STORICO)
+			mostra_report_esteso(dati, aggregati_sessione)
+			if strumenti is not None:
+				strumenti.chiudi()
 			return
-		salva_dati(dati) # Salva dopo ogni mano completata
+		if compattare: # Snapshot periodico; tra uno snapshot e l'altro basta il diario
+			diario.compatta(dati, salva_dati)
+			if misura:
+				strumenti.segna('salvataggio')
 if __name__ == "__main__":
 	poker_machine()
\ No newline at end of file
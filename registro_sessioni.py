@@ -0,0 +1,384 @@
+# REGISTRO_SESSIONI - Registro compatto delle sessioni e riproduzione deterministica
+# Una sessione e' determinata dal seed della Scarpa, dallo stato della vita al
+# primo lancio (fiches, mani dall'ultimo fallimento, KH giocate) e, mano per mano,
+# dalla puntata e dalla maschera di tenuta: le carte si ricavano rigiocando la
+# Scarpa con lo stesso seed, senza input() ne' stampe. Cosi' una mano contestata
+# si rivede carta per carta e un archivio di sessioni si rivaluta con un altro
+# valutatore o un'altra tabella vincite (le carte restano le stesse).
+# Layout (little endian), record consecutivi in append:
+#   inizio sessione '<BBHHQqqqq': INIZIO_SESSIONE, versione, mazzi, soglia di
+#                   rimescolamento, seed, data (epoch), fiches, mani vita, KH
+#   mano            '<BI': maschera (bit i = carta i di mano_ordinata), puntata
+#   mano            '<BQ': maschera | PUNTATA_ESTESA, puntate oltre 32 bit
+# Un record finale incompleto (crash) e' ignorato.
+# Uso: python registro_sessioni.py rigioca [file] [--sessione N] [--dettaglio]
+#      python registro_sessioni.py confronta file ... [--valore "Scala a colore=50,60"] [--valutatore modulo:funzione]
+
+import os
+import struct
+import time
+from collections import namedtuple
+
+from regole import (
+	CARTE_PER_MANO, CONFIGURAZIONE_PREDEFINITA, NUM_MAZZI, SOGLIA_RIMESCOLAMENTO_TOTALE,
+	penalita_killer_hand, regola_mano
+)
+from scarpa import Scarpa, chiave_ordinamento, desc_breve
+from statistiche import adesso
+from valutatore import CATEGORIE, NUM_CODICI, valuta_indice
+
+FILE_SESSIONI = 'pokermachine_sessioni.bin'
+VERSIONE_REGISTRO = 1
+INIZIO_SESSIONE = 0xFF
+PUNTATA_ESTESA = 0x80
+TUTTE = (1 << CARTE_PER_MANO) - 1
+INTESTAZIONE = struct.Struct('<BBHHQqqqq')
+MANO = struct.Struct('<BI')
+MANO_ESTESA = struct.Struct('<BQ')
+
+InizioSessione = namedtuple("InizioSessione", "versione num_mazzi soglia seed data fiches mani_vita killer_hand_count")
+SessioneRegistrata = namedtuple("SessioneRegistrata", "inizio maschere puntate")
+
+# --- Scrittura ---
+def codifica_inizio(seed, fiches, mani_vita, killer_hand_count, num_mazzi=NUM_MAZZI,
+		soglia=SOGLIA_RIMESCOLAMENTO_TOTALE, data=None):
+	return INTESTAZIONE.pack(INIZIO_SESSIONE, VERSIONE_REGISTRO, num_mazzi, soglia, seed,
+		adesso() if data is None else data, fiches, mani_vita, killer_hand_count)
+
+def codifica_mano(maschera, puntata):
+	if puntata < 1 << 32:
+		return MANO.pack(maschera, puntata)
+	return MANO_ESTESA.pack(maschera | PUNTATA_ESTESA, puntata)
+
+class RegistroSessioni:
+	# Scrittura in append come Storico; l'intestazione arriva su disco con la prima
+	# mano, cosi' una sessione chiusa senza giocare non lascia traccia.
+	def __init__(self, percorso=FILE_SESSIONI):
+		self.percorso = percorso
+		self.attivo = False
+		self._file = None
+		self._inizio = b''
+
+	def inizia(self, seed, fiches, mani_vita, killer_hand_count, num_mazzi=NUM_MAZZI, soglia=SOGLIA_RIMESCOLAMENTO_TOTALE):
+		# struct.error (e sessione non registrata) se i valori non entrano nell'intestazione
+		self.attivo = False
+		self._inizio = codifica_inizio(seed, fiches, mani_vita, killer_hand_count, num_mazzi, soglia)
+		self.attivo = True
+
+	def aggiungi(self, maschera, puntata):
+		# Su struct.error la sessione smette di essere registrata: una mano mancante
+		# renderebbe sbagliata la riproduzione di tutte le successive
+		if not self.attivo:
+			return
+		try:
+			record = codifica_mano(maschera, puntata)
+		except struct.error:
+			self.attivo = False
+			raise
+		if self._file is None:
+			self._file = open(self.percorso, 'ab')
+		self._file.write(self._inizio + record)
+		self._inizio = b''
+		self._file.flush()
+
+	def chiudi(self):
+		self.attivo = False
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+# --- Lettura ---
+def decodifica_sessioni(contenuto):
+	# Generatore di SessioneRegistrata; ValueError su record sconosciuti
+	fine = len(contenuto)
+	dimensione_inizio, dimensione_mano, dimensione_estesa = INTESTAZIONE.size, MANO.size, MANO_ESTESA.size
+	leggi_inizio, leggi_mano, leggi_estesa = INTESTAZIONE.unpack_from, MANO.unpack_from, MANO_ESTESA.unpack_from
+	sessione = None
+	posizione = 0
+	while posizione < fine:
+		tipo = contenuto[posizione]
+		if tipo <= TUTTE:
+			if posizione + dimensione_mano > fine:
+				break
+			if sessione is None:
+				raise ValueError(f"Registro sessioni: mano senza inizio sessione al byte {posizione}")
+			maschere.append(tipo)
+			puntate.append(leggi_mano(contenuto, posizione)[1])
+			posizione += dimensione_mano
+		elif tipo == INIZIO_SESSIONE:
+			if posizione + dimensione_inizio > fine:
+				break
+			campi = leggi_inizio(contenuto, posizione)
+			if campi[1] > VERSIONE_REGISTRO:
+				raise ValueError(f"Registro sessioni: versione {campi[1]} non supportata (massima {VERSIONE_REGISTRO})")
+			if sessione is not None:
+				yield sessione
+			sessione = SessioneRegistrata(InizioSessione(*campi[1:]), bytearray(), [])
+			maschere, puntate = sessione.maschere, sessione.puntate
+			posizione += dimensione_inizio
+		elif tipo & ~TUTTE == PUNTATA_ESTESA:
+			if posizione + dimensione_estesa > fine:
+				break
+			if sessione is None:
+				raise ValueError(f"Registro sessioni: mano senza inizio sessione al byte {posizione}")
+			maschere.append(tipo & TUTTE)
+			puntate.append(leggi_estesa(contenuto, posizione)[1])
+			posizione += dimensione_estesa
+		else:
+			raise ValueError(f"Registro sessioni: record sconosciuto {tipo:#04x} al byte {posizione}")
+	if sessione is not None:
+		yield sessione
+
+def leggi_sessioni(percorso=FILE_SESSIONI):
+	with open(percorso, 'rb') as f:
+		contenuto = f.read()
+	return list(decodifica_sessioni(contenuto))
+
+# --- Riproduzione ---
+# Posizione di ogni codice nell'ordine di chiave_ordinamento (un ordine totale):
+# stesso risultato di sorted(..., key=chiave_ordinamento) con una chiamata in C
+_ORDINATI = sorted(range(NUM_CODICI), key=chiave_ordinamento)
+POSIZIONE_ORDINAMENTO = [_ORDINATI.index(codice) for codice in range(NUM_CODICI)]
+# Per maschera: indici delle carte tenute e di quelle scartate
+TENUTE = tuple(tuple(i for i in range(CARTE_PER_MANO) if m >> i & 1) for m in range(TUTTE + 1))
+SCARTATE = tuple(tuple(i for i in range(CARTE_PER_MANO) if not m >> i & 1) for m in range(TUTTE + 1))
+
+def mani_finali(sessione):
+	# Rigioca la Scarpa come poker_machine(): per ogni mano (mano_ordinata, mano finale)
+	inizio = sessione.inizio
+	scarpa = Scarpa(inizio.num_mazzi, seed=inizio.seed)
+	pesca, scarta, ricostruisci = scarpa.pesca, scarpa.scarta, scarpa.ricostruisci
+	soglia = inizio.soglia
+	posizione = POSIZIONE_ORDINAMENTO.__getitem__
+	for maschera in sessione.maschere:
+		if len(scarpa) < soglia:
+			ricostruisci()
+		mano_ordinata = sorted(pesca(CARTE_PER_MANO), key=posizione)
+		if maschera == TUTTE:
+			yield mano_ordinata, mano_ordinata
+			continue
+		scartate = [mano_ordinata[i] for i in SCARTATE[maschera]]
+		scarta(scartate)
+		yield mano_ordinata, [mano_ordinata[i] for i in TENUTE[maschera]] + pesca(len(scartate))
+
+def esiti(sessione, categorie, configurazione=CONFIGURAZIONE_PREDEFINITA):
+	# Regole di `configurazione` sulle categorie (indici in CATEGORIE) delle mani:
+	# per mano giocata (puntata, Killer Hand, EsitoMano). Le puntate registrate si
+	# limitano alle fiches disponibili, che con altre regole possono essere meno;
+	# al fallimento la sessione finisce.
+	inizio = sessione.inizio
+	tabella_vincite = configurazione.tabella_vincite
+	frequenza = configurazione.killer_hand_frequenza
+	massima = configurazione.max_penalita_kh
+	fiches = inizio.fiches
+	mani_vita = inizio.mani_vita
+	killer_hand_count = inizio.killer_hand_count
+	for puntata, categoria in zip(sessione.puntate, categorie):
+		if fiches <= 0:
+			return
+		puntata = min(puntata, fiches)
+		mani_vita += 1
+		is_mano_speciale = mani_vita % frequenza == 0
+		penalita_attuale = 0
+		if is_mano_speciale:
+			killer_hand_count += 1
+			penalita_attuale = penalita_killer_hand(killer_hand_count, massima)
+		esito = regola_mano(CATEGORIE[categoria], puntata, fiches - puntata, is_mano_speciale, penalita_attuale, tabella_vincite)
+		fiches = esito.fiches
+		yield puntata, is_mano_speciale, esito
+
+def nuovo_riepilogo():
+	# Contatori con le stesse chiavi di simulazione.nuovo_risultato dove possibile
+	return {
+		'sessioni': 0,
+		'mani_registrate': 0,
+		'mani_giocate': 0,
+		'mani_cambiate': 0, # categoria diversa dal valutatore attuale
+		'fiches_iniziali': 0,
+		'fiches_finali': 0,
+		'fiches_puntate': 0,
+		'fiches_restituite': 0,
+		'fiches_guadagnate': 0,
+		'fiches_perdute': 0,
+		'vincita_massima': 0,
+		'perdita_massima': 0,
+		'fallimenti': 0,
+		'killer_hand_giocate': 0,
+		'punteggi': [0] * len(CATEGORIE),
+	}
+
+def rigioca(sessione, categorie, configurazione=CONFIGURAZIONE_PREDEFINITA, riepilogo=None):
+	riepilogo = nuovo_riepilogo() if riepilogo is None else riepilogo
+	conteggi = riepilogo['punteggi']
+	fiches = sessione.inizio.fiches
+	mani = puntate = restituite = guadagnate = perdute = killer = 0
+	vincita_massima, perdita_massima = riepilogo['vincita_massima'], riepilogo['perdita_massima']
+	for (puntata, is_mano_speciale, esito), categoria in zip(esiti(sessione, categorie, configurazione), categorie):
+		mani += 1
+		conteggi[categoria] += 1
+		puntate += puntata
+		restituite += esito.importo_restituito
+		killer += is_mano_speciale
+		if esito.perdita_totale:
+			perdute += esito.perdita_totale
+			if esito.perdita_totale > perdita_massima:
+				perdita_massima = esito.perdita_totale
+		else:
+			guadagnate += esito.fiches_vinte
+			if esito.fiches_vinte > vincita_massima:
+				vincita_massima = esito.fiches_vinte
+		fiches = esito.fiches
+	riepilogo['sessioni'] += 1
+	riepilogo['mani_registrate'] += len(sessione.puntate)
+	riepilogo['mani_giocate'] += mani
+	riepilogo['fiches_iniziali'] += sessione.inizio.fiches
+	riepilogo['fiches_finali'] += fiches
+	riepilogo['fiches_puntate'] += puntate
+	riepilogo['fiches_restituite'] += restituite
+	riepilogo['fiches_guadagnate'] += guadagnate
+	riepilogo['fiches_perdute'] += perdute
+	riepilogo['vincita_massima'] = vincita_massima
+	riepilogo['perdita_massima'] = perdita_massima
+	riepilogo['fallimenti'] += fiches <= 0
+	riepilogo['killer_hand_giocate'] += killer
+	return riepilogo
+
+def unisci_riepiloghi(riepiloghi):
+	totale = nuovo_riepilogo()
+	for riepilogo in riepiloghi:
+		for chiave, valore in riepilogo.items():
+			if chiave == 'punteggi':
+				totale[chiave] = [a + b for a, b in zip(totale[chiave], valore)]
+			elif chiave in ('vincita_massima', 'perdita_massima'):
+				totale[chiave] = max(totale[chiave], valore)
+			else:
+				totale[chiave] += valore
+	return totale
+
+def riproduci(sessioni, regole=None):
+	# regole: [(nome, valuta, Configurazione)], valuta come valutatore.valuta_indice;
+	# la prima fa da riferimento per 'mani_cambiate'. Le carte di ogni sessione si
+	# rigiocano una volta sola e le categorie una volta per valutatore.
+	regole = regole or [("attuale", valuta_indice, CONFIGURAZIONE_PREDEFINITA)]
+	riepiloghi = [nuovo_riepilogo() for _ in regole]
+	for sessione in sessioni:
+		finali = [finale for _, finale in mani_finali(sessione)]
+		per_valutatore = {}
+		riferimento = None
+		for (_, valuta, configurazione), riepilogo in zip(regole, riepiloghi):
+			categorie = per_valutatore.get(valuta)
+			if categorie is None:
+				categorie = per_valutatore[valuta] = [valuta(mano) for mano in finali]
+			if riferimento is None:
+				riferimento = categorie
+			elif categorie is not riferimento:
+				riepilogo['mani_cambiate'] += sum(a != b for a, b in zip(categorie, riferimento))
+			rigioca(sessione, categorie, configurazione, riepilogo)
+	return riepiloghi
+
+def _riproduci_lotto(argomenti):
+	sessioni, regole = argomenti
+	return riproduci(sessioni, regole)
+
+def riproduci_file(percorsi, regole=None, num_processi=None):
+	# Con num_processi le sessioni vanno su un pool di processi a lotti alternati,
+	# fusi in ordine (valutatori e configurazioni devono poter essere inviati ai worker)
+	sessioni = [sessione for percorso in percorsi for sessione in leggi_sessioni(percorso)]
+	if num_processi is None or len(sessioni) < 2:
+		return riproduci(sessioni, regole)
+	from concurrent.futures import ProcessPoolExecutor # Solo qui: il gioco importa il modulo all'avvio
+	num_processi = min(num_processi or os.cpu_count() or 1, len(sessioni))
+	lotti = [(sessioni[i::num_processi], regole) for i in range(num_processi)]
+	with ProcessPoolExecutor(max_workers=num_processi) as executor:
+		parziali = list(executor.map(_riproduci_lotto, lotti))
+	return [unisci_riepiloghi(colonna) for colonna in zip(*parziali)]
+
+# --- Interfaccia a riga di comando ---
+def carica_valutatore(testo):
+	# "modulo:funzione" -> funzione (5 codici -> indice in CATEGORIE)
+	from importlib import import_module
+	modulo, _, funzione = testo.partition(':')
+	try:
+		return getattr(import_module(modulo), funzione)
+	except (ImportError, AttributeError, ValueError) as e:
+		raise SystemExit(f"Valutatore non valido: {testo!r} ({e})")
+
+def stampa_dettaglio(sessione, numero):
+	inizio = sessione.inizio
+	print(f"\n== Sessione {numero}: seed {inizio.seed}, {inizio.num_mazzi} mazzi, {inizio.fiches} fiches, "
+		f"mano {inizio.mani_vita + 1} della vita, {inizio.killer_hand_count} KH ==")
+	mani = list(mani_finali(sessione))
+	categorie = [valuta_indice(finale) for _, finale in mani]
+	fiches = inizio.fiches
+	for n, ((puntata, is_mano_speciale, esito), (iniziale, finale), categoria) in enumerate(zip(esiti(sessione, categorie), mani, categorie), 1):
+		tenute = "".join(str(i + 1) for i in range(CARTE_PER_MANO) if sessione.maschere[n - 1] >> i & 1) or "-"
+		print(f"{n:>6}{' KH' if is_mano_speciale else '   '} P:{puntata:<8} {' '.join(desc_breve(c) for c in iniziale):<16} "
+			f"tieni {tenute:<6} {' '.join(desc_breve(c) for c in finale):<16} {CATEGORIE[categoria]:<18} "
+			f"{esito.fiches - fiches:>+9} F:{esito.fiches}")
+		fiches = esito.fiches
+
+def stampa_riepilogo(nome, riepilogo, riferimento=None, larghezza=28):
+	rtp = riepilogo['fiches_restituite'] / riepilogo['fiches_puntate'] if riepilogo['fiches_puntate'] else 0.0
+	variazione = riepilogo['fiches_finali'] - riepilogo['fiches_iniziali']
+	print(f"{nome:<{larghezza}}{riepilogo['mani_giocate']:>10}{rtp * 100:>9.2f}%{variazione:>+16}"
+		f"{riepilogo['fallimenti']:>11}{riepilogo['mani_registrate'] - riepilogo['mani_giocate']:>11}{riepilogo['mani_cambiate']:>9}")
+	if riferimento is not None:
+		differenze = [f"{CATEGORIE[i]} {b - a:+d}" for i, (a, b) in enumerate(zip(riferimento['punteggi'], riepilogo['punteggi'])) if a != b]
+		if differenze:
+			print(f"{'':<{larghezza}}categorie: {', '.join(differenze)}")
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Riproduzione deterministica delle sessioni registrate")
+	parser.add_argument('comando', choices=('rigioca', 'confronta'))
+	parser.add_argument('file', nargs='*', default=[FILE_SESSIONI])
+	parser.add_argument('--sessione', type=int, help="rigioca: solo la sessione N (da 1)")
+	parser.add_argument('--dettaglio', action='store_true', help="rigioca: stampa ogni mano")
+	parser.add_argument('--valore', action='append', default=[], metavar='NOME=V1[,V2...]',
+		help="confronta: regole alternative come in griglia_configurazioni.py (tabella vincite, Killer Hand)")
+	parser.add_argument('--valutatore', action='append', default=[], metavar='MODULO:FUNZIONE',
+		help="confronta: valutatore alternativo (5 codici -> indice in CATEGORIE)")
+	parser.add_argument('--processi', type=int, default=None, help="confronta: processi worker per le sessioni (0 = tutti i core)")
+	args = parser.parse_args()
+	inizio = time.perf_counter()
+	if args.comando == 'rigioca':
+		try:
+			sessioni = [s for percorso in args.file for s in leggi_sessioni(percorso)]
+		except (OSError, ValueError) as e:
+			raise SystemExit(str(e))
+		if args.sessione is not None:
+			if not 1 <= args.sessione <= len(sessioni):
+				raise SystemExit(f"Sessione {args.sessione} inesistente: il registro ne contiene {len(sessioni)}.")
+			sessioni = [sessioni[args.sessione - 1]]
+		if args.dettaglio:
+			for numero, sessione in enumerate(sessioni, args.sessione or 1):
+				stampa_dettaglio(sessione, numero)
+		regole = None
+	else:
+		from griglia_configurazioni import assi_griglia, configurazioni
+		try:
+			alternative = configurazioni(assi_griglia(args.valore))
+		except ValueError as e:
+			raise SystemExit(str(e))
+		valutatori = [("", valuta_indice)] + [(testo, carica_valutatore(testo)) for testo in args.valutatore]
+		regole = [(" ".join(filter(None, (nome_valutatore, chiave if args.valore else ""))) or "attuale", valuta, configurazione)
+			for nome_valutatore, valuta in valutatori for chiave, _, configurazione in alternative]
+		if args.valore:
+			regole.insert(0, ("attuale", valuta_indice, CONFIGURAZIONE_PREDEFINITA))
+	try:
+		riepiloghi = riproduci_file(args.file, regole, args.processi) if args.comando == 'confronta' \
+			else riproduci(sessioni, regole)
+	except (OSError, ValueError) as e:
+		raise SystemExit(str(e))
+	secondi = time.perf_counter() - inizio
+	registrate = riepiloghi[0]['mani_registrate']
+	print(f"\n== Riproduzione: {riepiloghi[0]['sessioni']} sessioni, {registrate} mani in {secondi:.2f}s "
+		f"({registrate / secondi if secondi else 0:,.0f} mani/s) ==")
+	nomi = [nome for nome, _, _ in regole] if regole else ["attuale"]
+	larghezza = max(28, max(len(nome) for nome in nomi) + 2)
+	print(f"{'regole':<{larghezza}}{'mani':>10}{'RTP':>10}{'var. fiches':>16}{'fallimenti':>11}{'non gioc.':>11}{'cambi':>9}")
+	for nome, riepilogo in zip(nomi, riepiloghi):
+		stampa_riepilogo(nome, riepilogo, riepiloghi[0] if riepilogo is not riepiloghi[0] else None, larghezza)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,142 @@
+# REGOLE - Costanti di gioco, tabella vincite, puntata minima e Killer Hand
+# Funzioni pure condivise da poker_machine() e dalla simulazione headless.
+
+from collections import namedtuple
+
+NUM_MAZZI = 10 # Numero di mazzi standard da 52 carte usati
+CARTE_PER_MAZZO = 52
+CARTE_PER_MANO = 5
+# Soglia sotto la quale ricostruire e rimescolare tutto (5 iniziali + 5 sostituzioni = 10)
+# Usiamo un margine di sicurezza
+SOGLIA_RIMESCOLAMENTO_TOTALE = 15
+KILLER_HAND_FREQUENZA = 25
+PERCENTUALE_MINIMA_PUNTATA = 0.03 # 3%
+MAX_PENALITA_KH = 90 # Penalità massima in % per perdita Killer Hand
+FICHES_INIZIALI = 200 # Fiches assegnate al primo avvio e dopo ogni fallimento
+# Tabella vincite (multipli della puntata, 0 significa perdita della puntata)
+# Es: Coppia pagata -> 1*puntata restituita (quindi vincita netta 0)
+# Es: Doppia coppia -> 2*puntata restituita (quindi vincita netta = puntata)
+TABELLA_VINCITE = {
+	"Carta alta": 0,
+	"Coppia non pagata": 0,
+	"Coppia pagata": 1, # Pareggio
+	"Doppia coppia": 2,
+	"Tris": 3,
+	"Scala": 4,
+	"Colore": 6,
+	"Full": 9,
+	"Poker": 25,
+	"Super Poker": 40, # Vincita per 5 carte uguali
+	"Scala a colore": 55, # Era 50, aumentato leggermente
+	"Scala Reale": 250
+}
+# Precalcolati una volta: punteggi che pagano almeno la puntata e ordine per vincita decrescente
+PUNTEGGI_PAGATI = frozenset(nome for nome, moltiplicatore in TABELLA_VINCITE.items() if moltiplicatore >= 1)
+PUNTEGGI_PER_VINCITA = tuple(sorted(TABELLA_VINCITE, key=TABELLA_VINCITE.get, reverse=True))
+# Shortcut di puntata in percentuale delle fiches ('m' = puntata minima)
+SHORTCUT_PUNTATA = {'-': 0.10, ',': 0.25, '.': 0.50, ';': 0.75, '+': 1.0}
+
+EsitoMano = namedtuple("EsitoMano", "fiches importo_restituito fiches_vinte perdita_totale bonus_kh penalita_kh")
+
+# Parametri del gioco in un solo oggetto, con le costanti qui sopra come valori predefiniti:
+# il gioco usa CONFIGURAZIONE_PREDEFINITA, simulazione e griglia_configurazioni ne creano
+# altre con _replace() senza toccare il modulo.
+Configurazione = namedtuple("Configurazione",
+	"tabella_vincite num_mazzi soglia_rimescolamento killer_hand_frequenza max_penalita_kh percentuale_minima_puntata",
+	defaults=(TABELLA_VINCITE, NUM_MAZZI, SOGLIA_RIMESCOLAMENTO_TOTALE, KILLER_HAND_FREQUENZA,
+		MAX_PENALITA_KH, PERCENTUALE_MINIMA_PUNTATA))
+CONFIGURAZIONE_PREDEFINITA = Configurazione()
+
+def _intero_positivo(valore):
+	return isinstance(valore, int) and not isinstance(valore, bool) and valore >= 1
+
+def verifica_configurazione(configurazione):
+	# ValueError con un messaggio per l'utente se la configurazione non si puo' giocare
+	# (griglia_configurazioni e registro_sessioni la controllano prima di avviare i processi)
+	for campo in ('num_mazzi', 'killer_hand_frequenza', 'max_penalita_kh'):
+		valore = getattr(configurazione, campo)
+		if not _intero_positivo(valore):
+			raise ValueError(f"{campo}={valore}: deve essere un intero positivo.")
+	soglia = configurazione.soglia_rimescolamento
+	minima, massima = 2 * CARTE_PER_MANO, configurazione.num_mazzi * CARTE_PER_MAZZO
+	if not minima <= soglia <= massima:
+		raise ValueError(f"soglia_rimescolamento={soglia}: deve essere tra {minima} (carte di una mano "
+			f"con il cambio) e {massima} (carte nella scarpa).")
+	percentuale = configurazione.percentuale_minima_puntata
+	if not 0 < percentuale <= 1:
+		raise ValueError(f"percentuale_minima_puntata={percentuale}: deve essere maggiore di 0 e al massimo 1.")
+	for nome, moltiplicatore in configurazione.tabella_vincite.items():
+		if moltiplicatore < 0:
+			raise ValueError(f"{nome}={moltiplicatore}: le vincite non possono essere negative.")
+
+def calcola_vincita(punteggio, puntata, tabella_vincite=TABELLA_VINCITE):
+	return puntata * tabella_vincite.get(punteggio, 0) # Ritorna l'importo totale restituito
+
+def puntata_minima(fiches, percentuale=PERCENTUALE_MINIMA_PUNTATA):
+	return max(int(fiches * percentuale), 1)
+
+def interpreta_puntata(testo, fiches, percentuale=PERCENTUALE_MINIMA_PUNTATA):
+	# Puntata richiesta con un numero o uno shortcut ('m' = minima); None se non riconosciuta
+	if testo == 'm':
+		return puntata_minima(fiches, percentuale)
+	if testo in SHORTCUT_PUNTATA:
+		return int(fiches * SHORTCUT_PUNTATA[testo])
+	if testo and not testo.strip("0123456789"):
+		return int(testo)
+	return None
+
+def valida_puntata(puntata, fiches, percentuale=PERCENTUALE_MINIMA_PUNTATA):
+	# Ritorna (puntata accettata o None, messaggio per il giocatore o None)
+	minima = puntata_minima(fiches, percentuale)
+	if puntata < 1:
+		return None, "La puntata deve essere almeno 1."
+	if puntata > fiches:
+		return None, "Non hai abbastanza fiches per questa puntata."
+	if puntata < minima and fiches > 1: # Non forzare se hai solo 1 fiche
+		return minima, f"La puntata minima è {minima} ({percentuale*100:.0f}%). Correggo."
+	return puntata, None
+
+def aiuto_puntata(fiches, percentuale=PERCENTUALE_MINIMA_PUNTATA):
+	return [
+		"Inserisci l'importo da puntare o usa gli shortcut:",
+		f"  m : Puntata minima ({percentuale*100:.0f}%, attuale: {puntata_minima(fiches, percentuale)})",
+		"  - : 10% delle fiches",
+		"  , : 25% delle fiches",
+		"  . : 50% delle fiches",
+		"  ; : 75% delle fiches",
+		"  + : 100% delle fiches (All-in)",
+		"INVIO: Esci dal gioco"
+	]
+
+def interpreta_tenuta(testo):
+	# Cifre 1..CARTE_PER_MANO delle carte da tenere ("" = cambia tutte)
+	# Ritorna (insieme di indici 0-based o None, messaggio di errore o None)
+	if testo.strip("0123456789"):
+		return None, "Input non valido. Inserisci solo i numeri delle carte da tenere (es. 125) o '?' per un consiglio."
+	indici = set()
+	for cifra in testo:
+		idx = int(cifra)
+		if not 1 <= idx <= CARTE_PER_MANO:
+			return None, f"Numero carta non valido: {idx}. Inserisci numeri da 1 a {CARTE_PER_MANO}."
+		indici.add(idx - 1)
+	return indici, None
+
+def is_killer_hand(numero_mano_vita, frequenza=KILLER_HAND_FREQUENZA):
+	# numero_mano_vita: mani dall'ultimo fallimento, contando quella in corso
+	return numero_mano_vita % frequenza == 0
+
+def penalita_killer_hand(killer_hand_count, massima=MAX_PENALITA_KH):
+	return min(killer_hand_count * 10, massima)
+
+def regola_mano(punteggio, puntata, fiches, is_mano_speciale=False, penalita_attuale=0, tabella_vincite=TABELLA_VINCITE):
+	# fiches: saldo dopo aver gia' sottratto la puntata
+	importo_restituito = calcola_vincita(punteggio, puntata, tabella_vincite)
+	vincita_netta = importo_restituito - puntata
+	if vincita_netta >= 0:
+		bonus_kh = vincita_netta * 2 if is_mano_speciale and vincita_netta > 0 else 0
+		# Il bonus KH entra nelle statistiche (fiches_vinte) ma il saldo riceve l'importo restituito
+		return EsitoMano(fiches + importo_restituito, importo_restituito, vincita_netta + bonus_kh, 0, bonus_kh, 0)
+	penalita_kh = 0
+	if is_mano_speciale:
+		penalita_kh = min(int(fiches * (penalita_attuale / 100)), fiches)
+	return EsitoMano(fiches - penalita_kh, importo_restituito, 0, puntata + penalita_kh, 0, penalita_kh)
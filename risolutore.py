@@ -0,0 +1,118 @@
+# RISOLUTORE - Valore atteso esatto delle 32 tenute possibili per una mano servita
+# Le pescate sono senza reimmissione dalla composizione residua della scarpa
+# (NUM_MAZZI mazzi, quindi carte duplicate e Super Poker possibili). Invece di
+# enumerare le C(N, k) pescate si aggregano per multiinsieme di valori: il numero
+# di modi di pescare i valori {r: m_r} e' prod C(N_r, m_r); il colore si somma a
+# parte, come correzione, sui soli semi compatibili con le carte tenute.
+
+from functools import lru_cache
+from itertools import combinations_with_replacement
+from math import comb
+
+from regole import CARTE_PER_MANO, NUM_MAZZI, TABELLA_VINCITE
+from valutatore import (
+	CATEGORIE, NUM_CODICI, NUM_SEMI, NUM_VALORI, PRIMI, PRIMO_CODICE,
+	TABELLA_INDICI, TABELLA_INDICI_COLORE, prepara_tabelle
+)
+
+prepara_tabelle() # Il risolutore legge le tabelle del valutatore direttamente
+NUM_TENUTE = 1 << CARTE_PER_MANO
+PAGAMENTI = tuple(TABELLA_VINCITE[nome] for nome in CATEGORIE)
+
+def _multiinsiemi(k):
+	# Per ogni multiinsieme di k valori: (prodotto dei primi, ((rango, molteplicita'), ...))
+	risultato = []
+	for ranghi in combinations_with_replacement(range(NUM_VALORI), k):
+		prodotto = 1
+		for r in ranghi:
+			prodotto *= PRIMI[r]
+		risultato.append((prodotto, tuple((r, ranghi.count(r)) for r in sorted(set(ranghi)))))
+	return tuple(risultato)
+
+MULTIINSIEMI = tuple(_multiinsiemi(k) for k in range(CARTE_PER_MANO + 1))
+
+@lru_cache(maxsize=16)
+def _tabelle_pagamento(pagamenti):
+	# Prodotto dei primi -> importo per unita' puntata, senza colore e differenza col colore
+	senza_colore = {k: pagamenti[v] for k, v in TABELLA_INDICI.items()}
+	delta_colore = {k: pagamenti[TABELLA_INDICI_COLORE[k]] - senza_colore[k] for k in TABELLA_INDICI}
+	return senza_colore, delta_colore
+
+def composizione_scarpa(num_mazzi=NUM_MAZZI, escluse=()):
+	# Numero di copie residue per ciascun codice carta
+	composizione = [num_mazzi] * NUM_CODICI
+	for codice in escluse:
+		composizione[codice] -= 1
+	return composizione
+
+def _pesi(conteggi, k):
+	# conteggi[r] = carte residue di rango r (per tutti i semi o per un solo seme)
+	binomiali = [[comb(n, m) for m in range(k + 1)] for n in conteggi]
+	pesi = []
+	for _, termini in MULTIINSIEMI[k]:
+		peso = 1
+		for r, m in termini:
+			peso *= binomiali[r][m]
+			if not peso:
+				break
+		pesi.append(peso)
+	return pesi
+
+def valuta_tenute(codici, composizione=None, pagamenti=PAGAMENTI):
+	# Ritorna 32 valori attesi (importo restituito per unita' puntata), indice = maschera
+	# di tenuta con bit i = tieni codici[i].
+	if composizione is None:
+		composizione = composizione_scarpa(escluse=codici)
+	senza_colore, delta_colore = _tabelle_pagamento(tuple(pagamenti))
+	per_rango = [sum(composizione[r * NUM_SEMI:(r + 1) * NUM_SEMI]) for r in range(NUM_VALORI)]
+	totale = sum(per_rango)
+	pesi = {}
+	pesi_seme = {}
+	valori = [0.0] * NUM_TENUTE
+	for maschera in range(NUM_TENUTE):
+		tenute = [c for i, c in enumerate(codici) if maschera >> i & 1]
+		k = CARTE_PER_MANO - len(tenute)
+		prodotto_tenute = 1
+		for c in tenute:
+			prodotto_tenute *= PRIMO_CODICE[c]
+		if k == 0:
+			semi = {c % NUM_SEMI for c in tenute}
+			tabella = TABELLA_INDICI_COLORE if len(semi) == 1 else TABELLA_INDICI
+			valori[maschera] = float(pagamenti[tabella[prodotto_tenute]])
+			continue
+		if k not in pesi:
+			pesi[k] = _pesi(per_rango, k)
+		somma = 0
+		for peso, (prodotto, _) in zip(pesi[k], MULTIINSIEMI[k]):
+			if peso:
+				somma += peso * senza_colore[prodotto_tenute * prodotto]
+		# Correzione colore: tutte le carte pescate dello stesso seme delle tenute
+		semi = {c % NUM_SEMI for c in tenute} if tenute else range(NUM_SEMI)
+		if len(semi) == 1 or not tenute:
+			for s in semi:
+				if (s, k) not in pesi_seme:
+					pesi_seme[s, k] = _pesi(composizione[s::NUM_SEMI], k)
+				for peso, (prodotto, _) in zip(pesi_seme[s, k], MULTIINSIEMI[k]):
+					if peso:
+						somma += peso * delta_colore[prodotto_tenute * prodotto]
+		valori[maschera] = somma / comb(totale, k)
+	return valori
+
+def tenuta_ottimale(codici, composizione=None, pagamenti=PAGAMENTI):
+	# (maschera, valore atteso) della tenuta migliore; a parita' vince la maschera piu' alta
+	valori = valuta_tenute(codici, composizione, pagamenti)
+	maschera = max(range(NUM_TENUTE), key=lambda m: (valori[m], m))
+	return maschera, valori[maschera]
+
+def migliori_tenute(codici, composizione=None, quante=3, pagamenti=PAGAMENTI):
+	# Le `quante` tenute con valore atteso piu' alto, come lista di (maschera, valore)
+	valori = valuta_tenute(codici, composizione, pagamenti)
+	migliori = sorted(range(NUM_TENUTE), key=lambda m: (valori[m], m), reverse=True)[:quante]
+	return [(maschera, valori[maschera]) for maschera in migliori]
+
+def strategia_ottimale(codici):
+	return tenuta_ottimale(codici)[0]
+
+def maschera_in_cifre(maschera):
+	# Stesso formato del prompt "Quali tieni?" (1-based, senza spazi)
+	return "".join(str(i + 1) for i in range(CARTE_PER_MANO) if maschera >> i & 1)
@@ -0,0 +1,79 @@
+# SCARPA - Scarpa di NUM_MAZZI mazzi su un bytearray di codici carta
+# Sostituisce Mazzo e i suoi oggetti Carta nel percorso caldo: le carte sono
+# codici interi (vedi valutatore) e diventano nomi solo al momento di stamparle.
+# Il mescolamento e' un Fisher-Yates parziale eseguito durante la pesca: ogni
+# carta pescata viene scelta a caso tra le residue e scambiata in coda, quindi
+# ricostruire la scarpa costa O(1) e non serve mescolare in anticipo.
+
+import os
+import random
+
+from regole import NUM_MAZZI, SOGLIA_RIMESCOLAMENTO_TOTALE
+from valutatore import NUM_CODICI, NUM_SEMI, NUM_VALORI
+
+NOMI_VALORI = ("Asso", "2", "3", "4", "5", "6", "7", "8", "9", "10", "Jack", "Regina", "Re")
+VALORI_BREVI = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K")
+NOMI_SEMI = ("Cuori", "Quadri", "Fiori", "Picche")
+SEMI_BREVI = ("C", "Q", "F", "P")
+
+def nuovo_seed():
+	# Seed di una Scarpa da registrare (registro_sessioni.py): la sessione si puo' rigiocare
+	return int.from_bytes(os.urandom(8), 'little')
+
+def nome_carta(codice):
+	return f"{NOMI_VALORI[codice // NUM_SEMI]} di {NOMI_SEMI[codice % NUM_SEMI]}"
+
+def desc_breve(codice):
+	return VALORI_BREVI[codice // NUM_SEMI] + SEMI_BREVI[codice % NUM_SEMI]
+
+def chiave_ordinamento(codice):
+	# Come mano_ordinata: per seme, poi per valore con l'Asso alto
+	rango = codice // NUM_SEMI
+	return (codice % NUM_SEMI, rango if rango else NUM_VALORI)
+
+class Scarpa:
+	def __init__(self, num_mazzi=NUM_MAZZI, seed=None, rng=None):
+		self.num_mazzi = num_mazzi
+		self._rng = rng if rng is not None else random.Random(seed)
+		self._carte = bytearray(range(NUM_CODICI)) * num_mazzi
+		self._residue = len(self._carte) # Le carte in [0, _residue) sono ancora da pescare
+		self.composizione = bytearray([num_mazzi]) * NUM_CODICI # Copie residue per codice
+		self.scarti = bytearray()
+
+	def __len__(self):
+		return self._residue
+
+	def ricostruisci(self):
+		# Tutte le carte tornano nella scarpa; il Fisher-Yates parziale rende inutile rimescolare
+		self._residue = len(self._carte)
+		self.composizione = bytearray([self.num_mazzi]) * NUM_CODICI
+		self.scarti.clear()
+
+	def rimescola_se_necessario(self, soglia=SOGLIA_RIMESCOLAMENTO_TOTALE):
+		# Da chiamare prima di servire una mano: True se la scarpa e' stata ricostruita
+		if self._residue < soglia:
+			self.ricostruisci()
+			return True
+		return False
+
+	def pesca(self, quantita=1):
+		# Ritorna una lista di codici; meno di `quantita` solo se la scarpa si esaurisce
+		carte = self._carte
+		composizione = self.composizione
+		casuale = self._rng.random
+		residue = self._residue
+		pescate = []
+		for _ in range(min(quantita, residue)):
+			j = int(casuale() * residue) # indice uniforme in [0, residue)
+			residue -= 1
+			codice = carte[j]
+			carte[j] = carte[residue]
+			carte[residue] = codice
+			composizione[codice] -= 1
+			pescate.append(codice)
+		self._residue = residue
+		return pescate
+
+	def scarta(self, codici):
+		# Gli scarti restano fuori dalla scarpa fino alla prossima ricostruzione
+		self.scarti.extend(codici)
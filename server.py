@@ -0,0 +1,335 @@
+# SERVER - Poker Machine multi-giocatore su TCP con asyncio
+# Ogni connessione e' un tavolo con la propria Scarpa e una macchina a stati
+# (Sessione) che applica le stesse regole di poker_machine(): shortcut di
+# puntata, cifre di tenuta, Killer Hand e tabella vincite dal modulo regole.
+# Lo stato di ogni giocatore e' un file separato nella cartella dei giocatori;
+# i salvataggi vengono raccolti e scritti a lotti in un thread, fuori dal loop.
+# La puntata esce dal saldo quando la mano e' servita; se il giocatore si disconnette
+# prima della tenuta, la mano si conclude tenendo tutte le carte.
+#
+# Protocollo a righe (UTF-8). Il server invia righe che iniziano con un'etichetta:
+#   NOME                      chiede il nome del giocatore (lettere, cifre, _ e -)
+#   BENVENUTO nome F:n LANCIO:n
+#   PUNTATA #s/v/r F:n        chiede la puntata: numero, m - , . ; +, ? o riga vuota per uscire
+#   TIENI 10C 4Q KQ AF 10P    chiede le cifre delle carte da tenere, ? per un consiglio
+#   FINALE ...                mano finale
+#   RISULTATO +n F:n punteggio
+#   INFO / AIUTO / CONSIGLIO / ERRORE testo
+#   GAMEOVER F:0 | CIAO F:n BILANCIO:+n   poi la connessione viene chiusa
+# Uso: python server.py [--host 127.0.0.1] [--porta 8765] [--cartella giocatori]
+
+import argparse
+import asyncio
+import os
+import re
+import struct
+
+from pokermachine import carica_dati
+from regole import (
+	CARTE_PER_MANO, NUM_MAZZI, aiuto_puntata, interpreta_puntata, interpreta_tenuta,
+	is_killer_hand, penalita_killer_hand, regola_mano, valida_puntata
+)
+from diario import applica_mano, nuovo_record
+from registro_sessioni import codifica_inizio, codifica_mano
+from statistiche import adesso
+from stato import CARTELLA_GIOCATORI, codifica_stato, scrivi_stato
+from risolutore import maschera_in_cifre, migliori_tenute
+from scarpa import Scarpa, chiave_ordinamento, desc_breve, nuovo_seed
+from valutatore import valuta_codici
+
+NOME_VALIDO = re.compile(r'[A-Za-z0-9_-]{1,32}$')
+
+class Sessione:
+	# Macchina a stati di un tavolo: 'puntata' <-> 'tenuta', poi 'fine'.
+	# Non fa I/O: riceve una riga e ritorna le righe da inviare.
+	def __init__(self, nome, dati, seed=None):
+		self.nome = nome
+		self.dati = dati
+		self.seed = nuovo_seed() if seed is None else seed
+		self.scarpa = Scarpa(NUM_MAZZI, seed=self.seed)
+		self.fiches = dati['fiches_attuali']
+		self.saldo_iniziale = self.fiches
+		self.killer_hand_count = dati['killer_hand_count']
+		# Registro per la riproduzione (registro_sessioni.py): l'intestazione va con la
+		# prima mano, i record in sospeso li preleva l'archivio insieme allo stato
+		try:
+			self._inizio_registro = codifica_inizio(self.seed, self.fiches, dati['mani_dall_ultimo_fallimento'], self.killer_hand_count)
+		except struct.error:
+			self._inizio_registro = None
+		self.registro = bytearray()
+		self.numero_mano_sessione = 1
+		self.modificata = False # True quando dati va salvato
+		self.stato = 'puntata'
+		self.mano_ordinata = None
+		self.puntata = 0
+
+	def apri(self):
+		return [f"BENVENUTO {self.nome} F:{self.fiches} LANCIO:{self.dati['launches']}"] + self._nuova_mano()
+
+	def _nuova_mano(self):
+		self.stato = 'puntata'
+		mani_vita = self.dati['mani_dall_ultimo_fallimento'] + 1
+		self.is_mano_speciale = is_killer_hand(mani_vita)
+		self.penalita_attuale = 0
+		righe = []
+		if self.is_mano_speciale:
+			self.penalita_attuale = penalita_killer_hand(self.killer_hand_count + 1)
+			righe.append(f"INFO *** KILLER HAND #{self.killer_hand_count + 1} (Mano {mani_vita}): se perdi, perdi un extra {self.penalita_attuale}% delle tue fiches; se vinci, la vincita netta viene TRIPLICATA ***")
+		righe.append(self._richiesta_puntata())
+		return righe
+
+	def _richiesta_puntata(self):
+		mani_vita = self.dati['mani_dall_ultimo_fallimento'] + 1
+		return f"PUNTATA #{self.numero_mano_sessione}/{mani_vita}/{self.dati['record_mani_senza_fallimenti']} F:{self.fiches}"
+
+	def _richiesta_tenuta(self):
+		return "TIENI " + " ".join(desc_breve(c) for c in self.mano_ordinata)
+
+	def ricevi(self, riga):
+		if self.stato == 'puntata':
+			return self._ricevi_puntata(riga)
+		if self.stato == 'tenuta':
+			return self._ricevi_tenuta(riga)
+		return []
+
+	def _ricevi_puntata(self, riga):
+		if riga == '?':
+			return ["AIUTO " + r for r in aiuto_puntata(self.fiches)] + [self._richiesta_puntata()]
+		if riga == '':
+			return self.esci()
+		richiesta = interpreta_puntata(riga, self.fiches)
+		if richiesta is None:
+			return ["ERRORE Input non valido. Inserisci un numero, uno shortcut (m, -, ,, ., ;, +), '?' per aiuto o una riga vuota per uscire.", self._richiesta_puntata()]
+		puntata, messaggio = valida_puntata(richiesta, self.fiches)
+		if puntata is None:
+			return ["ERRORE " + messaggio, self._richiesta_puntata()]
+		righe = ["INFO " + messaggio] if messaggio else []
+		# La puntata esce dal saldo (e dal salvataggio) appena la mano e' servita: chi si
+		# disconnette davanti a una mano brutta o a una Killer Hand non la recupera
+		self.puntata = puntata
+		self.fiches -= puntata
+		self.dati['fiches_attuali'] = self.fiches
+		self.modificata = True
+		self.scarpa.rimescola_se_necessario()
+		self.mano_ordinata = sorted(self.scarpa.pesca(CARTE_PER_MANO), key=chiave_ordinamento)
+		self.stato = 'tenuta'
+		righe.append(self._richiesta_tenuta())
+		return righe
+
+	def consiglio(self):
+		# Calcolo costoso (decine di ms): il server lo esegue in un thread
+		righe = []
+		for maschera, valore in migliori_tenute(self.mano_ordinata, self.scarpa.composizione):
+			righe.append(f"CONSIGLIO {maschera_in_cifre(maschera) or '-'} {valore:.3f}")
+		return righe + [self._richiesta_tenuta()]
+
+	def _ricevi_tenuta(self, riga):
+		if riga == '?':
+			return self.consiglio()
+		indici, messaggio = interpreta_tenuta(riga)
+		if indici is None:
+			return ["ERRORE " + messaggio, self._richiesta_tenuta()]
+		return self._concludi_mano(indici)
+
+	def _concludi_mano(self, indici):
+		tenute = [c for i, c in enumerate(self.mano_ordinata) if i in indici]
+		scartate = [c for i, c in enumerate(self.mano_ordinata) if i not in indici]
+		if scartate:
+			self.scarpa.scarta(scartate)
+		mano = tenute + self.scarpa.pesca(len(scartate))
+		punteggio = valuta_codici(mano)
+		esito = regola_mano(punteggio, self.puntata, self.fiches, self.is_mano_speciale, self.penalita_attuale)
+		if self.is_mano_speciale:
+			self.killer_hand_count += 1
+		game_over = esito.fiches <= 0
+		record = nuovo_record(self.dati['seq_diario'] + 1, adesso(), self.puntata,
+			mano, punteggio, esito, self.killer_hand_count, self.is_mano_speciale, game_over)
+		applica_mano(self.dati, record)
+		self._registra(sum(1 << i for i in indici), self.puntata)
+		netto = esito.fiches - self.fiches - self.puntata
+		self.fiches = esito.fiches
+		self.numero_mano_sessione += 1
+		self.modificata = True
+		righe = ["FINALE " + " ".join(desc_breve(c) for c in mano), f"RISULTATO {netto:+d} F:{self.fiches} {punteggio}"]
+		if esito.bonus_kh:
+			righe.append(f"INFO *** Bonus Killer Hand! Vinci {esito.bonus_kh} fiches extra! ***")
+		if esito.penalita_kh:
+			righe.append(f"INFO *** Penalità Killer Hand! Perdi un extra {self.penalita_attuale}% ({esito.penalita_kh} fiches)! ***")
+		if game_over:
+			self.stato = 'fine'
+			return righe + ["GAMEOVER F:0"]
+		return righe + self._nuova_mano()
+
+	def _registra(self, maschera, puntata):
+		if self._inizio_registro is None:
+			return
+		try:
+			self.registro += self._inizio_registro + codifica_mano(maschera, puntata)
+		except struct.error: # Una mano mancante falserebbe le successive: si smette di registrare
+			self._inizio_registro = None
+			return
+		self._inizio_registro = b''
+
+	def preleva_registro(self):
+		record = bytes(self.registro)
+		self.registro.clear()
+		return record
+
+	def esci(self):
+		self.chiudi()
+		self.stato = 'fine'
+		return [f"CIAO F:{self.fiches} BILANCIO:{self.fiches - self.saldo_iniziale:+d}"]
+
+	def chiudi(self):
+		# Uscita o disconnessione: una mano servita e non conclusa si gioca tenendo
+		# tutte le carte, con puntata, Killer Hand e contatori come per le altre
+		if self.stato == 'tenuta':
+			self._concludi_mano(range(CARTE_PER_MANO))
+		self.dati['fiches_attuali'] = self.fiches
+		self.dati['killer_hand_count'] = self.killer_hand_count
+		self.dati['data_ultima_giocata'] = adesso()
+		self.modificata = True
+
+# --- Persistenza per giocatore ---
+def scrivi_lotto(lotto, registri=()):
+	# Eseguita nel thread: (percorso, byte) gia' serializzati dal loop; i registri
+	# delle sessioni vanno in append
+	for percorso, contenuto in lotto:
+		scrivi_stato(percorso, contenuto)
+	for percorso, record in registri:
+		with open(percorso, 'ab') as f:
+			f.write(record)
+
+class Archivio:
+	# Raccoglie i giocatori modificati e li scrive a lotti ogni `intervallo` secondi.
+	# La serializzazione avviene nel loop (i dati non cambiano durante la copia),
+	# la scrittura su disco nell'executor.
+	def __init__(self, cartella=CARTELLA_GIOCATORI, intervallo=1.0):
+		self.cartella = cartella
+		self.intervallo = intervallo
+		self._da_scrivere = {}
+		self._registri = {} # nome -> record del registro sessioni non ancora scritti
+		self._blocco = asyncio.Lock()
+		os.makedirs(cartella, exist_ok=True)
+
+	def percorso(self, nome, estensione='.stato'):
+		# '.pkl': formato precedente, migrato al primo caricamento; '.sessioni': registro sessioni
+		return os.path.join(self.cartella, nome + estensione)
+
+	def segna(self, nome, dati, registro=b''):
+		self._da_scrivere[nome] = dati
+		if registro:
+			self._registri[nome] = self._registri.get(nome, b'') + registro
+
+	async def carica(self, nome):
+		# Se il giocatore ha un salvataggio in sospeso (riconnessione rapida) lo scrive prima
+		if nome in self._da_scrivere:
+			await self.scrivi()
+		async with self._blocco:
+			return await asyncio.get_running_loop().run_in_executor(None, carica_dati, self.percorso(nome), None, self.percorso(nome, '.pkl'))
+
+	async def scrivi(self):
+		async with self._blocco:
+			if not self._da_scrivere:
+				return 0
+			lotto = [(self.percorso(nome), codifica_stato(dati)) for nome, dati in self._da_scrivere.items()]
+			registri = [(self.percorso(nome, '.sessioni'), record) for nome, record in self._registri.items()]
+			self._da_scrivere.clear()
+			self._registri.clear()
+			await asyncio.get_running_loop().run_in_executor(None, scrivi_lotto, lotto, registri)
+			return len(lotto)
+
+	async def ciclo(self):
+		while True:
+			await asyncio.sleep(self.intervallo)
+			await self.scrivi()
+
+# --- Rete ---
+async def invia(writer, righe):
+	writer.write(("\n".join(righe) + "\n").encode('utf-8'))
+	await writer.drain()
+
+async def leggi_riga(reader):
+	# None a connessione chiusa
+	riga = await reader.readline()
+	if not riga:
+		return None
+	return riga.decode('utf-8', 'replace').rstrip('\r\n')
+
+async def gestisci_connessione(reader, writer, archivio, attivi):
+	nome = None
+	sessione = None
+	try:
+		await invia(writer, ["NOME"])
+		nome = await leggi_riga(reader)
+		if nome is None:
+			return
+		if not NOME_VALIDO.match(nome):
+			await invia(writer, ["ERRORE Nome non valido: usa da 1 a 32 lettere, cifre, _ o -"])
+			nome = None
+			return
+		if nome in attivi:
+			await invia(writer, ["ERRORE Giocatore gia' connesso"])
+			nome = None
+			return
+		attivi.add(nome)
+		sessione = Sessione(nome, await archivio.carica(nome))
+		await invia(writer, sessione.apri())
+		while sessione.stato != 'fine':
+			riga = await leggi_riga(reader)
+			if riga is None:
+				break
+			if sessione.stato == 'tenuta' and riga == '?':
+				righe = await asyncio.get_running_loop().run_in_executor(None, sessione.consiglio)
+			else:
+				righe = sessione.ricevi(riga)
+			if sessione.modificata:
+				archivio.segna(nome, sessione.dati, sessione.preleva_registro())
+				sessione.modificata = False
+			await invia(writer, righe)
+	except (ConnectionError, asyncio.IncompleteReadError):
+		pass
+	except (ValueError, asyncio.LimitOverrunError):
+		# Riga oltre il limite dello stream (readline la segnala come ValueError):
+		# errore di protocollo, poi la sessione si chiude e si salva come a una disconnessione
+		try:
+			await invia(writer, ["ERRORE Riga troppo lunga: connessione chiusa"])
+		except ConnectionError:
+			pass
+	finally:
+		if sessione is not None:
+			if sessione.stato != 'fine':
+				sessione.chiudi()
+			archivio.segna(nome, sessione.dati, sessione.preleva_registro())
+		if nome is not None:
+			attivi.discard(nome)
+		writer.close()
+
+async def servi(host='127.0.0.1', porta=8765, cartella=CARTELLA_GIOCATORI, intervallo=1.0):
+	archivio = Archivio(cartella, intervallo)
+	attivi = set()
+	server = await asyncio.start_server(
+		lambda r, w: gestisci_connessione(r, w, archivio, attivi), host, porta, backlog=1024)
+	salvataggi = asyncio.ensure_future(archivio.ciclo())
+	print(f"Poker Machine in ascolto su {host}:{porta} (giocatori in {cartella})", flush=True)
+	try:
+		async with server:
+			await server.serve_forever()
+	finally:
+		salvataggi.cancel()
+		await archivio.scrivi()
+
+def main():
+	parser = argparse.ArgumentParser(description="Server multi-giocatore della Poker Machine")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--porta', type=int, default=8765)
+	parser.add_argument('--cartella', default=CARTELLA_GIOCATORI, help="Cartella dei file dei giocatori")
+	parser.add_argument('--intervallo', type=float, default=1.0, help="Secondi tra due scritture a lotti")
+	args = parser.parse_args()
+	try:
+		asyncio.run(servi(args.host, args.porta, args.cartella, args.intervallo))
+	except KeyboardInterrupt:
+		print("\nServer fermato.")
+
+if __name__ == "__main__":
+	main()
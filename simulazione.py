@@ -0,0 +1,269 @@
+# SIMULAZIONE - Motore headless Monte Carlo per tabella vincite e Killer Hand
+# Gioca N mani senza input(), con strategia di tenuta e politica di puntata
+# intercambiabili, usando le stesse regole di poker_machine() (modulo regole).
+# Uso: python simulazione.py 1000000 --strategia semplice --puntata m --seed 42
+#      python simulazione.py 100000000 --processi 8 --seed 42
+#      python simulazione.py 1000000 --strategia ottimale --politica-file politica.npz --orizzonte 1650
+
+import argparse
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import regole
+from regole import (
+	CARTE_PER_MANO, CONFIGURAZIONE_PREDEFINITA, FICHES_INIZIALI, penalita_killer_hand, regola_mano, valida_puntata,
+	verifica_configurazione
+)
+from cache_strategia import CACHE_PREDEFINITA, strategia_ottimale_cache
+from scarpa import Scarpa
+from valutatore import CATEGORIE, INDICE_CATEGORIA, NUM_SEMI, valuta_indice
+
+TUTTE = (1 << CARTE_PER_MANO) - 1 # Maschera di tenuta: bit i = tieni la carta i
+INDICE_SCALA = INDICE_CATEGORIA["Scala"]
+RANGHI_ALTI = frozenset((0, 10, 11, 12)) # A, J, Q, K
+
+# --- Strategie di tenuta: ricevono 5 codici e ritornano la maschera ---
+def strategia_cambia_tutto(codici):
+	return 0
+
+def strategia_tieni_tutto(codici):
+	return TUTTE
+
+def strategia_semplice(codici):
+	# Tiene le mani fatte (Scala o meglio), poi coppie/tris/poker, poi 4 a colore,
+	# poi le carte alte (J+); altrimenti cambia tutto.
+	if valuta_indice(codici) >= INDICE_SCALA:
+		ranghi = [c // NUM_SEMI for c in codici]
+		if max(ranghi.count(r) for r in ranghi) == 4:
+			return sum(1 << i for i, r in enumerate(ranghi) if ranghi.count(r) == 4)
+		return TUTTE
+	ranghi = [c // NUM_SEMI for c in codici]
+	maschera = 0
+	for i, r in enumerate(ranghi):
+		if ranghi.count(r) > 1:
+			maschera |= 1 << i
+	if maschera:
+		return maschera
+	semi = [c % NUM_SEMI for c in codici]
+	for s in set(semi):
+		if semi.count(s) == 4:
+			return sum(1 << i for i, x in enumerate(semi) if x == s)
+	for i, r in enumerate(ranghi):
+		if r in RANGHI_ALTI:
+			maschera |= 1 << i
+	return maschera
+
+STRATEGIE = {
+	'semplice': strategia_semplice,
+	'cambia': strategia_cambia_tutto,
+	'tieni': strategia_tieni_tutto,
+	'ottimale': strategia_ottimale_cache,
+}
+
+# --- Politiche di puntata: (fiches, numero_mano_vita, killer_hand_count) -> puntata ---
+def puntata_minima_politica(fiches, numero_mano_vita, killer_hand_count):
+	return 0 # simula() la porta alla puntata minima della configurazione
+
+def _puntata_frazione(percentuale, fiches, numero_mano_vita, killer_hand_count):
+	return int(fiches * percentuale)
+
+def puntata_percentuale(percentuale):
+	# partial e non closure: deve poter essere inviata ai processi worker
+	return partial(_puntata_frazione, percentuale)
+
+POLITICHE = {'m': puntata_minima_politica}
+POLITICHE.update({k: puntata_percentuale(v) for k, v in regole.SHORTCUT_PUNTATA.items()})
+
+def nuovo_risultato():
+	# Contatori con le stesse chiavi di dati dove possibile
+	return {
+		'mani_giocate': 0,
+		'fiches_puntate': 0,
+		'fiches_restituite': 0,
+		'fiches_guadagnate': 0,
+		'fiches_perdute': 0,
+		'vincita_massima': 0,
+		'perdita_massima': 0,
+		'fallimenti': 0,
+		'vite_concluse': 0,
+		'record_mani_senza_fallimenti': 0,
+		'killer_hand_giocate': 0,
+		'punteggi': {nome: 0 for nome in CATEGORIE},
+	}
+
+def simula(num_mani, strategia=strategia_semplice, politica=puntata_minima_politica,
+		seed=None, fiches_iniziali=FICHES_INIZIALI, orizzonte=1000, configurazione=CONFIGURAZIONE_PREDEFINITA):
+	# Una "vita" parte con fiches_iniziali e finisce al fallimento (fiches a 0)
+	# oppure dopo `orizzonte` mani; in entrambi i casi si riparte da capo come
+	# dopo il refill di carica_dati(). Regole e tabella vincite: da `configurazione`
+	# (la strategia 'ottimale' resta quella della tabella e dei mazzi predefiniti).
+	verifica_configurazione(configurazione)
+	rng = random.Random(seed)
+	risultato = nuovo_risultato()
+	conteggi = [0] * len(CATEGORIE)
+	tabella_vincite = configurazione.tabella_vincite
+	frequenza_kh = configurazione.killer_hand_frequenza
+	soglia = configurazione.soglia_rimescolamento
+	# La stessa Scarpa del gioco: sotto la soglia di rimescolamento si ricostruisce
+	scarpa = Scarpa(configurazione.num_mazzi, rng=rng)
+	pesca = scarpa.pesca
+	fiches = fiches_iniziali
+	mano_vita = 0
+	killer_hand_count = 0
+	for _ in range(num_mani):
+		if len(scarpa) < soglia:
+			scarpa.ricostruisci()
+		mano_vita += 1
+		is_mano_speciale = mano_vita % frequenza_kh == 0
+		penalita_attuale = 0
+		if is_mano_speciale:
+			killer_hand_count += 1
+			penalita_attuale = penalita_killer_hand(killer_hand_count, configurazione.max_penalita_kh)
+			risultato['killer_hand_giocate'] += 1
+		# Puntata con la stessa validazione del gioco; oltre le fiches (o sotto 1) si ferma al limite
+		puntata, _ = valida_puntata(max(1, min(politica(fiches, mano_vita, killer_hand_count), fiches)),
+			fiches, configurazione.percentuale_minima_puntata)
+		fiches -= puntata
+		# Distribuzione, tenuta e cambio
+		mano = pesca(CARTE_PER_MANO)
+		maschera = strategia(mano)
+		if maschera != TUTTE:
+			tenute = [c for i, c in enumerate(mano) if maschera >> i & 1]
+			mano = tenute + pesca(CARTE_PER_MANO - len(tenute))
+		categoria = valuta_indice(mano)
+		conteggi[categoria] += 1
+		esito = regola_mano(CATEGORIE[categoria], puntata, fiches, is_mano_speciale, penalita_attuale, tabella_vincite)
+		fiches = esito.fiches
+		risultato['fiches_puntate'] += puntata
+		risultato['fiches_restituite'] += esito.importo_restituito
+		if esito.perdita_totale:
+			risultato['fiches_perdute'] += esito.perdita_totale
+			if esito.perdita_totale > risultato['perdita_massima']:
+				risultato['perdita_massima'] = esito.perdita_totale
+		else:
+			risultato['fiches_guadagnate'] += esito.fiches_vinte
+			if esito.fiches_vinte > risultato['vincita_massima']:
+				risultato['vincita_massima'] = esito.fiches_vinte
+		if fiches > 0 and mano_vita > risultato['record_mani_senza_fallimenti']:
+			risultato['record_mani_senza_fallimenti'] = mano_vita
+		if fiches <= 0 or mano_vita >= orizzonte:
+			if fiches <= 0:
+				risultato['fallimenti'] += 1
+			risultato['vite_concluse'] += 1
+			fiches = fiches_iniziali
+			mano_vita = 0
+			killer_hand_count = 0
+	risultato['mani_giocate'] = num_mani
+	for i, nome in enumerate(CATEGORIE):
+		risultato['punteggi'][nome] = conteggi[i]
+	return risultato
+
+def unisci_risultati(risultati):
+	# Somma i contatori e prende i massimi; l'ordine di fusione e' fisso
+	totale = nuovo_risultato()
+	for risultato in risultati:
+		for chiave in ('mani_giocate', 'fiches_puntate', 'fiches_restituite', 'fiches_guadagnate',
+				'fiches_perdute', 'fallimenti', 'vite_concluse', 'killer_hand_giocate'):
+			totale[chiave] += risultato[chiave]
+		for chiave in ('vincita_massima', 'perdita_massima', 'record_mani_senza_fallimenti'):
+			totale[chiave] = max(totale[chiave], risultato[chiave])
+		for nome, conteggio in risultato['punteggi'].items():
+			totale['punteggi'][nome] += conteggio
+	return totale
+
+def seed_worker(seed, indice):
+	# Flusso RNG indipendente e riproducibile per ogni shard, derivato dal seed principale
+	digest = hashlib.sha256(f"pokermachine:{seed}:{indice}".encode()).digest()
+	return int.from_bytes(digest[:8], "big")
+
+def dividi_mani(num_mani, num_shard):
+	base, resto = divmod(num_mani, num_shard)
+	return [base + (1 if i < resto else 0) for i in range(num_shard)]
+
+def _simula_shard(argomenti):
+	num_mani, seed, strategia, politica, fiches_iniziali, orizzonte, configurazione = argomenti
+	return simula(num_mani, strategia, politica, seed, fiches_iniziali, orizzonte, configurazione)
+
+def simula_parallelo(num_mani, num_processi=None, strategia=strategia_semplice,
+		politica=puntata_minima_politica, seed=0, fiches_iniziali=FICHES_INIZIALI, orizzonte=1000,
+		configurazione=CONFIGURAZIONE_PREDEFINITA):
+	# Uno shard per processo: a parita' di seed e num_processi il risultato e'
+	# identico bit per bit, indipendentemente dall'ordine di completamento.
+	num_processi = num_processi or os.cpu_count() or 1
+	argomenti = [
+		(mani, seed_worker(seed, i), strategia, politica, fiches_iniziali, orizzonte, configurazione)
+		for i, mani in enumerate(dividi_mani(num_mani, num_processi))
+	]
+	if num_processi == 1:
+		return unisci_risultati(map(_simula_shard, argomenti))
+	with ProcessPoolExecutor(max_workers=num_processi) as executor:
+		return unisci_risultati(executor.map(_simula_shard, argomenti))
+
+def rtp(risultato):
+	# Return-to-player della tabella vincite: importo restituito / importo puntato
+	if not risultato['fiches_puntate']:
+		return 0.0
+	return risultato['fiches_restituite'] / risultato['fiches_puntate']
+
+def probabilita_rovina(risultato):
+	if not risultato['vite_concluse']:
+		return 0.0
+	return risultato['fallimenti'] / risultato['vite_concluse']
+
+def stampa_risultato(risultato, secondi=None):
+	mani = risultato['mani_giocate']
+	print("\n== Simulazione ==")
+	print(f"Mani giocate: {mani}")
+	if secondi:
+		print(f"Tempo: {secondi:.2f}s ({mani / secondi * 60:,.0f} mani/minuto)")
+	print(f"RTP: {rtp(risultato) * 100:.3f}%")
+	print(f"Fiches guadagnate: {risultato['fiches_guadagnate']} | perdute: {risultato['fiches_perdute']}")
+	print(f"Vincita massima: {risultato['vincita_massima']} | Perdita massima: {risultato['perdita_massima']}")
+	print(f"Fallimenti: {risultato['fallimenti']} su {risultato['vite_concluse']} vite "
+		f"(probabilità di rovina: {probabilita_rovina(risultato) * 100:.2f}%)")
+	print(f"Record mani senza fallimenti: {risultato['record_mani_senza_fallimenti']}")
+	print("\n== Frequenze dei Punteggi ==")
+	for nome in reversed(CATEGORIE):
+		conteggio = risultato['punteggi'][nome]
+		frequenza = conteggio / mani * 100 if mani else 0
+		print(f"- {nome}: {conteggio} ({frequenza:.4f}%)")
+
+def main():
+	parser = argparse.ArgumentParser(description="Simulazione headless della Poker Machine")
+	parser.add_argument("mani", type=int, help="numero di mani da giocare")
+	parser.add_argument("--strategia", choices=sorted(STRATEGIE), default="semplice")
+	parser.add_argument("--puntata", choices=sorted(POLITICHE), default="m",
+		help="shortcut di puntata usato ad ogni mano (m - , . ; +)")
+	parser.add_argument("--seed", type=int, default=None)
+	parser.add_argument("--orizzonte", type=int, default=1000, help="mani massime per vita")
+	parser.add_argument("--processi", type=int, default=None,
+		help="numero di processi worker (0 = tutti i core); senza opzione gira nel processo corrente")
+	parser.add_argument("--tabella", metavar="PERCORSO", default=None,
+		help="tabella delle tenute ottimali precalcolata (vedi cache_strategia.py)")
+	parser.add_argument("--politica-file", metavar="PERCORSO", default=None,
+		help="politica di puntata salvata da ottimizzatore_puntate.py --salva (al posto di --puntata)")
+	args = parser.parse_args()
+	if args.politica_file:
+		from ottimizzatore_puntate import PoliticaTabella
+		POLITICHE[args.puntata] = PoliticaTabella(args.politica_file)
+	if args.tabella:
+		CACHE_PREDEFINITA.carica_tabella(args.tabella)
+	inizio = time.perf_counter()
+	if args.processi is None:
+		risultato = simula(args.mani, STRATEGIE[args.strategia], POLITICHE[args.puntata],
+			seed=args.seed, orizzonte=args.orizzonte)
+	else:
+		seed = args.seed if args.seed is not None else int.from_bytes(os.urandom(8), "big")
+		print(f"Seed principale: {seed}")
+		risultato = simula_parallelo(args.mani, args.processi, STRATEGIE[args.strategia],
+			POLITICHE[args.puntata], seed=seed, orizzonte=args.orizzonte)
+	stampa_risultato(risultato, time.perf_counter() - inizio)
+	if args.strategia == 'ottimale' and args.processi is None:
+		print(f"\nCache strategia: {CACHE_PREDEFINITA.statistiche()}")
+
+if __name__ == "__main__":
+	main()
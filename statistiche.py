@@ -0,0 +1,109 @@
+# STATISTICHE - Aggregati del report mantenuti mano per mano
+# Il report non ricalcola nulla dalla storia: ogni mano conclusa aggiorna dei
+# contatori (mani pagate, sole Killer Hand, sessione, finestra mobile delle
+# ultime mani) e i report leggono solo questi, in O(numero di categorie).
+# Le date sono secondi epoch: diventano testo solo quando vengono mostrate.
+
+import time
+from collections import deque
+from datetime import datetime
+
+from regole import PUNTEGGI_PAGATI, PUNTEGGI_PER_VINCITA
+from misure import strumentato
+from valutatore import CATEGORIE
+
+DIMENSIONE_FINESTRA = 100 # Mani nella finestra mobile
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S" # Formato delle date nei vecchi salvataggi
+CHIAVI_DATA = ('data_ultimo_fallimento', 'data_vincita_massima', 'data_perdita_massima', 'data_ultima_giocata')
+INDICE_CATEGORIA = {nome: i for i, nome in enumerate(CATEGORIE)}
+
+def adesso():
+	return int(time.time())
+
+def a_epoca(data):
+	# Secondi epoch da una data dei vecchi salvataggi (stringa); None se illeggibile
+	if data is None or isinstance(data, (int, float)):
+		return data
+	try:
+		return int(datetime.strptime(data, FORMATO_DATA).timestamp())
+	except (TypeError, ValueError):
+		return None
+
+def nuovi_aggregati():
+	return {'mani': 0, 'pagate': 0, 'puntate': 0, 'vinte': 0, 'perse': 0, 'punteggi': {nome: 0 for nome in PUNTEGGI_PER_VINCITA}}
+
+def somma_voce(aggregati, voce, segno=1):
+	# voce: (indice in CATEGORIE, puntata, vinte, perse), come nella finestra; segno=-1 toglie la mano
+	categoria, puntata, vinte, perse = voce
+	punteggio = CATEGORIE[categoria]
+	aggregati['mani'] += segno
+	if punteggio in PUNTEGGI_PAGATI:
+		aggregati['pagate'] += segno
+	aggregati['puntate'] += segno * puntata
+	aggregati['vinte'] += segno * vinte
+	aggregati['perse'] += segno * perse
+	aggregati['punteggi'][punteggio] = aggregati['punteggi'].get(punteggio, 0) + segno
+
+def aggiorna_aggregati(aggregati, record, segno=1):
+	# record: come diario.nuovo_record (bastano r, p, v, l)
+	somma_voce(aggregati, (INDICE_CATEGORIA[record['r']], record['p'], record['v'], record['l']), segno)
+
+def migra_statistiche(dati):
+	# Aggiunge gli aggregati ai salvataggi che non li hanno e converte le date in epoch.
+	# mani_pagate si ricava dai punteggi; gli aggregati KH e la finestra partono da zero.
+	for chiave in CHIAVI_DATA:
+		dati[chiave] = a_epoca(dati.get(chiave))
+	for info in dati['punteggi'].values():
+		info['ultima_realizzazione'] = a_epoca(info.get('ultima_realizzazione'))
+	if 'mani_pagate' not in dati:
+		dati['mani_pagate'] = sum(info['conteggio'] for nome, info in dati['punteggi'].items() if nome in PUNTEGGI_PAGATI)
+	dati.setdefault('aggregati_kh', nuovi_aggregati())
+	dati.setdefault('aggregati_finestra', nuovi_aggregati())
+	dati.setdefault('ultime_mani', deque(maxlen=DIMENSIONE_FINESTRA))
+	return dati
+
+def migra_finestra(dati):
+	# Schema 3: le mani della finestra diventano tuple di interi (indice in CATEGORIE,
+	# puntata, vinte, perse), che stato.py legge in blocco senza creare dizionari
+	dati['ultime_mani'] = deque([(INDICE_CATEGORIA[voce['r']], voce['p'], voce['v'], voce['l'])
+		for voce in dati['ultime_mani']], maxlen=DIMENSIONE_FINESTRA)
+	return dati
+
+def registra_mano(dati, record):
+	# Chiamata da diario.applica_mano per ogni mano, dal vivo o in ripristino
+	if record['r'] in PUNTEGGI_PAGATI:
+		dati['mani_pagate'] += 1
+	if record['s']:
+		aggiorna_aggregati(dati['aggregati_kh'], record)
+	finestra = dati['ultime_mani']
+	if len(finestra) == finestra.maxlen:
+		somma_voce(dati['aggregati_finestra'], finestra[0], -1)
+	voce = (INDICE_CATEGORIA[record['r']], record['p'], record['v'], record['l'])
+	finestra.append(voce)
+	somma_voce(dati['aggregati_finestra'], voce)
+
+# --- Report ---
+def righe_aggregati(aggregati):
+	mani = aggregati['mani']
+	if not mani:
+		return ["Nessuna mano."]
+	realizzati = [f"{nome} {aggregati['punteggi'][nome]}" for nome in PUNTEGGI_PER_VINCITA if aggregati['punteggi'].get(nome)]
+	return [
+		f"Mani: {mani} | pagate (Coppia Pagata+): {aggregati['pagate'] / mani * 100:.2f}%",
+		f"Fiches puntate: {aggregati['puntate']} | vinte: {aggregati['vinte']} | perdute: {aggregati['perse']} | netto: {aggregati['vinte'] - aggregati['perse']:+}",
+		"Punteggi: " + ", ".join(realizzati)
+	]
+
+@strumentato('mostra_report_esteso')
+def mostra_report_esteso(dati, aggregati_sessione=None):
+	print("\n== Report Esteso ==")
+	sezioni = []
+	if aggregati_sessione is not None:
+		sezioni.append(("Sessione", aggregati_sessione))
+	sezioni.append(("Killer Hand", dati['aggregati_kh']))
+	sezioni.append((f"Ultime {DIMENSIONE_FINESTRA} mani", dati['aggregati_finestra']))
+	for titolo, aggregati in sezioni:
+		print(f"-- {titolo} --")
+		for riga in righe_aggregati(aggregati):
+			print(riga)
+	print("===================")
@@ -0,0 +1,330 @@
+# STATO - Formato binario del file dati, con versione e checksum
+# Sostituisce il pickle: niente codice eseguito in lettura, un file troncato o
+# alterato viene riconosciuto, e la scrittura e' atomica (file temporaneo,
+# fsync, os.replace, fsync della cartella): il principale non manca mai, nemmeno
+# per un crash a meta' salvataggio.
+# Layout (little endian):
+#   intestazione '<4sBcxxII': magia b'PKMS', versione del formato, codifica,
+#                             lunghezza e CRC32 del contenuto
+#   codifica 'S' (schema):  '<H' + nomi delle CATEGORIE separati da '\n' (UTF-8),
+#                           poi gli interi '<q' (data None = NULLO): SCALARI, per
+#                           categoria conteggio e ultima realizzazione, i due
+#                           aggregati (CAMPI_AGGREGATI + un conteggio per categoria)
+#                           e il numero di mani della finestra mobile; infine le
+#                           mani della finestra, una per record '<Bqqq'
+#   codifica 'J' (JSON):    ripiego per dati fuori schema (chiavi sconosciute,
+#                           interi oltre 64 bit), finestra mobile come lista
+# I nomi delle categorie sono nel file: se cambiano, i salvataggi vecchi si
+# leggono comunque. Il salvataggio precedente resta in `.prec` e viene
+# letto se il principale e' danneggiato.
+# Uso: python stato.py mostra [file] | python stato.py verifica [file]
+
+import os
+import struct
+import sys
+import zlib
+from collections import deque
+
+from statistiche import CHIAVI_DATA, DIMENSIONE_FINESTRA, INDICE_CATEGORIA
+from valutatore import CATEGORIE
+
+MAGIA = b'PKMS'
+VERSIONE_FORMATO = 1
+INTESTAZIONE = struct.Struct('<4sBcxxII')
+NOMI = struct.Struct('<H')
+MANO_FINESTRA = struct.Struct('<Bqqq') # indice in CATEGORIE, puntata, vinte, perse
+TESTO_CATEGORIE = "\n".join(CATEGORIE).encode('utf-8')
+NULLO = -1 << 63 # None nei campi interi (date mai avvenute)
+SUFFISSO_PRECEDENTE = '.prec'
+CARTELLA_GIOCATORI = 'giocatori' # Un <nome>.stato per giocatore del server (server.py, classifiche.py)
+SCALARI = (
+	'versione_schema', 'launches', 'mani_giocate', 'mani_pagate', 'data_ultimo_fallimento',
+	'record_mani_senza_fallimenti', 'mani_dall_ultimo_fallimento', 'fiches_guadagnate',
+	'fiches_perdute', 'fiches_attuali', 'fallimenti', 'killer_hand_count', 'vincita_massima',
+	'data_vincita_massima', 'perdita_massima', 'data_perdita_massima', 'data_ultima_giocata', 'seq_diario'
+)
+CAMPI_AGGREGATI = ('mani', 'pagate', 'puntate', 'vinte', 'perse')
+AGGREGATI = ('aggregati_kh', 'aggregati_finestra')
+CHIAVI = frozenset(SCALARI + AGGREGATI + ('punteggi', 'ultime_mani'))
+_CATEGORIE_LETTE = {} # Testo delle categorie del file -> (nomi, conversione): di solito sempre lo stesso
+
+# --- Codifica ---
+def _intero(valore):
+	if type(valore) is not int:
+		raise TypeError(valore)
+	return valore
+
+def _data(valore):
+	return NULLO if valore is None else _intero(valore)
+
+def _codifica_schema(dati):
+	# ValueError/TypeError/KeyError/struct.error se i dati escono dallo schema
+	if len(dati) != len(CHIAVI) or not CHIAVI.issuperset(dati):
+		raise ValueError("chiavi fuori schema")
+	valori = [_data(dati[chiave]) if chiave in CHIAVI_DATA else _intero(dati[chiave]) for chiave in SCALARI]
+	punteggi = dati['punteggi']
+	if len(punteggi) != len(CATEGORIE):
+		raise ValueError("punteggi fuori schema")
+	for nome in CATEGORIE:
+		info = punteggi[nome]
+		if len(info) != 2:
+			raise ValueError("punteggio fuori schema")
+		valori.append(_intero(info['conteggio']))
+		valori.append(_data(info['ultima_realizzazione']))
+	for chiave in AGGREGATI:
+		aggregati = dati[chiave]
+		if len(aggregati) != len(CAMPI_AGGREGATI) + 1 or not INDICE_CATEGORIA.keys() >= aggregati['punteggi'].keys():
+			raise ValueError("aggregati fuori schema")
+		valori.extend(_intero(aggregati[campo]) for campo in CAMPI_AGGREGATI)
+		valori.extend(_intero(aggregati['punteggi'].get(nome, 0)) for nome in CATEGORIE)
+	finestra = dati['ultime_mani']
+	if getattr(finestra, 'maxlen', None) != DIMENSIONE_FINESTRA:
+		raise ValueError("finestra fuori schema")
+	valori.append(len(finestra))
+	for voce in finestra:
+		valori.extend(voce)
+	formato = f'<{len(valori) - 4 * len(finestra)}q' + MANO_FINESTRA.format[1:] * len(finestra)
+	return NOMI.pack(len(TESTO_CATEGORIE)) + TESTO_CATEGORIE + struct.pack(formato, *valori)
+
+# JSON solo per i salvataggi fuori schema: importato quando serve, non all'avvio
+def _codifica_json(dati):
+	import json
+	def converti(valore):
+		if isinstance(valore, deque):
+			return list(valore)
+		raise TypeError(f"Valore non salvabile: {valore!r}")
+	return json.dumps(dati, separators=(',', ':'), default=converti).encode('utf-8')
+
+def codifica_stato(dati):
+	# Byte del file: schema compatto se possibile, altrimenti JSON
+	try:
+		codifica, contenuto = b'S', _codifica_schema(dati)
+	except (ValueError, TypeError, KeyError, struct.error):
+		codifica, contenuto = b'J', _codifica_json(dati)
+	return INTESTAZIONE.pack(MAGIA, VERSIONE_FORMATO, codifica, len(contenuto), zlib.crc32(contenuto)) + contenuto
+
+# --- Decodifica ---
+def _categorie_del_file(testo):
+	# Nomi delle categorie scritti nel file e, se non sono quelli di CATEGORIE,
+	# la conversione degli indici della finestra (ValueError per nomi sconosciuti)
+	nomi = tuple(testo.decode('utf-8').split("\n"))
+	if nomi == CATEGORIE:
+		return nomi, None
+	sconosciuti = [nome for nome in nomi if nome not in INDICE_CATEGORIA]
+	if sconosciuti:
+		raise ValueError(f"categorie sconosciute: {', '.join(sconosciuti)}")
+	return nomi, tuple(INDICE_CATEGORIA[nome] for nome in nomi)
+
+def _decodifica_schema(contenuto, inizio, completo=True, fine=None):
+	# contenuto: il file intero, il corpo parte da `inizio` (nessuna copia).
+	# completo=False: solo scalari e punteggi (contenuto puo' fermarsi li'; `fine`
+	# e' la lunghezza del file intero, per il controllo sulla finestra)
+	(lunghezza,) = NOMI.unpack_from(contenuto, inizio)
+	testo = contenuto[inizio + NOMI.size:inizio + NOMI.size + lunghezza]
+	if testo not in _CATEGORIE_LETTE:
+		_CATEGORIE_LETTE[testo] = _categorie_del_file(testo)
+	nomi, conversione = _CATEGORIE_LETTE[testo]
+	inizio += NOMI.size + lunghezza
+	numero = len(nomi)
+	fissi = len(SCALARI) + 2 * numero + len(AGGREGATI) * (len(CAMPI_AGGREGATI) + numero) + 1
+	valori = struct.unpack_from(f'<{fissi}q', contenuto, inizio)
+	dati = dict(zip(SCALARI, valori))
+	for chiave in CHIAVI_DATA: # Solo le date possono essere None
+		if dati[chiave] == NULLO:
+			dati[chiave] = None
+	posizione = len(SCALARI) + 2 * numero
+	dati['punteggi'] = {nome: {'conteggio': conteggio, 'ultima_realizzazione': None if ultima == NULLO else ultima}
+		for nome, conteggio, ultima in zip(nomi, valori[len(SCALARI):posizione:2], valori[len(SCALARI) + 1:posizione:2])}
+	if (len(contenuto) if fine is None else fine) - inizio - 8 * fissi != valori[-1] * MANO_FINESTRA.size:
+		raise ValueError("lunghezza della finestra errata")
+	if not completo:
+		return dati
+	for chiave in AGGREGATI:
+		aggregati = dict(zip(CAMPI_AGGREGATI, valori[posizione:posizione + len(CAMPI_AGGREGATI)]))
+		posizione += len(CAMPI_AGGREGATI)
+		aggregati['punteggi'] = dict(zip(nomi, valori[posizione:posizione + numero]))
+		posizione += numero
+		dati[chiave] = aggregati
+	inizio += 8 * fissi
+	finestra = MANO_FINESTRA.iter_unpack(memoryview(contenuto)[inizio:])
+	if conversione is not None:
+		finestra = [(conversione[categoria], puntata, vinte, perse) for categoria, puntata, vinte, perse in finestra]
+	dati['ultime_mani'] = deque(finestra, maxlen=DIMENSIONE_FINESTRA)
+	return dati
+
+def _decodifica_json(contenuto):
+	import json
+	dati = json.loads(contenuto)
+	if 'ultime_mani' in dati:
+		dati['ultime_mani'] = deque(map(tuple, dati['ultime_mani']), maxlen=DIMENSIONE_FINESTRA)
+	return dati
+
+def decodifica_stato(contenuto):
+	# ValueError se il file non e' valido: magia, versione, lunghezza o checksum
+	if len(contenuto) < INTESTAZIONE.size:
+		raise ValueError("file troncato")
+	magia, versione, codifica, lunghezza, crc = INTESTAZIONE.unpack_from(contenuto)
+	if magia != MAGIA:
+		raise ValueError("non e' un file di stato della Poker Machine")
+	if versione > VERSIONE_FORMATO:
+		raise ValueError(f"formato versione {versione}, piu' recente di questo programma ({VERSIONE_FORMATO})")
+	corpo = memoryview(contenuto)[INTESTAZIONE.size:]
+	if len(corpo) != lunghezza:
+		raise ValueError(f"lunghezza {len(corpo)} invece di {lunghezza} (file troncato)")
+	if zlib.crc32(corpo) != crc:
+		raise ValueError("checksum errato (file danneggiato)")
+	try:
+		if codifica == b'S':
+			return _decodifica_schema(contenuto, INTESTAZIONE.size)
+		if codifica == b'J':
+			return _decodifica_json(bytes(corpo))
+	except (struct.error, UnicodeDecodeError, IndexError) as e:
+		raise ValueError(f"contenuto non valido: {e}") from e
+	raise ValueError(f"codifica sconosciuta: {codifica!r}")
+
+def _prefisso_schema(corpo):
+	# Byte del corpo 'S' fino alla fine degli interi fissi (None se corpo e' troppo corto per saperlo)
+	if len(corpo) < NOMI.size:
+		return None
+	(lunghezza,) = NOMI.unpack_from(corpo)
+	if len(corpo) < NOMI.size + lunghezza:
+		return None
+	numero = corpo[NOMI.size:NOMI.size + lunghezza].count(b"\n") + 1
+	return NOMI.size + lunghezza + 8 * (len(SCALARI) + 2 * numero + len(AGGREGATI) * (len(CAMPI_AGGREGATI) + numero) + 1)
+
+def leggi_riepilogo(percorso, blocco=1 << 16):
+	# Scalari e punteggi di un file di stato, senza aggregati ne' finestra mobile:
+	# il file si legge a blocchi, il CRC si calcola mentre si legge e si decodifica
+	# solo l'inizio del corpo. Stessi ValueError di decodifica_stato.
+	with open(percorso, 'rb') as f:
+		testa = f.read(INTESTAZIONE.size)
+		if len(testa) < INTESTAZIONE.size:
+			raise ValueError("file troncato")
+		magia, versione, codifica, lunghezza, crc_atteso = INTESTAZIONE.unpack(testa)
+		if magia != MAGIA:
+			raise ValueError("non e' un file di stato della Poker Machine")
+		if versione > VERSIONE_FORMATO:
+			raise ValueError(f"formato versione {versione}, piu' recente di questo programma ({VERSIONE_FORMATO})")
+		inizio = b''
+		crc = letti = 0
+		while True:
+			parte = f.read(blocco)
+			if not parte:
+				break
+			crc = zlib.crc32(parte, crc)
+			letti += len(parte)
+			if codifica != b'S' or len(inizio) < (_prefisso_schema(inizio) or len(inizio) + 1):
+				inizio += parte # 'J' si decodifica tutto; 'S' solo fino agli interi fissi
+	if letti != lunghezza:
+		raise ValueError(f"lunghezza {letti} invece di {lunghezza} (file troncato)")
+	if crc != crc_atteso:
+		raise ValueError("checksum errato (file danneggiato)")
+	try:
+		if codifica == b'S':
+			return _decodifica_schema(inizio, 0, completo=False, fine=lunghezza)
+		if codifica == b'J':
+			dati = _decodifica_json(inizio)
+			return {chiave: valore for chiave, valore in dati.items() if chiave not in ('ultime_mani',) + AGGREGATI}
+	except (struct.error, UnicodeDecodeError, IndexError) as e:
+		raise ValueError(f"contenuto non valido: {e}") from e
+	raise ValueError(f"codifica sconosciuta: {codifica!r}")
+
+# --- File ---
+def sincronizza_cartella(percorso):
+	# Rende persistente la rinomina (POSIX); dove le cartelle non si aprono non serve
+	try:
+		descrittore = os.open(os.path.dirname(os.path.abspath(percorso)), os.O_RDONLY)
+	except OSError:
+		return
+	try:
+		os.fsync(descrittore)
+	except OSError:
+		pass
+	finally:
+		os.close(descrittore)
+
+def scrivi_stato(percorso, contenuto, sincronizza=True):
+	# contenuto: byte di codifica_stato. Il file principale c'e' sempre ed e' completo:
+	# prima il temporaneo su disco, poi .prec diventa un hard link al vecchio (una copia
+	# dove i link non si possono fare) e infine il nuovo sostituisce il vecchio con un
+	# solo os.replace. Un crash in qualsiasi punto lascia il vecchio o il nuovo.
+	temporaneo = percorso + '.tmp'
+	with open(temporaneo, 'wb') as f:
+		f.write(contenuto)
+		if sincronizza:
+			f.flush()
+			os.fsync(f.fileno())
+	precedente = percorso + SUFFISSO_PRECEDENTE
+	collegamento = precedente + '.tmp'
+	if os.path.lexists(collegamento):
+		os.remove(collegamento)
+	try:
+		try:
+			os.link(percorso, collegamento)
+		except FileNotFoundError:
+			raise
+		except OSError:
+			import shutil # Solo dove i link non si possono fare: all'avvio costerebbe fnmatch e re
+			shutil.copyfile(percorso, collegamento)
+	except FileNotFoundError:
+		collegamento = None # Primo salvataggio: nessun precedente
+	if collegamento is not None:
+		os.replace(collegamento, precedente)
+	os.replace(temporaneo, percorso)
+	if sincronizza:
+		sincronizza_cartella(percorso)
+
+def leggi_stato(percorso):
+	# dati, o None se non c'e' nessun salvataggio. Un principale danneggiato o
+	# assente (rovinato o cancellato fuori dal gioco) lascia il posto al precedente.
+	avvisi = []
+	danneggiato = False
+	for candidato in (percorso, percorso + SUFFISSO_PRECEDENTE):
+		try:
+			with open(candidato, 'rb') as f:
+				contenuto = f.read()
+		except FileNotFoundError:
+			avvisi.append(f"{candidato}: mancante")
+			continue
+		try:
+			dati = decodifica_stato(contenuto)
+		except ValueError as e:
+			avvisi.append(f"{candidato}: {e}")
+			danneggiato = True
+			continue
+		for avviso in avvisi:
+			print(f"Attenzione, salvataggio non leggibile ({avviso}): uso {candidato}.")
+		return dati
+	if danneggiato:
+		raise ValueError("; ".join(avvisi))
+	return None
+
+def main():
+	if len(sys.argv) < 2 or sys.argv[1] not in ('mostra', 'verifica'):
+		print("Uso: python stato.py mostra [file] | python stato.py verifica [file]")
+		sys.exit(2)
+	from pokermachine import FILE_DATI
+	percorso = sys.argv[2] if len(sys.argv) > 2 else FILE_DATI
+	try:
+		with open(percorso, 'rb') as f:
+			contenuto = f.read()
+	except FileNotFoundError:
+		print(f"{percorso}: file non trovato")
+		sys.exit(1)
+	except OSError as e:
+		print(f"{percorso}: impossibile leggere il file ({e.strerror or e})")
+		sys.exit(1)
+	try:
+		dati = decodifica_stato(contenuto)
+	except ValueError as e:
+		print(f"{percorso}: {e}")
+		sys.exit(1)
+	if sys.argv[1] == 'mostra':
+		print(_codifica_json(dati).decode('utf-8'))
+	else:
+		codifica = INTESTAZIONE.unpack_from(contenuto)[2].decode()
+		print(f"{percorso}: valido, formato {VERSIONE_FORMATO} codifica {codifica}, {len(contenuto)} byte, "
+			f"schema dati {dati.get('versione_schema')}, {dati.get('mani_giocate')} mani")
+
+if __name__ == "__main__":
+	main()
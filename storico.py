@@ -0,0 +1,229 @@
+# STORICO - Archivio compatto delle singole mani, un record fisso da 16 byte
+# Layout del record (little endian, struct '<QIi'):
+#   Q bit  0-28  mano iniziale (5 codici in base 52, ordine di mano_ordinata)
+#     bit 29-57  mano finale (5 codici in base 52, ordine di gioco)
+#     bit 58-62  maschera di tenuta (bit i = carta i della mano iniziale tenuta)
+#     bit 63     Killer Hand
+#   I            puntata
+#   i            risultato netto sul saldo (negativo in caso di perdita)
+# La lettura usa mmap e struct.iter_unpack: nessuna lista di oggetti in memoria.
+# Uso: python storico.py report [file] | python storico.py esporta file.npz [file]
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from regole import PUNTEGGI_PER_VINCITA
+from valutatore import CATEGORIE, NUM_CODICI, valuta_indice
+
+FILE_STORICO = 'pokermachine_storico.bin'
+FORMATO = struct.Struct('<QIi')
+DIMENSIONE_RECORD = FORMATO.size # 16
+BIT_MANO = 29
+MASCHERA_MANO = (1 << BIT_MANO) - 1
+INDICE_COPPIA_PAGATA = CATEGORIE.index("Coppia pagata")
+
+def impacchetta_mano(codici):
+	valore = 0
+	for c in reversed(codici):
+		valore = valore * NUM_CODICI + c
+	return valore
+
+def spacchetta_mano(valore):
+	codici = []
+	for _ in range(5):
+		valore, c = divmod(valore, NUM_CODICI)
+		codici.append(c)
+	return codici
+
+def codifica_record(iniziale, maschera, finale, puntata, killer, netto):
+	carte = impacchetta_mano(iniziale) | impacchetta_mano(finale) << BIT_MANO | maschera << 58 | int(bool(killer)) << 63
+	return FORMATO.pack(carte, puntata, netto)
+
+def decodifica_record(carte, puntata, netto):
+	return {
+		'iniziale': spacchetta_mano(carte & MASCHERA_MANO),
+		'finale': spacchetta_mano(carte >> BIT_MANO & MASCHERA_MANO),
+		'maschera': carte >> 58 & 0x1F,
+		'killer': bool(carte >> 63),
+		'puntata': puntata,
+		'netto': netto
+	}
+
+class Storico:
+	# Scrittura in append; il file resta aperto per tutta la sessione
+	def __init__(self, percorso=FILE_STORICO):
+		self.percorso = percorso
+		self._file = None
+
+	def aggiungi(self, iniziale, maschera, finale, puntata, killer, netto):
+		if self._file is None:
+			self._file = open(self.percorso, 'ab')
+		self._file.write(codifica_record(iniziale, maschera, finale, puntata, killer, netto))
+		self._file.flush()
+
+	def chiudi(self):
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+class LettoreStorico:
+	# Accesso in sola lettura via mmap; un eventuale record finale incompleto e' ignorato
+	def __init__(self, percorso=FILE_STORICO):
+		self.percorso = percorso
+		self._file = open(percorso, 'rb')
+		dimensione = os.fstat(self._file.fileno()).st_size
+		self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if dimensione else None
+		self._vista = memoryview(self._mmap)[:dimensione - dimensione % DIMENSIONE_RECORD] if self._mmap else memoryview(b'')
+
+	def __len__(self):
+		return len(self._vista) // DIMENSIONE_RECORD
+
+	def __getitem__(self, indice):
+		if indice < 0:
+			indice += len(self)
+		if not 0 <= indice < len(self):
+			raise IndexError(indice)
+		return decodifica_record(*FORMATO.unpack_from(self._vista, indice * DIMENSIONE_RECORD))
+
+	def record_grezzi(self):
+		# Tuple (carte, puntata, netto) lette direttamente dalla mappa
+		return FORMATO.iter_unpack(self._vista)
+
+	def colonne(self):
+		# Colonne per l'analisi vettoriale: array NumPy se disponibile, altrimenti array.array
+		try:
+			import numpy as np
+		except ImportError:
+			np = None
+		if np is not None:
+			grezzi = np.frombuffer(self._vista, dtype=np.dtype([('carte', '<u8'), ('puntata', '<u4'), ('netto', '<i4')]))
+			carte = grezzi['carte']
+			iniziale = (carte & MASCHERA_MANO).astype(np.int64)
+			finale = (carte >> BIT_MANO & MASCHERA_MANO).astype(np.int64)
+			return {
+				'iniziale': np.stack([iniziale // NUM_CODICI ** i % NUM_CODICI for i in range(5)], axis=1).astype(np.uint8),
+				'finale': np.stack([finale // NUM_CODICI ** i % NUM_CODICI for i in range(5)], axis=1).astype(np.uint8),
+				'maschera': (carte >> 58 & 0x1F).astype(np.uint8),
+				'killer': (carte >> 63).astype(bool),
+				'puntata': grezzi['puntata'].copy(),
+				'netto': grezzi['netto'].copy()
+			}
+		colonne = {'iniziale': array('B'), 'finale': array('B'), 'maschera': array('B'),
+			'killer': array('B'), 'puntata': array('I'), 'netto': array('i')}
+		for carte, puntata, netto in self.record_grezzi():
+			colonne['iniziale'].extend(spacchetta_mano(carte & MASCHERA_MANO))
+			colonne['finale'].extend(spacchetta_mano(carte >> BIT_MANO & MASCHERA_MANO))
+			colonne['maschera'].append(carte >> 58 & 0x1F)
+			colonne['killer'].append(carte >> 63)
+			colonne['puntata'].append(puntata)
+			colonne['netto'].append(netto)
+		return colonne
+
+	def chiudi(self):
+		self._vista.release()
+		if self._mmap is not None:
+			self._mmap.close()
+		self._file.close()
+
+def _riepilogo_vettoriale(lettore, valuta_batch):
+	import numpy as np
+	colonne = lettore.colonne()
+	netto = colonne['netto'].astype('int64')
+	mani = len(netto)
+	conteggi = [int(x) for x in np.bincount(valuta_batch(colonne['finale']), minlength=len(CATEGORIE))]
+	vinte = netto.clip(min=0) * (1 + 2 * colonne['killer']) # il bonus KH raddoppia la vincita netta
+	perse = (-netto).clip(min=0)
+	media = float(netto.mean()) if mani else 0.0
+	return {
+		'mani_giocate': mani,
+		'fiches_guadagnate': int(vinte.sum()),
+		'fiches_perdute': int(perse.sum()),
+		'vincita_massima': int(vinte.max()) if mani else 0,
+		'perdita_massima': int(perse.max()) if mani else 0,
+		'mani_pagate': sum(conteggi[INDICE_COPPIA_PAGATA:]),
+		'netto_medio': media,
+		'varianza_netto': float(netto.var()) if mani else 0.0,
+		'punteggi': dict(zip(CATEGORIE, conteggi))
+	}
+
+def riepilogo_storico(percorso=FILE_STORICO):
+	# Le stesse grandezze di mostra_report, calcolate sui record senza creare
+	# oggetti per mano: in blocco con NumPy se disponibile, altrimenti in streaming.
+	lettore = LettoreStorico(percorso)
+	try:
+		from valutatore_vettoriale import valuta_batch
+	except ImportError:
+		valuta_batch = None
+	if valuta_batch is not None:
+		try:
+			return _riepilogo_vettoriale(lettore, valuta_batch)
+		finally:
+			lettore.chiudi()
+	try:
+		conteggi = [0] * len(CATEGORIE)
+		mani = guadagnate = perdute = vincita_massima = perdita_massima = 0
+		somma_netto = somma_quadrati = 0
+		for carte, puntata, netto in lettore.record_grezzi():
+			finale = carte >> BIT_MANO & MASCHERA_MANO
+			codici = []
+			for _ in range(5):
+				finale, c = divmod(finale, NUM_CODICI)
+				codici.append(c)
+			conteggi[valuta_indice(codici)] += 1
+			mani += 1
+			somma_netto += netto
+			somma_quadrati += netto * netto
+			if netto < 0:
+				perdute -= netto
+				perdita_massima = max(perdita_massima, -netto)
+			else:
+				vinte = netto * 3 if carte >> 63 else netto # il bonus KH raddoppia la vincita netta
+				guadagnate += vinte
+				vincita_massima = max(vincita_massima, vinte)
+	finally:
+		lettore.chiudi()
+	media = somma_netto / mani if mani else 0.0
+	return {
+		'mani_giocate': mani,
+		'fiches_guadagnate': guadagnate,
+		'fiches_perdute': perdute,
+		'vincita_massima': vincita_massima,
+		'perdita_massima': perdita_massima,
+		'mani_pagate': sum(conteggi[INDICE_COPPIA_PAGATA:]),
+		'netto_medio': media,
+		'varianza_netto': somma_quadrati / mani - media * media if mani else 0.0,
+		'punteggi': dict(zip(CATEGORIE, conteggi))
+	}
+
+def mostra_riepilogo_storico(percorso=FILE_STORICO):
+	r = riepilogo_storico(percorso)
+	mani = r['mani_giocate']
+	print("\n== Report dallo Storico Mani ==")
+	print(f"Mani registrate: {mani}")
+	print(f"Fiches guadagnate: {r['fiches_guadagnate']} | perdute: {r['fiches_perdute']}")
+	print(f"Vincita massima: {r['vincita_massima']} | Perdita massima: {r['perdita_massima']}")
+	if mani:
+		print(f"Percentuale mani pagate (Coppia Pagata+): {r['mani_pagate'] / mani * 100:.2f}% ({r['mani_pagate']} su {mani})")
+		print(f"Risultato netto per mano: media {r['netto_medio']:.2f}, varianza {r['varianza_netto']:.2f}")
+	for nome in PUNTEGGI_PER_VINCITA:
+		print(f"- {nome}: {r['punteggi'][nome]} volte")
+	print("===============================")
+
+def esporta_colonne(percorso_npz, percorso=FILE_STORICO):
+	import numpy as np
+	lettore = LettoreStorico(percorso)
+	try:
+		np.savez_compressed(percorso_npz, **lettore.colonne())
+	finally:
+		lettore.chiudi()
+
+if __name__ == "__main__":
+	if len(sys.argv) >= 2 and sys.argv[1] == 'report':
+		mostra_riepilogo_storico(sys.argv[2] if len(sys.argv) > 2 else FILE_STORICO)
+	elif len(sys.argv) >= 3 and sys.argv[1] == 'esporta':
+		esporta_colonne(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else FILE_STORICO)
+	else:
+		print("Uso: python storico.py report [file] | python storico.py esporta file.npz [file]")
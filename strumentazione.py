@@ -0,0 +1,237 @@
+# STRUMENTAZIONE - Contatori e tempi delle fasi di gioco, profilo su richiesta
+# Disattivata per default. Si accende con POKERMACHINE_STRUMENTAZIONE=1 o col
+# comando !t al prompt della puntata. Il giro di poker_machine() legge `attiva`
+# una volta per mano: da spenta ogni punto di misura costa un test su una
+# variabile locale. Le funzioni di salvataggio e report sono avvolte da
+# @strumentato, che da spento aggiunge una sola chiamata. Il gioco importa questo
+# modulo solo quando la strumentazione serve (vedi misure.py).
+# - segna(fase): il tempo dal segno precedente va a `fase` (le fasi di una mano
+#   sono consecutive, quindi la loro somma e' il tempo della mano)
+# - @strumentato(nome): tempo di ogni chiamata della funzione
+# - metriche in formato testo Prometheus (POKERMACHINE_METRICHE, default
+#   pokermachine_metriche.prom), scritte col comando !s e all'uscita
+# - profilo delle prossime N mani con cProfile (!p N) o a campionamento con
+#   SIGPROF (!c N, dove esiste setitimer), salvato su file e riassunto a video
+
+import os
+import time
+from functools import wraps
+
+from misure import attiva_da_ambiente
+
+FILE_METRICHE = os.environ.get('POKERMACHINE_METRICHE', 'pokermachine_metriche.prom')
+FILE_PROFILO = 'pokermachine_profilo.pstats'
+FILE_CAMPIONI = 'pokermachine_campioni.txt' # Pile compresse "a;b;c conteggio" (flamegraph)
+INTERVALLO_CAMPIONI = 0.001 # Secondi di CPU tra due campioni
+MANI_PROFILO = 20
+RIGHE_RIASSUNTO = 15
+AIUTO = [
+	"Comandi di strumentazione (al prompt della puntata):",
+	"  !s   : Tempi per fase e per funzione, e scrive il file delle metriche",
+	"  !t   : Attiva/disattiva contatori e tempi",
+	f"  !p N : Profilo cProfile delle prossime N mani (default {MANI_PROFILO})",
+	f"  !c N : Profilo a campionamento delle prossime N mani (default {MANI_PROFILO})",
+	"  !z   : Azzera contatori e tempi",
+]
+
+class Strumentazione:
+	def __init__(self, attiva=False):
+		self.contatori = attiva # Tempi e contatori richiesti
+		self.attiva = attiva # contatori o profilo in corso: l'unico flag letto dal gioco
+		self.azzera()
+		self.profilo = None
+		self.campioni = None
+		self.mani_profilo = 0
+
+	def azzera(self):
+		self.mani = 0
+		self.voci = {} # (tipo, nome) -> [chiamate, secondi totali, secondi massimi]
+		self.ultimo = time.perf_counter()
+
+	def _aggiorna(self):
+		self.attiva = self.contatori or self.mani_profilo > 0
+
+	# --- Misure ---
+	def registra(self, tipo, nome, durata):
+		voce = self.voci.get((tipo, nome))
+		if voce is None:
+			voce = self.voci[tipo, nome] = [0, 0.0, 0.0]
+		voce[0] += 1
+		voce[1] += durata
+		if durata > voce[2]:
+			voce[2] = durata
+
+	def riparti(self):
+		self.ultimo = time.perf_counter()
+
+	def segna(self, fase):
+		adesso = time.perf_counter()
+		if self.contatori:
+			self.registra('fase', fase, adesso - self.ultimo)
+		self.ultimo = adesso
+
+	def fine_mano(self):
+		if self.contatori:
+			self.mani += 1
+		if self.mani_profilo > 0:
+			self.mani_profilo -= 1
+			if not self.mani_profilo:
+				for riga in self.ferma_profilo():
+					print(riga)
+
+	# --- Profilo ---
+	def avvia_profilo(self, mani=MANI_PROFILO, campionamento=False):
+		if self.mani_profilo:
+			return ["Un profilo e' gia' in corso."]
+		if campionamento:
+			import signal
+			if not hasattr(signal, 'setitimer'):
+				return ["Il campionamento richiede setitimer (non disponibile su questo sistema): usa !p."]
+			self.campioni = {}
+			signal.signal(signal.SIGPROF, self._campiona)
+			signal.setitimer(signal.ITIMER_PROF, INTERVALLO_CAMPIONI, INTERVALLO_CAMPIONI)
+		else:
+			import cProfile
+			self.profilo = cProfile.Profile()
+			self.profilo.enable()
+		self.mani_profilo = mani
+		self._aggiorna()
+		return [f"Profilo {'a campionamento' if campionamento else 'cProfile'} delle prossime {mani} mani."]
+
+	def _campiona(self, segnale, frame):
+		pila = []
+		while frame is not None:
+			pila.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+			frame = frame.f_back
+		chiave = ";".join(reversed(pila))
+		self.campioni[chiave] = self.campioni.get(chiave, 0) + 1
+
+	def ferma_profilo(self):
+		righe = []
+		if self.profilo is not None:
+			self.profilo.disable() # Prima degli import, che altrimenti finirebbero nel profilo
+			import io
+			import pstats
+			self.profilo.dump_stats(FILE_PROFILO)
+			testo = io.StringIO()
+			pstats.Stats(self.profilo, stream=testo).sort_stats('cumulative').print_stats(RIGHE_RIASSUNTO)
+			righe = [f"Profilo salvato in {FILE_PROFILO} (python -m pstats {FILE_PROFILO})", testo.getvalue()]
+			self.profilo = None
+		elif self.campioni is not None:
+			import signal
+			signal.setitimer(signal.ITIMER_PROF, 0, 0)
+			signal.signal(signal.SIGPROF, signal.SIG_DFL)
+			campioni, self.campioni = self.campioni, None
+			with open(FILE_CAMPIONI, 'w', encoding='utf-8') as f:
+				for pila, conteggio in sorted(campioni.items()):
+					f.write(f"{pila} {conteggio}\n")
+			totale = sum(campioni.values())
+			if not totale:
+				righe = [f"Nessun campione (uno ogni {INTERVALLO_CAMPIONI * 1e3:g} ms di CPU): profila piu' mani."]
+			else:
+				proprio = {}
+				for pila, conteggio in campioni.items():
+					funzione = pila.rsplit(';', 1)[-1]
+					proprio[funzione] = proprio.get(funzione, 0) + conteggio
+				righe = [f"{totale} campioni salvati in {FILE_CAMPIONI}. Funzioni con piu' campioni propri:"]
+				for funzione, conteggio in sorted(proprio.items(), key=lambda voce: -voce[1])[:RIGHE_RIASSUNTO]:
+					righe.append(f"{conteggio / totale * 100:6.1f}% {funzione}")
+		self.mani_profilo = 0
+		self._aggiorna()
+		return righe
+
+	# --- Esportazione ---
+	def righe_riepilogo(self):
+		if not self.voci:
+			return ["Nessuna misura (strumentazione " + ("attiva" if self.contatori else "disattivata, attivala con !t") + ")."]
+		righe = [f"Mani misurate: {self.mani}",
+			f"{'tipo':<9}{'nome':<22}{'chiamate':>9}{'totale ms':>11}{'media us':>11}{'max us':>11}{'quota':>8}"]
+		for tipo in ('fase', 'funzione'):
+			voci = sorted(((nome, v) for (t, nome), v in self.voci.items() if t == tipo), key=lambda voce: -voce[1][1])
+			totale = sum(v[1] for _, v in voci) or 1.0
+			for nome, (chiamate, secondi, massimo) in voci:
+				quota = f"{secondi / totale * 100:7.1f}%" if tipo == 'fase' else ""
+				righe.append(f"{tipo:<9}{nome:<22}{chiamate:>9}{secondi * 1e3:>11.2f}"
+					f"{secondi / chiamate * 1e6:>11.1f}{massimo * 1e6:>11.1f}{quota:>8}")
+		return righe
+
+	def testo_prometheus(self):
+		righe = [
+			"# HELP pokermachine_mani_totale Mani concluse con la strumentazione attiva.",
+			"# TYPE pokermachine_mani_totale counter",
+			f"pokermachine_mani_totale {self.mani}",
+		]
+		for tipo, descrizione in (('fase', "fase del giro di gioco"), ('funzione', "funzione strumentata")):
+			voci = sorted((nome, v) for (t, nome), v in self.voci.items() if t == tipo)
+			for metrica, indice, genere, testo in (
+					('chiamate_totale', 0, 'counter', "Chiamate"),
+					('secondi_totale', 1, 'counter', "Secondi spesi"),
+					('secondi_massimo', 2, 'gauge', "Durata massima di una chiamata")):
+				nome_metrica = f"pokermachine_{tipo}_{metrica}"
+				righe.append(f"# HELP {nome_metrica} {testo} per {descrizione}.")
+				righe.append(f"# TYPE {nome_metrica} {genere}")
+				for nome, valori in voci:
+					righe.append(f'{nome_metrica}{{{tipo}="{nome}"}} {valori[indice]:.9g}')
+		return "\n".join(righe) + "\n"
+
+	def scrivi_metriche(self, percorso=FILE_METRICHE):
+		# File temporaneo e os.replace: chi legge il file (es. node_exporter) non lo vede mai a meta'
+		temporaneo = percorso + '.tmp'
+		with open(temporaneo, 'w', encoding='utf-8') as f:
+			f.write(self.testo_prometheus())
+		os.replace(temporaneo, percorso)
+		return percorso
+
+	def chiudi(self):
+		# All'uscita dal gioco: chiude un profilo a meta' e scrive le metriche
+		for riga in self.ferma_profilo() if self.mani_profilo else ():
+			print(riga)
+		if self.voci:
+			try:
+				self.scrivi_metriche()
+			except OSError as e:
+				print(f"Metriche non scritte: {e}")
+
+	# --- Comandi dal prompt ---
+	def comando(self, testo):
+		# testo: quanto segue '!' al prompt della puntata. Ritorna le righe da mostrare.
+		parti = testo.split()
+		nome = parti[0] if parti else ''
+		if nome in ('p', 'c'):
+			mani = parti[1] if len(parti) > 1 else str(MANI_PROFILO)
+			if not mani.isdigit() or int(mani) < 1:
+				return [f"Numero di mani non valido: {mani}."]
+			return self.avvia_profilo(int(mani), campionamento=nome == 'c')
+		if nome == 's':
+			righe = self.righe_riepilogo()
+			if self.voci:
+				try:
+					righe.append(f"Metriche scritte in {self.scrivi_metriche()}")
+				except OSError as e:
+					righe.append(f"Metriche non scritte: {e}")
+			return righe
+		if nome == 't':
+			self.contatori = not self.contatori
+			self._aggiorna()
+			return [f"Strumentazione {'attivata' if self.contatori else 'disattivata'}."]
+		if nome == 'z':
+			self.azzera()
+			return ["Contatori azzerati."]
+		return AIUTO
+
+STRUMENTI = Strumentazione(attiva_da_ambiente())
+
+def strumentato(nome):
+	# Decoratore per funzioni chiamate di rado (salvataggio, caricamento, report)
+	def decora(funzione):
+		@wraps(funzione)
+		def avvolta(*args, **kwargs):
+			if not STRUMENTI.contatori:
+				return funzione(*args, **kwargs)
+			inizio = time.perf_counter()
+			try:
+				return funzione(*args, **kwargs)
+			finally:
+				STRUMENTI.registra('funzione', nome, time.perf_counter() - inizio)
+		return avvolta
+	return decora
@@ -0,0 +1,8 @@
+# I moduli stanno nella radice del repository; gli strumenti di riferimento
+# (es. il vecchio valutatore) in benchmarks/
+import os
+import sys
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RADICE, 'benchmarks'))
+sys.path.insert(0, RADICE)
@@ -0,0 +1,39 @@
+# Cache delle tenute in forma canonica contro il risolutore senza cache
+import random
+
+from cache_strategia import CacheStrategia, forma_canonica
+from risolutore import valuta_tenute
+from valutatore import NUM_CODICI, NUM_SEMI
+
+MANI = 25
+
+def permuta_semi(codici, permutazione):
+	return [c - c % NUM_SEMI + permutazione[c % NUM_SEMI] for c in codici]
+
+def mani_casuali(rng, numero=MANI):
+	return [[rng.randrange(NUM_CODICI) for _ in range(5)] for _ in range(numero)]
+
+def test_valore_atteso_come_il_risolutore():
+	rng = random.Random(2024)
+	cache = CacheStrategia()
+	for codici in mani_casuali(rng):
+		valori = valuta_tenute(codici)
+		maschera, valore = cache.tenuta_ottimale(codici)
+		assert abs(valore - max(valori)) < 1e-12, codici
+		assert abs(valori[maschera] - valore) < 1e-12, codici # La maschera riportata sulle posizioni originali
+
+def test_semi_permutati_e_carte_rimescolate_colpiscono_la_cache():
+	rng = random.Random(2025)
+	cache = CacheStrategia()
+	for codici in mani_casuali(rng, 10):
+		_, valore = cache.tenuta_ottimale(codici)
+		permutazione = list(range(NUM_SEMI))
+		rng.shuffle(permutazione)
+		variante = permuta_semi(codici, permutazione)
+		rng.shuffle(variante)
+		assert forma_canonica(variante)[0] == forma_canonica(codici)[0]
+		successi = cache.successi
+		maschera, valore_variante = cache.tenuta_ottimale(variante)
+		assert cache.successi == successi + 1
+		assert abs(valore_variante - valore) < 1e-12
+		assert abs(valuta_tenute(variante)[maschera] - valore) < 1e-12, variante
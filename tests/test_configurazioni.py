@@ -0,0 +1,23 @@
+# Valori della griglia di configurazioni: quelli non giocabili sono rifiutati prima della simulazione
+import pytest
+
+from griglia_configurazioni import assi_griglia, configurazioni
+from regole import CONFIGURAZIONE_PREDEFINITA, verifica_configurazione
+
+@pytest.mark.parametrize('opzione', [
+	'soglia_rimescolamento=3', 'soglia_rimescolamento=600', 'num_mazzi=0', 'num_mazzi=1.5',
+	'killer_hand_frequenza=0', 'max_penalita_kh=-5', 'percentuale_minima_puntata=0',
+	'percentuale_minima_puntata=1.5', 'Tris=-1',
+])
+def test_valori_non_giocabili(opzione):
+	with pytest.raises(ValueError, match=opzione.partition('=')[0]):
+		configurazioni(assi_griglia([opzione]))
+
+def test_soglia_oltre_le_carte_della_scarpa():
+	with pytest.raises(ValueError, match='num_mazzi=1, soglia_rimescolamento=60'):
+		configurazioni(assi_griglia(['num_mazzi=1', 'soglia_rimescolamento=60']))
+
+def test_valori_giocabili():
+	verifica_configurazione(CONFIGURAZIONE_PREDEFINITA)
+	griglia = configurazioni(assi_griglia(['num_mazzi=1,2', 'soglia_rimescolamento=10,52', 'percentuale_minima_puntata=1']))
+	assert len(griglia) == 4
@@ -0,0 +1,49 @@
+# Valutatore a tabelle contro l'implementazione classica (benchmarks/bench_valutatore.py)
+import random
+
+import pytest
+
+from bench_valutatore import carta_da_codice, valuta_mano_classica, verifica_equivalenza
+from regole import TABELLA_VINCITE
+from valutatore import CATEGORIE, INDICE_CATEGORIA, NUM_CODICI, codifica, valuta_codici, valuta_indice
+
+CUORI, QUADRI, FIORI, PICCHE = range(4)
+
+# Una mano nota per ogni voce della tabella vincite (valore 1 = asso)
+MANI_NOTE = {
+	"Carta alta": [(2, CUORI), (5, QUADRI), (9, FIORI), (11, PICCHE), (13, CUORI)],
+	"Coppia non pagata": [(10, CUORI), (10, QUADRI), (2, FIORI), (5, PICCHE), (7, CUORI)],
+	"Coppia pagata": [(1, CUORI), (1, PICCHE), (4, FIORI), (6, QUADRI), (9, CUORI)],
+	"Doppia coppia": [(3, CUORI), (3, FIORI), (8, QUADRI), (8, PICCHE), (12, CUORI)],
+	"Tris": [(7, CUORI), (7, QUADRI), (7, FIORI), (2, PICCHE), (12, CUORI)],
+	"Scala": [(1, CUORI), (2, QUADRI), (3, FIORI), (4, PICCHE), (5, CUORI)],
+	"Colore": [(2, FIORI), (6, FIORI), (9, FIORI), (11, FIORI), (13, FIORI)],
+	"Full": [(13, CUORI), (13, QUADRI), (13, FIORI), (4, PICCHE), (4, CUORI)],
+	"Poker": [(9, CUORI), (9, QUADRI), (9, FIORI), (9, PICCHE), (3, CUORI)],
+	"Super Poker": [(5, CUORI), (5, QUADRI), (5, FIORI), (5, PICCHE), (5, CUORI)], # Piu' mazzi
+	"Scala a colore": [(5, PICCHE), (6, PICCHE), (7, PICCHE), (8, PICCHE), (9, PICCHE)],
+	"Scala Reale": [(10, QUADRI), (11, QUADRI), (12, QUADRI), (13, QUADRI), (1, QUADRI)],
+}
+
+def test_tabella_vincite_e_categorie_coincidono():
+	assert list(TABELLA_VINCITE) == list(CATEGORIE)
+	assert set(MANI_NOTE) == set(TABELLA_VINCITE)
+
+@pytest.mark.parametrize("categoria", list(TABELLA_VINCITE))
+def test_mano_nota_per_categoria(categoria):
+	codici = [codifica(valore, seme) for valore, seme in MANI_NOTE[categoria]]
+	assert valuta_codici(codici) == categoria
+	assert valuta_indice(codici) == INDICE_CATEGORIA[categoria]
+	assert valuta_mano_classica([carta_da_codice(c) for c in codici]) == categoria
+
+def test_mani_casuali_come_il_valutatore_classico():
+	# Codici ripetuti ammessi: con piu' mazzi la stessa carta puo' uscire due volte
+	rng = random.Random(20251018)
+	for _ in range(20000):
+		codici = [rng.randrange(NUM_CODICI) for _ in range(5)]
+		attesa = valuta_mano_classica([carta_da_codice(c) for c in codici])
+		assert valuta_codici(codici) == attesa, codici
+		assert CATEGORIE[valuta_indice(codici)] == attesa, codici
+
+def test_ogni_multiinsieme_di_valori_con_e_senza_colore():
+	assert verifica_equivalenza(rapido=True) > 0
@@ -0,0 +1,116 @@
+# VALUTATORE - Valutazione delle mani tramite tabelle precalcolate
+# Le carte sono codificate come interi compatti: codice = (valore - 1) * 4 + seme
+# con valore 1..13 (Asso = 1) e seme 0..3. Con NUM_MAZZI mazzi la stessa carta
+# puo' comparire piu' volte nella mano: il codice resta lo stesso.
+
+from itertools import combinations_with_replacement
+
+NUM_VALORI = 13
+NUM_SEMI = 4
+NUM_CODICI = NUM_VALORI * NUM_SEMI
+# Categorie in ordine crescente di vincita (l'indice e' il codice categoria)
+CATEGORIE = (
+	"Carta alta",
+	"Coppia non pagata",
+	"Coppia pagata",
+	"Doppia coppia",
+	"Tris",
+	"Scala",
+	"Colore",
+	"Full",
+	"Poker",
+	"Super Poker",
+	"Scala a colore",
+	"Scala Reale"
+)
+INDICE_CATEGORIA = {nome: i for i, nome in enumerate(CATEGORIE)}
+# Un numero primo per ogni valore: il prodotto identifica il multiinsieme dei valori
+PRIMI = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+# Ranghi (indice 0..12 = valore 1..13) che formano una coppia pagata: J, Q, K, A
+RANGHI_COPPIA_PAGATA = frozenset((0, 10, 11, 12))
+SCALA_REALE = (0, 9, 10, 11, 12) # A, 10, J, Q, K
+
+def codifica(valore, seme):
+	return (valore - 1) * NUM_SEMI + seme % NUM_SEMI
+
+def _categoria_ranghi(ranghi, colore):
+	# ranghi: tupla ordinata di 5 indici 0..12. Stessa gerarchia di valuta_mano,
+	# decisa dal numero di valori distinti e dalle ripetizioni adiacenti.
+	a, b, c, d, e = ranghi
+	distinti = len(set(ranghi))
+	if distinti == 5:
+		is_scala = e - a == 4 or ranghi == SCALA_REALE
+		if is_scala and colore:
+			return INDICE_CATEGORIA["Scala Reale" if ranghi == SCALA_REALE else "Scala a colore"]
+		if colore:
+			return INDICE_CATEGORIA["Colore"]
+		return INDICE_CATEGORIA["Scala" if is_scala else "Carta alta"]
+	if distinti == 1:
+		return INDICE_CATEGORIA["Super Poker"]
+	if distinti == 2:
+		return INDICE_CATEGORIA["Poker" if a == d or b == e else "Full"]
+	if colore:
+		return INDICE_CATEGORIA["Colore"]
+	if distinti == 3:
+		return INDICE_CATEGORIA["Tris" if a == c or b == d or c == e else "Doppia coppia"]
+	# Una sola coppia: il valore ripetuto e' quello uguale al successivo
+	rango_coppia = a if a == b else b if b == c else c if c == d else d
+	if rango_coppia in RANGHI_COPPIA_PAGATA:
+		return INDICE_CATEGORIA["Coppia pagata"]
+	return INDICE_CATEGORIA["Coppia non pagata"]
+
+def _costruisci_tabelle():
+	# Una voce per ogni multiinsieme di 5 valori (6188), con e senza colore
+	tabella, tabella_colore = {}, {}
+	for ranghi in combinations_with_replacement(range(NUM_VALORI), 5):
+		a, b, c, d, e = ranghi
+		chiave = PRIMI[a] * PRIMI[b] * PRIMI[c] * PRIMI[d] * PRIMI[e]
+		tabella[chiave] = _categoria_ranghi(ranghi, False)
+		tabella_colore[chiave] = _categoria_ranghi(ranghi, True)
+	return tabella, tabella_colore
+
+# Le tabelle vengono riempite (sul posto) alla prima valutazione, non all'import:
+# l'avvio del gioco non paga la costruzione. Chi le legge direttamente chiama
+# prima prepara_tabelle().
+TABELLA_INDICI, TABELLA_INDICI_COLORE = {}, {}
+TABELLA_NOMI, TABELLA_NOMI_COLORE = {}, {}
+# Per codice carta: primo del valore e bit del seme
+PRIMO_CODICE = tuple(PRIMI[c // NUM_SEMI] for c in range(NUM_CODICI))
+BIT_SEME_CODICE = tuple(1 << (c % NUM_SEMI) for c in range(NUM_CODICI))
+
+def prepara_tabelle():
+	if TABELLA_INDICI:
+		return
+	tabella, tabella_colore = _costruisci_tabelle()
+	TABELLA_NOMI.update((k, CATEGORIE[v]) for k, v in tabella.items())
+	TABELLA_NOMI_COLORE.update((k, CATEGORIE[v]) for k, v in tabella_colore.items())
+	TABELLA_INDICI_COLORE.update(tabella_colore)
+	TABELLA_INDICI.update(tabella) # per ultima: segna le tabelle come pronte
+
+def valuta_codici(codici):
+	# Ritorna il nome della categoria per 5 codici carta
+	a, b, c, d, e = codici
+	chiave = PRIMO_CODICE[a] * PRIMO_CODICE[b] * PRIMO_CODICE[c] * PRIMO_CODICE[d] * PRIMO_CODICE[e]
+	try:
+		if BIT_SEME_CODICE[a] & BIT_SEME_CODICE[b] & BIT_SEME_CODICE[c] & BIT_SEME_CODICE[d] & BIT_SEME_CODICE[e]:
+			return TABELLA_NOMI_COLORE[chiave]
+		return TABELLA_NOMI[chiave]
+	except KeyError:
+		if TABELLA_INDICI:
+			raise
+		prepara_tabelle()
+		return valuta_codici(codici)
+
+def valuta_indice(codici):
+	# Come valuta_codici ma ritorna l'indice in CATEGORIE
+	a, b, c, d, e = codici
+	chiave = PRIMO_CODICE[a] * PRIMO_CODICE[b] * PRIMO_CODICE[c] * PRIMO_CODICE[d] * PRIMO_CODICE[e]
+	try:
+		if BIT_SEME_CODICE[a] & BIT_SEME_CODICE[b] & BIT_SEME_CODICE[c] & BIT_SEME_CODICE[d] & BIT_SEME_CODICE[e]:
+			return TABELLA_INDICI_COLORE[chiave]
+		return TABELLA_INDICI[chiave]
+	except KeyError:
+		if TABELLA_INDICI:
+			raise
+		prepara_tabelle()
+		return valuta_indice(codici)
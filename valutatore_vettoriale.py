@@ -0,0 +1,67 @@
+# VALUTATORE_VETTORIALE - Valutazione di milioni di mani in blocco con NumPy
+# Input: array (N, 5) di codici carta (vedi valutatore). Output: array di codici
+# categoria, cioe' indici in valutatore.CATEGORIE (e quindi nei punteggi).
+# I cinque valori, senza ordinarli, formano un indice in base 13 in una tabella
+# di 13^5 voci ricavata dalle tabelle di valutatore; il colore e' un confronto
+# vettoriale dei semi che sposta l'indice nella seconda meta' della tabella.
+
+import numpy as np
+
+from regole import TABELLA_VINCITE
+from valutatore import (
+	CATEGORIE, NUM_SEMI, NUM_VALORI, PRIMI, TABELLA_INDICI, TABELLA_INDICI_COLORE, prepara_tabelle
+)
+
+DIMENSIONE_BLOCCO = 1 << 16 # Righe per blocco: i temporanei restano in cache
+NUM_COMBINAZIONI = NUM_VALORI ** 5
+MOLTIPLICATORI = np.array([TABELLA_VINCITE[nome] for nome in CATEGORIE], dtype=np.int64)
+
+def _costruisci_tabella():
+	# Voce i (e NUM_COMBINAZIONI + i col colore) per ogni quintupla ordinata di valori
+	valori = np.indices((NUM_VALORI,) * 5).reshape(5, -1)
+	primi = np.array(PRIMI, dtype=np.int64)
+	prodotti = np.prod(primi[valori], axis=0)
+	chiavi = np.array(sorted(TABELLA_INDICI), dtype=np.int64)
+	posizioni = np.searchsorted(chiavi, prodotti)
+	senza_colore = np.array([TABELLA_INDICI[k] for k in chiavi.tolist()], dtype=np.uint8)
+	con_colore = np.array([TABELLA_INDICI_COLORE[k] for k in chiavi.tolist()], dtype=np.uint8)
+	return np.concatenate([senza_colore[posizioni], con_colore[posizioni]])
+
+prepara_tabelle()
+TABELLA = _costruisci_tabella()
+
+def _valuta_blocco(codici):
+	valori = (codici >> 2).astype(np.int32)
+	semi = codici & (NUM_SEMI - 1)
+	indice = valori[:, 0] * NUM_VALORI
+	indice += valori[:, 1]
+	indice *= NUM_VALORI
+	indice += valori[:, 2]
+	indice *= NUM_VALORI
+	indice += valori[:, 3]
+	indice *= NUM_VALORI
+	indice += valori[:, 4]
+	colore = semi[:, 0] == semi[:, 1]
+	colore &= semi[:, 1] == semi[:, 2]
+	colore &= semi[:, 2] == semi[:, 3]
+	colore &= semi[:, 3] == semi[:, 4]
+	indice += colore * NUM_COMBINAZIONI
+	return TABELLA[indice]
+
+def valuta_batch(codici, dimensione_blocco=DIMENSIONE_BLOCCO):
+	# codici: array-like (N, 5) di interi 0..51 -> array uint8 (N,) di codici categoria
+	codici = np.ascontiguousarray(codici, dtype=np.uint8)
+	if codici.ndim != 2 or codici.shape[1] != 5:
+		raise ValueError(f"Atteso un array (N, 5) di codici carta, ricevuto {codici.shape}")
+	risultato = np.empty(len(codici), dtype=np.uint8)
+	for inizio in range(0, len(codici), dimensione_blocco):
+		fine = inizio + dimensione_blocco
+		risultato[inizio:fine] = _valuta_blocco(codici[inizio:fine])
+	return risultato
+
+def moltiplicatori(categorie):
+	# Importo restituito per unita' puntata, come calcola_vincita(nome, 1)
+	return MOLTIPLICATORI[categorie]
+
+def nomi(categorie):
+	return [CATEGORIE[c] for c in np.asarray(categorie).tolist()]